@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+import unittest
+from src.GraphAlgo import GraphAlgo
+from src.AsyncGraphAlgo import AsyncGraphAlgo
+
+
+class TestAsyncGraphAlgo(unittest.TestCase):
+    def setUp(self):
+        self.g_algo = GraphAlgo()
+        self.g_algo.load_from_json('../data/A5')
+
+    def test_shortest_path(self):
+        async def run():
+            async with AsyncGraphAlgo(self.g_algo, workers=2) as async_algo:
+                pairs = [(src, dest) for src in range(0, 48, 7) for dest in range(0, 48, 5)]
+                results = await asyncio.gather(*(async_algo.shortest_path(src, dest) for src, dest in pairs))
+                for (src, dest), (dist, path) in zip(pairs, results):
+                    expected = self.g_algo.shortest_path(src, dest)
+                    self.assertAlmostEqual(dist, expected[0])
+                    self.assertEqual(path[0], src)
+                    self.assertEqual(path[-1], dest)
+                stats = async_algo.stats()
+                self.assertEqual(stats["requests"], len(pairs))
+                # the queries from the same source share one computation
+                self.assertTrue(stats["computations"] < len(pairs))
+                self.assertEqual(await async_algo.shortest_path(0, 100), (float('inf'), []))
+        asyncio.run(run())
+
+    def test_coalescing_and_backpressure(self):
+        async def run():
+            async with AsyncGraphAlgo(self.g_algo, workers=1, max_queue=2) as async_algo:
+                results = await asyncio.gather(*(async_algo.shortest_path(3, 40) for _ in range(20)),
+                                               *(async_algo.connected_components() for _ in range(5)),
+                                               *(async_algo.connected_component(i) for i in range(10)))
+                self.assertEqual(results[:20], [results[0]] * 20)
+                self.assertEqual(results[20:25], [self.g_algo.connected_components()] * 5)
+                for i, scc in enumerate(results[25:]):
+                    self.assertEqual(scc, self.g_algo.connected_component(i))
+                stats = async_algo.stats()
+                self.assertEqual(stats["requests"], 35)
+                self.assertEqual(stats["coalesced"], 19 + 4)
+                self.assertEqual(stats["computations"], 12)
+        asyncio.run(run())
+
+    def test_processes(self):
+        async def run():
+            async with AsyncGraphAlgo(self.g_algo, workers=2, processes=True) as async_algo:
+                dist, path = await async_algo.shortest_path(0, 40, bidirectional=True)
+                self.assertAlmostEqual(dist, self.g_algo.shortest_path(0, 40)[0])
+                tree = await async_algo.shortest_path_tree(0)
+                self.assertEqual(tree, self.g_algo.shortest_path_tree(0))
+        asyncio.run(run())
+
+    def test_close_does_not_block_the_loop(self):
+        release = threading.Event()
+
+        class SlowAlgo(GraphAlgo):
+            def reader(self):
+                return self
+
+            def connected_components(self, workers: int = 1):
+                release.wait(5)
+                return []
+
+        async def run():
+            async_algo = AsyncGraphAlgo(SlowAlgo(self.g_algo.get_graph()), workers=1)
+            query = asyncio.ensure_future(async_algo.connected_components())
+            await asyncio.sleep(0.05)
+            # the running computation ends only when the loop gets to release it, while close waits for it
+            asyncio.get_running_loop().call_later(0.05, release.set)
+            start = time.perf_counter()
+            await async_algo.close()
+            self.assertLess(time.perf_counter() - start, 2)
+            self.assertTrue(release.is_set())
+            with self.assertRaises(asyncio.CancelledError):
+                await query
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import numpy as np
+from src.DiGraph import DiGraph
+from src.GraphAlgo import GraphAlgo
+
+
+class TestCompactDiGraph(unittest.TestCase):
+    def create_graph_small(self):
+        g = DiGraph()
+        g.add_node(1, (1.0, 2.0, 0.0))
+        g.add_node(3)
+        g.add_node(2)
+        g.add_edge(1, 2, 1)
+        g.add_edge(1, 3, 1.5)
+        g.add_edge(2, 3, 1)
+        g.add_edge(3, 2, 1)
+        return g
+
+    def test_freeze(self):
+        g = self.create_graph_small()
+        c = g.freeze()
+        self.assertEqual(c.v_size(), 3)
+        self.assertEqual(c.e_size(), 4)
+        self.assertEqual(c.get_mc(), g.get_mc())
+        self.assertEqual(c.all_out_edges_of_node(1), {2: 1, 3: 1.5})
+        self.assertEqual(c.all_in_edges_of_node(3), {1: 1.5, 2: 1})
+        self.assertEqual(c.all_in_edges_of_node(1), {})
+        self.assertIsNone(c.all_out_edges_of_node(4))
+        self.assertEqual(list(c.get_all_v().keys()), [1, 3, 2])
+        self.assertEqual(c.get_all_v()[1].pos, (1.0, 2.0, 0.0))
+        self.assertIsNone(c.get_all_v()[2].pos)
+
+    def test_immutable(self):
+        g = self.create_graph_small()
+        c = g.freeze()
+        self.assertFalse(c.add_node(4))
+        self.assertFalse(c.add_edge(3, 1, 1))
+        self.assertFalse(c.remove_edge(1, 2))
+        self.assertFalse(c.remove_node(1))
+        g.remove_node(2)
+        self.assertEqual(c.v_size(), 3)
+        self.assertEqual(c.all_out_edges_of_node(1), {2: 1, 3: 1.5})
+
+    def test_to_digraph(self):
+        c = self.create_graph_small().freeze()
+        g = c.to_digraph()
+        self.assertEqual(g.v_size(), 3)
+        self.assertEqual(g.e_size(), 4)
+        self.assertEqual(g.all_out_edges_of_node(1), {2: 1, 3: 1.5})
+        self.assertEqual(g.get_all_v()[1].pos, (1.0, 2.0, 0.0))
+
+    def test_algorithms(self):
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5_edited')
+        c_algo = GraphAlgo(g_algo.get_graph().freeze())
+        self.assertEqual(c_algo.connected_components(), g_algo.connected_components())
+        self.assertEqual(c_algo.connected_component(0), g_algo.connected_component(0))
+        self.assertEqual(c_algo.connected_component(100), [])
+        for id1, id2 in [(1, 7), (47, 19), (20, 2), (2, 20), (5, 5)]:
+            self.assertEqual(c_algo.shortest_path(id1, id2), g_algo.shortest_path(id1, id2))
+        self.assertEqual(c_algo.shortest_path(1, 100), (float('inf'), []))
+        # NumPy integer ids are found whether or not the ids are the array indices
+        self.assertEqual(c_algo.shortest_path(np.int64(0), 2), g_algo.shortest_path(0, 2))
+        self.assertEqual(c_algo.get_graph().index_of(np.int64(5)), 5)
+        self.assertIsNone(c_algo.get_graph().index_of(np.int64(100)))
+        self.assertIsNone(c_algo.get_graph().index_of("5"))
+        self.assertEqual(self.create_graph_small().freeze().index_of(np.int64(3)), 1)
@@ -1,3 +1,4 @@
+import pickle
 import unittest
 from src.DiGraph import DiGraph
 
@@ -162,3 +163,197 @@ class TestDiGraph(unittest.TestCase):
         flag = g.add_edge(1, 2, 999)
         self.assertTrue(flag)
         self.assertEqual(g.e_size(), 1)
+
+    def test_add_nodes_from(self):
+        g = DiGraph()
+        self.assertEqual(g.add_nodes_from(range(5)), 5)
+        self.assertEqual(g.get_mc(), 1)
+        self.assertEqual(g.add_nodes_from([(4, None), (5, (1.0, 2.0, 0.0)), 6]), 2)
+        self.assertEqual(g.get_mc(), 2)
+        self.assertEqual(g.v_size(), 7)
+        self.assertEqual(g.get_all_v()[5].pos, (1.0, 2.0, 0.0))
+        self.assertEqual(g.add_nodes_from([1, 2]), 0)
+        self.assertEqual(g.get_mc(), 2)
+
+    def test_add_edges_from(self):
+        g = self.create_graph_10()
+        mc = g.get_mc()
+        added = g.add_edges_from([(0, 1, 1), (0, 2, 2.5), (0, 1, 3), (1, 0, -1), (1, 10, 1), (10, 1, 1), (2, 0, 0)])
+        self.assertEqual(added, 3)
+        self.assertEqual(g.e_size(), 3)
+        self.assertEqual(g.get_mc(), mc + 1)
+        self.assertEqual(g.all_out_edges_of_node(0), {1: 1, 2: 2.5})
+        self.assertEqual(g.all_in_edges_of_node(0), {2: 0})
+
+    def test_add_edges_from_array(self):
+        import numpy as np
+        g = self.create_graph_10()
+        edges = np.array([[0, 1, 0.5], [1, 2, 1.5], [2, 3, -1.0], [3, 4, 2.0]])
+        self.assertEqual(g.add_edges_from(edges), 3)
+        self.assertEqual(g.all_out_edges_of_node(1), {2: 1.5})
+        self.assertEqual(list(g.all_in_edges_of_node(4).keys()), [3])
+        self.assertIsInstance(list(g.all_in_edges_of_node(4).keys())[0], int)
+
+    def test_remove_edges_from(self):
+        g = self.create_graph_10()
+        g.add_edges_from([(0, 1, 1), (1, 2, 1), (2, 3, 1)])
+        mc = g.get_mc()
+        self.assertEqual(g.remove_edges_from([(0, 1), (0, 1), (5, 6), (11, 2), (2, 3)]), 2)
+        self.assertEqual(g.e_size(), 1)
+        self.assertEqual(g.get_mc(), mc + 1)
+        self.assertEqual(g.all_in_edges_of_node(1), {})
+        self.assertEqual(g.all_out_edges_of_node(1), {2: 1})
+        self.assertEqual(g.remove_edges_from([]), 0)
+        self.assertEqual(g.get_mc(), mc + 1)
+
+    def test_listener(self):
+        g = self.create_graph_10()
+        changes = []
+        listener = lambda op, args, mc: changes.append((op, args, mc))
+        g.add_listener(listener)
+        g.add_edge(0, 1, 2)
+        g.add_edge(0, 1, 3)
+        g.add_edges_from([(1, 2, 1), (2, 3, 1), (2, 3, 5)])
+        g.remove_edges_from([(1, 2), (5, 6)])
+        g.remove_node(3)
+        g.add_node(3, (1.0, 1.0, 0.0))
+        g.add_nodes_from([3, 11])
+        g.remove_edge(0, 1)
+        self.assertEqual(changes, [("add_edge", (0, 1, 2), 11), ("add_edges", [(1, 2, 1), (2, 3, 1)], 12),
+                                   ("remove_edges", [(1, 2)], 13), ("remove_node", (3,), 14),
+                                   ("add_node", (3, (1.0, 1.0, 0.0)), 15), ("add_nodes", [(11, None)], 16),
+                                   ("remove_edge", (0, 1), 17)])
+        self.assertTrue(g.remove_listener(listener))
+        self.assertFalse(g.remove_listener(listener))
+        g.add_edge(0, 1, 2)
+        self.assertEqual(len(changes), 7)
+
+    def test_snapshot(self):
+        g = DiGraph()
+        g.add_nodes_from(range(5))
+        g.add_edges_from([(0, 1, 1), (1, 2, 2)])
+        snap = g.snapshot()
+        self.assertIs(g.snapshot(), snap)
+        self.assertEqual(snap.get_mc(), g.get_mc())
+        g.add_edge(2, 3, 1)
+        self.assertIsNot(g.snapshot(), snap)
+        self.assertEqual(snap.e_size(), 2)
+        self.assertEqual(g.snapshot().all_out_edges_of_node(2), {3: 1.0})
+        g.remove_node(1)
+        self.assertEqual(snap.all_out_edges_of_node(0), {1: 1.0})
+        self.assertEqual(g.snapshot().v_size(), 4)
+        self.assertEqual(pickle.loads(pickle.dumps(g)).snapshot().e_size(), 1)
+
+    def test_snapshot_incremental(self):
+        import numpy as np
+        fields = ["keys", "pos", "out_offsets", "out_targets", "out_weights", "in_offsets", "in_sources", "in_weights"]
+        rnd = np.random.default_rng(7)
+        for shared_weights in (False, True):
+            g = DiGraph(shared_weights=shared_weights)
+            g.add_nodes_from(range(30))
+            g.add_edges_from((int(a), int(b), int(w)) for a, b, w in rnd.integers(0, 30, size=(80, 3)))
+            g.snapshot()
+            for _ in range(40):
+                # a few random changes of every kind between the versions
+                for _ in range(rnd.integers(1, 6)):
+                    a, b = (int(x) for x in rnd.integers(0, 40, size=2))
+                    op = rnd.integers(0, 7)
+                    if op == 0:
+                        g.add_node(a, (float(a), 1.0, 0.0))
+                    elif op == 1:
+                        g.remove_node(a)
+                    elif op == 2:
+                        g.remove_edge(a, b)
+                    elif op == 3:
+                        g.add_nodes_from([a, (b, (2.0, float(b), 0.0))])
+                    elif op == 4:
+                        g.remove_edges_from([(a, b), (b, a)])
+                    elif op == 5:
+                        g.add_edges_from([(a, b, 1.5), (b, a, 2.5)])
+                    else:
+                        g.add_edge(a, b, 0.5)
+                snap, frozen = g.snapshot(), g.freeze()
+                self.assertEqual(snap.get_mc(), g.get_mc())
+                for field in fields:
+                    np.testing.assert_array_equal(getattr(snap, field), getattr(frozen, field))
+        # with a build in progress, latest=False returns the previous version instead of waiting
+        snap = g.snapshot()
+        g.add_edge(0, 1, 1)
+        building = g._DiGraph__snapshot_building
+        building.acquire()
+        try:
+            self.assertIs(g.snapshot(latest=False), snap)
+        finally:
+            building.release()
+        self.assertEqual(g.snapshot(latest=False).get_mc(), g.get_mc())
+        # a backlog of changes as big as the graph is not recorded, the next version is a full copy
+        g.add_nodes_from(range(1000, 3000))
+        self.assertEqual(g.snapshot().v_size(), g.v_size())
+        self.assertEqual(pickle.loads(pickle.dumps(g)).snapshot().v_size(), g.v_size())
+
+    def test_shared_weights(self):
+        edges = [(0, 1, 1.5), (1, 2, 2.5), (2, 0, 3.5), (0, 2, 4.5), (3, 2, 5.5)]
+        plain = DiGraph()
+        shared = DiGraph(shared_weights=True)
+        for g in (plain, shared):
+            g.add_nodes_from(range(4))
+            g.add_edges_from(edges)
+        for key in range(4):
+            self.assertEqual(shared.all_in_edges_of_node(key), plain.all_in_edges_of_node(key))
+            self.assertEqual(shared.all_out_edges_of_node(key), plain.all_out_edges_of_node(key))
+        for g in (plain, shared):
+            g.remove_edge(0, 2)
+            g.add_edge(1, 0, 6.5)
+            g.remove_node(2)
+        self.assertEqual(shared.e_size(), plain.e_size())
+        for key in (0, 1, 3):
+            self.assertEqual(shared.all_in_edges_of_node(key), plain.all_in_edges_of_node(key))
+        copy = pickle.loads(pickle.dumps(shared))
+        self.assertEqual(copy.all_in_edges_of_node(0), {1: 6.5})
+        copy.remove_edge(1, 0)
+        self.assertEqual(copy.all_in_edges_of_node(0), {})
+        self.assertEqual(shared.all_in_edges_of_node(0), {1: 6.5})
+        # a node with many out edges keeps them in a dictionary, the edges stay the same
+        from src.DiGraph import SHARED_LIST_DEGREE
+        hub = SHARED_LIST_DEGREE + 8
+        for g in (plain, shared):
+            g.add_nodes_from(range(10, 10 + hub))
+            g.add_edges_from([(0, key, key / 2) for key in range(10, 10 + hub)])
+            g.add_edges_from([(key, 0, key / 4) for key in range(10, 10 + hub)])
+            g.add_edges_from([(0, 10, 1), (0, 11, 1)])
+            g.remove_edges_from([(0, 12), (13, 0), (0, 99)])
+            g.remove_node(14)
+            g.add_edge(0, 3, 7.5)
+        self.assertEqual(shared.e_size(), plain.e_size())
+        copy = pickle.loads(pickle.dumps(shared))
+        for key in shared.get_all_v():
+            for g in (shared, copy):
+                self.assertEqual(g.all_in_edges_of_node(key), plain.all_in_edges_of_node(key))
+                self.assertEqual(g.all_out_edges_of_node(key), plain.all_out_edges_of_node(key))
+
+    def test_node_data_slots(self):
+        g = DiGraph()
+        g.add_node(7)
+        node = g.get_all_v()[7]
+        self.assertFalse(hasattr(node, "__dict__"))
+        self.assertEqual(node.edges_out, {})
+        self.assertEqual(g.all_in_edges_of_node(7), {})
+        # reading the edges (by the algorithms too) does not create the dictionaries, adding an edge does
+        from src.GraphAlgo import GraphAlgo
+        g.add_nodes_from([8, 9])
+        g.add_edge(8, 9, 1)
+        g_algo = GraphAlgo(g)
+        self.assertEqual(g_algo.connected_components(), [[7], [8], [9]])
+        self.assertEqual(g_algo.shortest_path(7, 8), (float('inf'), []))
+        g.to_json()
+        g.freeze()
+        self.assertIsNone(node._NodeData__edges_out)
+        self.assertIsNone(node._NodeData__edges_in)
+        self.assertIsNone(g.get_all_v()[8]._NodeData__edges_in)
+        self.assertIsNone(g.get_all_v()[9]._NodeData__edges_out)
+        self.assertTrue(g.remove_node(7))
+        self.assertEqual(g.all_out_edges_of_node(8), {9: 1})
+        g.all_out_edges_of_node(9)[8] = 1
+        self.assertEqual(g.all_out_edges_of_node(9), {})
+        self.assertTrue(g.add_edge(9, 8, 2))
+        self.assertEqual(g.all_in_edges_of_node(8), {9: 2})
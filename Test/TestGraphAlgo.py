@@ -1,7 +1,14 @@
 import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
 import unittest
-from src.DiGraph import DiGraph
+from src.DiGraph import DiGraph, SharedNodeData
 from src.GraphAlgo import GraphAlgo
+from src.GraphIO import load_json_graph
+from src.Instrumentation import RingBufferSink, MutationCounter
 import numpy as np
 
 
@@ -40,6 +47,14 @@ class TestGraphAlgo(unittest.TestCase):
         self.assertFalse(4 in g_algo.get_graph().vertex)
         self.assertTrue(1 in g_algo.get_graph().all_in_edges_of_node(0))
 
+    def test_load_from_json_shared_weights(self):
+        g_algo = GraphAlgo()
+        self.assertTrue(g_algo.load_from_json('../data/G_1000_8000_1.json', shared_weights=True))
+        self.assertIs(type(next(iter(g_algo.get_graph().get_all_v().values()))), SharedNodeData)
+        expected = GraphAlgo(load_json_graph('../data/G_1000_8000_1.json'))
+        self.assertEqual(g_algo.get_graph().e_size(), expected.get_graph().e_size())
+        self.assertEqual(g_algo.shortest_path(0, 999), expected.shortest_path(0, 999))
+
     def test_save_to_json(self):
         g = self.create_graph_small()
         g_algo = GraphAlgo(g)
@@ -85,3 +100,442 @@ class TestGraphAlgo(unittest.TestCase):
         self.assertEqual(g_algo.connected_components(), [[0, 1], [2, 3]])
         g_algo.get_graph().add_edge(2, 0, 1)
         self.assertEqual(g_algo.connected_components(), [[0, 1, 2, 3]])
+
+    def test_connected_components_large_cycle(self):
+        g = DiGraph()
+        for key in range(5000):
+            g.add_node(key)
+        for key in range(4999):
+            g.add_edge(key, key + 1, 1)
+        g_algo = GraphAlgo(g)
+        self.assertEqual(len(g_algo.connected_components()), 5000)
+        g.add_edge(4999, 0, 1)
+        self.assertEqual(g_algo.connected_components(), [list(range(5000))])
+        self.assertEqual(g_algo.connected_component(1234), list(range(5000)))
+        g.add_node(5000)
+        self.assertEqual(g_algo.connected_components(), [list(range(5000)), [5000]])
+
+    def test_scc_listener_released(self):
+        import gc
+        import weakref
+        g = self.create_graph_small()
+        listeners = g._DiGraph__listeners
+        for _ in range(100):
+            self.assertEqual(GraphAlgo(g).connected_component(1), [1])
+        gc.collect()
+        self.assertEqual(len(listeners), 0)
+        g_algo = GraphAlgo(g)
+        self.assertEqual(g_algo.connected_component(2), [2, 3])
+        self.assertEqual(len(listeners), 1)
+        g.add_edge(3, 1, 1)
+        self.assertEqual(g_algo.connected_component(2), [1, 2, 3])
+        # switching graphs unregisters from the old one
+        g_algo.graph = self.create_graph_small()
+        self.assertEqual(g_algo.connected_component(2), [2, 3])
+        self.assertEqual(len(listeners), 0)
+        ref = weakref.ref(g_algo)
+        other = g_algo.graph._DiGraph__listeners
+        del g_algo
+        gc.collect()
+        self.assertIsNone(ref())
+        self.assertEqual(len(other), 0)
+
+    def test_connected_components_parallel(self):
+        from src import ParallelSCC
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5_edited')
+        small = ParallelSCC.SMALL
+        # every part bigger than a few nodes is split by forward-backward search instead of Tarjan's algorithm
+        ParallelSCC.SMALL = 4
+        try:
+            rnd = np.random.default_rng(3)
+            graphs = [g_algo.get_graph(), g_algo.get_graph().freeze(), self.create_graph_small(), DiGraph()]
+            for _ in range(10):
+                g = DiGraph()
+                g.add_nodes_from(int(key) for key in rnd.permutation(300))
+                g.add_edges_from((int(a), int(b), 1) for a, b in rnd.integers(0, 300, size=(400, 2)))
+                graphs.append(g)
+            for g in graphs:
+                self.assertEqual(GraphAlgo(g).connected_components(workers=2), GraphAlgo(g).connected_components())
+        finally:
+            ParallelSCC.SMALL = small
+        # a current SCC labeling answers without the workers
+        self.assertEqual(g_algo.connected_components(workers=2), g_algo.connected_components())
+
+    def test_shortest_path_does_not_modify_graph(self):
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5')
+        weights = {key: (node.weight, node.tag) for key, node in g_algo.get_graph().get_all_v().items()}
+        dist, path = g_algo.shortest_path(1, 7)
+        self.assertAlmostEqual(dist, 2.062180280059253)
+        self.assertEqual(path, [1, 10, 7])
+        self.assertEqual(g_algo.shortest_path(5, 5), (0, [5]))
+        nodes = g_algo.get_graph().get_all_v()
+        self.assertEqual(weights, {key: (node.weight, node.tag) for key, node in nodes.items()})
+
+    def test_shortest_path_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5')
+        pairs = [(47, 19), (20, 2), (1, 7), (2, 20)] * 25
+        expected = [g_algo.shortest_path(id1, id2) for id1, id2 in pairs]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda p: g_algo.shortest_path(*p), pairs))
+        self.assertEqual(results, expected)
+
+    def test_shortest_path_tree(self):
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5')
+        dist, parents = g_algo.shortest_path_tree(47)
+        self.assertEqual(len(dist), 48)
+        self.assertEqual(dist[47], 0)
+        self.assertNotIn(47, parents)
+        self.assertEqual(g_algo.tree_cache_info()["misses"], 1)
+        for key in range(48):
+            self.assertEqual(g_algo.shortest_path(47, key), GraphAlgo(g_algo.get_graph()).shortest_path(47, key))
+        self.assertEqual(g_algo.tree_cache_info()["hits"], 48)
+        self.assertEqual(g_algo.shortest_path(47, 100), (float('inf'), []))
+        self.assertEqual(g_algo.shortest_path_tree(100), ({}, {}))
+        g_algo.get_graph().remove_edge(13, 14)
+        self.assertEqual(g_algo.shortest_path(47, 19), GraphAlgo(g_algo.get_graph()).shortest_path(47, 19))
+        self.assertEqual(g_algo.tree_cache_info()["trees"], 0)
+        # point to point queries from a source without a cached tree do not build one, they are not misses
+        misses = g_algo.tree_cache_info()["misses"]
+        for key in range(10):
+            g_algo.shortest_path(5, key)
+        self.assertEqual(g_algo.tree_cache_info()["misses"], misses)
+        g_algo.shortest_path_tree(5)
+        self.assertEqual(g_algo.tree_cache_info()["misses"], misses + 1)
+
+    def test_shortest_path_tree_cache_bound(self):
+        g = DiGraph()
+        g.add_nodes_from(range(10))
+        g.add_edges_from((key, key + 1, 1) for key in range(9))
+        g_algo = GraphAlgo(g, tree_cache_nodes=15)
+        g_algo.shortest_path_tree(0)
+        g_algo.shortest_path_tree(5)
+        self.assertEqual(g_algo.tree_cache_info()["nodes"], 15)
+        g_algo.shortest_path_tree(8)
+        info = g_algo.tree_cache_info()
+        self.assertEqual((info["trees"], info["nodes"]), (2, 7))
+        self.assertEqual(g_algo.shortest_path(8, 9), (1, [8, 9]))
+        self.assertEqual(g_algo.tree_cache_info()["hits"], 1)
+
+    def test_shortest_path_bidirectional(self):
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5_edited')
+        for id1, id2 in [(1, 7), (47, 19), (20, 2), (2, 20), (5, 5)]:
+            dist, path = g_algo.shortest_path(id1, id2, bidirectional=True)
+            self.assertAlmostEqual(dist, g_algo.shortest_path(id1, id2)[0])
+            self.assertEqual(path, g_algo.shortest_path(id1, id2)[1])
+        self.assertEqual(g_algo.shortest_path(1, 100, bidirectional=True), (float('inf'), []))
+        rnd = np.random.default_rng(8)
+        for _ in range(20):
+            g = self.create_graph_10()
+            g.add_edges_from((int(a), int(b), int(w)) for a, b, w in rnd.integers(0, 10, size=(25, 3)))
+            g_algo = GraphAlgo(g)
+            for id1 in range(10):
+                for id2 in range(10):
+                    dist, path = g_algo.shortest_path(id1, id2, bidirectional=True)
+                    self.assertEqual(dist, g_algo.shortest_path(id1, id2)[0])
+                    if path:
+                        self.assertEqual((path[0], path[-1]), (id1, id2))
+                        self.assertEqual(sum(g.all_out_edges_of_node(a)[b] for a, b in zip(path, path[1:])), dist)
+
+    def test_shortest_path_euclidean(self):
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5_edited')
+        for id1, id2 in [(1, 7), (47, 19), (20, 2), (2, 20), (5, 5)]:
+            dist, path = g_algo.shortest_path(id1, id2, heuristic="euclidean")
+            self.assertAlmostEqual(dist, g_algo.shortest_path(id1, id2)[0])
+            self.assertEqual(path, g_algo.shortest_path(id1, id2)[1])
+        with self.assertRaises(ValueError):
+            g_algo.shortest_path(1, 7, heuristic="manhattan")
+        # the edge weights are much smaller than the distances between the nodes
+        g = DiGraph()
+        for key in range(4):
+            g.add_node(key, (key * 100.0, 0.0, 0.0))
+        g.add_edges_from([(0, 3, 3), (0, 1, 1), (1, 2, 1), (2, 3, 0.5)])
+        self.assertEqual(GraphAlgo(g).shortest_path(0, 3, heuristic="euclidean"), (2.5, [0, 1, 2, 3]))
+        g.add_node(4)
+        g.add_edge(0, 4, 1)
+        self.assertEqual(GraphAlgo(g).shortest_path(0, 3, heuristic="euclidean"), (2.5, [0, 1, 2, 3]))
+        self.assertEqual(GraphAlgo(g).shortest_path(0, 4, heuristic="euclidean"), (1, [0, 4]))
+
+    def test_query_index(self):
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5_edited')
+        expected = {(id1, id2): g_algo.shortest_path(id1, id2) for id1 in range(0, 48, 3) for id2 in range(48)}
+        g_algo.build_query_index()
+        for (id1, id2), (dist, path) in expected.items():
+            index_dist, index_path = g_algo.shortest_path(id1, id2)
+            if not path:
+                self.assertEqual((index_dist, index_path), (dist, path))
+                continue
+            self.assertAlmostEqual(index_dist, dist)
+            self.assertEqual((index_path[0], index_path[-1]), (id1, id2))
+            self.assertAlmostEqual(sum(g_algo.get_graph().all_out_edges_of_node(a)[b]
+                                       for a, b in zip(index_path, index_path[1:])), dist)
+        with tempfile.TemporaryDirectory() as tmp:
+            file = os.path.join(tmp, "A5_edited.ch")
+            self.assertTrue(g_algo.save_query_index(file))
+            loaded = GraphAlgo(g_algo.get_graph())
+            self.assertTrue(loaded.load_query_index(file))
+            self.assertAlmostEqual(loaded.shortest_path(45, 19)[0], expected[(45, 19)][0])
+            self.assertTrue(g_algo.get_graph().remove_edge(47, 46))
+            self.assertFalse(loaded.load_query_index(file))
+            # a graph of the same size and version with other edges does not take the index
+            a, b = DiGraph(), DiGraph()
+            a.add_nodes_from([0, 1, 2])
+            a.add_edges_from([(0, 1, 1), (1, 2, 1)])
+            b.add_nodes_from([0, 1, 2])
+            b.add_edges_from([(0, 2, 1), (2, 1, 1)])
+            self.assertEqual((a.get_mc(), a.v_size(), a.e_size()), (b.get_mc(), b.v_size(), b.e_size()))
+            a_algo, b_algo = GraphAlgo(a), GraphAlgo(b)
+            a_algo.build_query_index()
+            self.assertTrue(a_algo.save_query_index(file))
+            self.assertFalse(b_algo.load_query_index(file))
+            self.assertEqual(b_algo.shortest_path(0, 2), (1, [0, 2]))
+            self.assertTrue(GraphAlgo(a).load_query_index(file))
+        self.assertEqual(g_algo.shortest_path(47, 19), GraphAlgo(g_algo.get_graph()).shortest_path(47, 19))
+        # random graphs, with a small witness limit and a core left uncontracted
+        rnd = np.random.default_rng(10)
+        for _ in range(20):
+            g = self.create_graph_10()
+            g.add_edges_from((int(a), int(b), int(w)) for a, b, w in rnd.integers(0, 10, size=(30, 3)))
+            g_algo = GraphAlgo(g)
+            expected = {(id1, id2): g_algo.shortest_path(id1, id2)[0] for id1 in range(10) for id2 in range(10)}
+            g_algo.build_query_index(witness_limit=2, core_limit=4)
+            for (id1, id2), dist in expected.items():
+                self.assertEqual(g_algo.shortest_path(id1, id2)[0], dist)
+
+    def test_shortest_path_delta_stepping(self):
+        from src import DeltaStepping
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5')
+        g = g_algo.get_graph()
+        g.add_edge(0, 2, 0)
+        g.add_edge(2, 1, 0)
+        parallel_edges = DeltaStepping.PARALLEL_EDGES
+        # every phase goes to the worker processes
+        DeltaStepping.PARALLEL_EDGES = 0
+        try:
+            self.assertEqual(GraphAlgo(g).shortest_path_tree(0, workers=2), GraphAlgo(g).shortest_path_tree(0))
+            for dest in (1, 19, 40):
+                self.assertEqual(GraphAlgo(g).shortest_path(0, dest, workers=2), GraphAlgo(g).shortest_path(0, dest))
+            frozen = GraphAlgo(g.freeze())
+            self.assertEqual(frozen.shortest_path(47, 19, workers=2), frozen.shortest_path(47, 19))
+            self.assertEqual(g_algo.shortest_path(0, 100, workers=2), (float('inf'), []))
+        finally:
+            DeltaStepping.PARALLEL_EDGES = parallel_edges
+        # ties between paths of the same length are broken like Dijkstra breaks them
+        rnd = np.random.default_rng(5)
+        for _ in range(20):
+            g = DiGraph()
+            g.add_nodes_from(int(key) for key in rnd.permutation(40))
+            g.add_edges_from((int(a), int(b), int(w)) for a, b, w in rnd.integers(0, 40, size=(120, 3)) % [40, 40, 3])
+            for src in (0, 1):
+                dist, parents = GraphAlgo(g).shortest_path_tree(src)
+                frozen = g.freeze()
+                tree = DeltaStepping.delta_stepping(frozen, frozen.index_of(src), delta=1.0)
+                tree_parents = DeltaStepping.tree_parents(frozen, tree, frozen.index_of(src), frozen.keys)
+                keys = frozen.keys.tolist()
+                self.assertEqual({keys[i]: d for i, d in enumerate(tree.tolist()) if d != float('inf')}, dist)
+                self.assertEqual({keys[i]: keys[p] for i, p in enumerate(tree_parents.tolist()) if p >= 0}, parents)
+
+    def test_distance_matrix(self):
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5_edited')
+        sources = [0, 5, 47, 100]
+        targets = [1, 19, 20, 47, 100]
+        matrix = g_algo.distance_matrix(sources, targets)
+        self.assertEqual(matrix.shape, (4, 5))
+        for i, src in enumerate(sources):
+            for j, dest in enumerate(targets):
+                self.assertAlmostEqual(matrix[i, j], g_algo.shortest_path(src, dest)[0])
+        self.assertTrue(np.array_equal(g_algo.distance_matrix(sources, targets, workers=2), matrix))
+        rows = dict(g_algo.iter_distance_matrix(sources, targets, workers=2))
+        self.assertEqual(sorted(rows.keys()), [0, 1, 2, 3])
+        self.assertTrue(np.array_equal(np.array([rows[i] for i in range(4)]), matrix))
+
+    def test_connected_components_incremental(self):
+        rnd = np.random.default_rng(12)
+        for _ in range(30):
+            g = DiGraph()
+            g.add_nodes_from(range(15))
+            g.add_edges_from((int(a), int(b), 1) for a, b in rnd.integers(0, 15, size=(20, 2)))
+            g_algo = GraphAlgo(g)
+            g_algo.connected_components()
+            next_key = 15
+            for step in range(100):
+                keys = list(g.get_all_v().keys())
+                action = rnd.random()
+                if action < 0.45:
+                    g.add_edge(int(rnd.choice(keys)), int(rnd.choice(keys)), 1)
+                elif action < 0.8:
+                    key = int(rnd.choice(keys))
+                    out = list(g.all_out_edges_of_node(key).keys())
+                    if out:
+                        g.remove_edge(key, out[int(rnd.integers(len(out)))])
+                elif action < 0.85:
+                    g.remove_node(int(rnd.choice(keys)))
+                elif action < 0.9:
+                    g.add_node(next_key)
+                    next_key += 1
+                elif action < 0.95:
+                    g.remove_edges_from([(int(a), int(b)) for a, b in rnd.choice(keys, size=(6, 2))])
+                else:
+                    g.add_edges_from([(int(a), int(b), 1) for a, b in rnd.choice(keys, size=(3, 2))])
+                self.assertEqual(g_algo.connected_components(), GraphAlgo(g).connected_components())
+                key = int(rnd.choice(list(g.get_all_v().keys())))
+                self.assertEqual(g_algo.connected_component(key), GraphAlgo(g).connected_component(key))
+
+    def test_is_reachable(self):
+        g = self.create_graph_small()
+        g_algo = GraphAlgo(g)
+        self.assertTrue(g_algo.is_reachable(1, 3))
+        self.assertTrue(g_algo.is_reachable(3, 2))
+        self.assertFalse(g_algo.is_reachable(3, 1))
+        self.assertTrue(g_algo.is_reachable(1, 1))
+        self.assertFalse(g_algo.is_reachable(1, 4))
+        condensation = g_algo.condensation()
+        self.assertEqual(condensation.components, [[1], [2, 3]])
+        self.assertEqual(condensation.successors, [[1], []])
+        g.add_edge(2, 1, 1)
+        self.assertTrue(g_algo.is_reachable(3, 1))
+        self.assertEqual(g_algo.condensation().components, [[1, 2, 3]])
+        # the labels and the search against a plain traversal, on random graphs with few cycles
+        rnd = np.random.default_rng(3)
+        for _ in range(10):
+            g = DiGraph()
+            g.add_nodes_from(range(80))
+            g.add_edges_from((int(a), int(a) + int(d), 1) for a, d in zip(rnd.integers(0, 80, 120),
+                                                                          rnd.integers(1, 20, 120)))
+            g.add_edges_from((int(a), int(b), 1) for a, b in rnd.integers(0, 80, size=(3, 2)))
+            g_algo = GraphAlgo(g)
+            for src in range(80):
+                reached = {src}
+                stack = [src]
+                while stack:
+                    for ni in g.all_out_edges_of_node(stack.pop()):
+                        if ni not in reached:
+                            reached.add(ni)
+                            stack.append(ni)
+                for dest in range(80):
+                    self.assertEqual(g_algo.is_reachable(src, dest), dest in reached)
+
+    def test_plot_graph_to_file(self):
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/T0.json')
+        mc = g_algo.get_graph().get_mc()
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("graph.png", "graph.svg"):
+                file_name = os.path.join(tmp, name)
+                g_algo.plot_graph(file_name, max_edges=3)
+                self.assertTrue(os.path.getsize(file_name) > 0)
+        self.assertEqual(g_algo.get_graph().get_mc(), mc)
+        self.assertTrue(all(node.pos is None for node in g_algo.get_graph().get_all_v().values()))
+
+    def test_layout(self):
+        g = DiGraph()
+        for i in range(30):
+            g.add_node(i)
+        g.add_node(30, (5, 5, 0))
+        g.add_node(31, (10, 7, 0))
+        for i in range(30):
+            g.add_edge(i, (i + 1) % 30, 1)
+        g.add_edge(0, 30, 1)
+        g_algo = GraphAlgo(g)
+        for method in ("spring", "spectral"):
+            positions = g_algo.layout(method)
+            self.assertEqual(sorted(positions.keys()), list(range(30)))
+            self.assertIs(g_algo.layout(method), positions)
+            self.assertEqual(GraphAlgo(g).layout(method), positions)
+            self.assertEqual(len(set(positions.values())), 30)
+        positions = g_algo.layout()
+        g.add_edge(5, 20, 1)
+        self.assertIsNot(g_algo.layout(), positions)
+        self.assertIsNone(g.get_all_v()[0].pos)
+        self.assertRaises(ValueError, g_algo.layout, "circle")
+
+    def test_import_is_light(self):
+        # worker processes import GraphAlgo only for the algorithms, plotting and NumPy are loaded on first use
+        code = "import sys, src.GraphAlgo; print(','.join(m for m in ('numpy', 'matplotlib') if m in sys.modules))"
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        out = subprocess.run([sys.executable, "-c", code], cwd=root, env=dict(os.environ, PYTHONPATH=root),
+                             capture_output=True, text=True, check=True).stdout
+        self.assertEqual(out.strip(), "")
+
+    def test_instrumentation(self):
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5')
+        expected = g_algo.shortest_path(0, 40)
+        sink = g_algo.enable_instrumentation(RingBufferSink(capacity=3))
+        self.assertEqual(g_algo.shortest_path(0, 40), expected)
+        record = sink.records()[-1]
+        self.assertEqual((record.op, record.args, record.mode, record.cache),
+                         ("shortest_path", (0, 40), "dijkstra", None))
+        self.assertTrue(record.settled > 0 and record.pushes >= record.pops >= record.settled)
+        self.assertTrue(record.relaxed > 0 and record.elapsed >= 0)
+        self.assertEqual(record.mc, g_algo.get_graph().get_mc())
+        g_algo.shortest_path(0, 40, bidirectional=True)
+        self.assertEqual(sink.records()[-1].mode, "bidirectional")
+        g_algo.shortest_path_tree(0)
+        g_algo.shortest_path(0, 40)
+        self.assertEqual(sink.records()[-1][2:4], ("tree", "tree"))
+        self.assertEqual(len(sink), 3)
+        g_algo.connected_component(0)
+        g_algo.connected_components()
+        self.assertEqual([r.cache for r in sink.records()[-2:]], [None, "scc"])
+        g_algo.is_reachable(0, 40)
+        self.assertEqual(sink.records()[-1][:4], ("is_reachable", (0, 40), "labels", "reachability"))
+        g_algo.disable_instrumentation()
+        g_algo.shortest_path(1, 2)
+        self.assertEqual(sink.records()[-1].op, "is_reachable")
+
+        counter = MutationCounter()
+        g_algo.get_graph().add_listener(counter)
+        g_algo.get_graph().add_edges_from([(1, 40, 1), (2, 40, 1)])
+        g_algo.get_graph().remove_edge(1, 40)
+        g_algo.get_graph().remove_edge(1, 40)
+        self.assertEqual(counter.counts, {"add_edges": 2, "remove_edge": 1})
+
+    def test_reader_snapshots_with_concurrent_writer(self):
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5')
+        g = g_algo.get_graph()
+        errors = []
+        done = threading.Event()
+
+        def write():
+            rnd = np.random.default_rng(3)
+            for _ in range(300):
+                id1, id2 = (int(x) for x in rnd.integers(0, 48, size=2))
+                if not g.remove_edge(id1, id2):
+                    g.add_edge(id1, id2, float(rnd.random()))
+                if rnd.random() < 0.05:
+                    g.remove_node(int(rnd.integers(0, 48)))
+            done.set()
+
+        def read():
+            try:
+                while not done.is_set():
+                    reader = g_algo.reader()
+                    snap = reader.get_graph()
+                    dist, path = reader.shortest_path(0, 40)
+                    if path:
+                        self.assertAlmostEqual(dist, sum(snap.all_out_edges_of_node(a)[b]
+                                                         for a, b in zip(path, path[1:])))
+                    self.assertEqual(sum(map(len, reader.connected_components())), snap.v_size())
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for thread in readers:
+            thread.start()
+        write()
+        for thread in readers:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertIs(g_algo.reader(), g_algo.reader())
+        self.assertEqual(g_algo.reader().get_graph().get_mc(), g.get_mc())
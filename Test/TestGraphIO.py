@@ -0,0 +1,99 @@
+import io
+import json
+import unittest
+from src.GraphIO import iter_json_graph, load_json_graph, save_json_graph
+
+
+class TestGraphIO(unittest.TestCase):
+    def test_iter_json_graph(self):
+        doc = {"Edges": [{"src": 0, "w": 1.25, "dest": 1}, {"src": 1, "w": 3, "dest": 0}],
+               "Version": {"major": 1, "minor": [2, 3]},
+               "Nodes": [{"pos": "1.0,2.0,0.0", "id": 0}, {"id": 1}]}
+        text = json.dumps(doc, indent=2)
+        expected = [(name, element) for name in ("Edges", "Nodes") for element in doc[name]]
+        for chunk_size in (1, 3, 17, 1 << 20):
+            self.assertEqual(list(iter_json_graph(io.StringIO(text), chunk_size)), expected)
+        self.assertEqual(list(iter_json_graph(io.StringIO('{"Nodes": [], "Edges": []}'))), [])
+        self.assertEqual(list(iter_json_graph(io.StringIO('{}'))), [])
+        with self.assertRaises(ValueError):
+            list(iter_json_graph(io.StringIO('{"Nodes": [{"id": 0} {"id": 1}]}')))
+
+    def test_load_json_graph(self):
+        g = load_json_graph('../data/A0')
+        self.assertEqual(g.v_size(), 11)
+        self.assertEqual(g.e_size(), 22)
+        self.assertEqual(g.get_all_v()[0].pos, (35.18753053591606, 32.10378225882353, 0.0))
+        self.assertEqual(g.all_out_edges_of_node(0), {1: 1.4004465106761335, 10: 1.4620268165085584})
+        g = load_json_graph('../data/T0.json')
+        self.assertEqual(g.v_size(), 4)
+        self.assertIsNone(g.get_all_v()[0].pos)
+        self.assertEqual(g.all_out_edges_of_node(1), {0: 1.1, 2: 1.3, 3: 1.8})
+        self.assertIsInstance(g.all_out_edges_of_node(0)[1], int)
+
+    def test_save_json_graph(self):
+        import gzip
+        import os
+        import tempfile
+        from src.DiGraph import DiGraph
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("A5_edited", "T0.json_saved"):
+                with open(os.path.join('../data', name), "rb") as fp:
+                    expected = fp.read()
+                g = load_json_graph(os.path.join('../data', name))
+                file = os.path.join(tmp, name)
+                save_json_graph(g, file)
+                with open(file, "rb") as fp:
+                    self.assertEqual(fp.read(), expected)
+                # the weights of a CompactDiGraph are floats, it writes what json.dump writes for it
+                frozen = g.freeze()
+                save_json_graph(frozen, file)
+                with open(file, "rb") as fp:
+                    self.assertEqual(fp.read(), json.dumps(frozen.to_json()).encode())
+                save_json_graph(g, file + ".gz")
+                with gzip.open(file + ".gz", "rb") as fp:
+                    self.assertEqual(fp.read(), expected)
+                self.assertEqual(load_json_graph(file + ".gz").all_out_edges_of_node(1), g.all_out_edges_of_node(1))
+            # a failed save leaves the previous file as it was
+            with open(file, "rb") as fp:
+                before = fp.read()
+            broken = DiGraph()
+            broken.add_node(0, (1.0, 2.0))
+            with self.assertRaises(IndexError):
+                save_json_graph(broken, file)
+            with open(file, "rb") as fp:
+                self.assertEqual(fp.read(), before)
+            self.assertEqual(sorted(os.listdir(tmp)), ["A5_edited", "A5_edited.gz", "T0.json_saved",
+                                                       "T0.json_saved.gz"])
+
+    def test_binary(self):
+        import os
+        import pickle
+        import tempfile
+        from src.GraphAlgo import GraphAlgo
+        from src.GraphIO import json_to_binary, load_binary_graph
+        g_algo = GraphAlgo()
+        g_algo.load_from_json('../data/A5_edited')
+        with tempfile.TemporaryDirectory() as tmp:
+            file = os.path.join(tmp, "A5_edited.bin")
+            self.assertTrue(g_algo.save_binary(file))
+            b_algo = GraphAlgo()
+            self.assertTrue(b_algo.load_binary(file))
+            self.assertEqual(b_algo.get_graph().v_size(), 48)
+            self.assertEqual(b_algo.get_graph().e_size(), 165)
+            self.assertEqual(b_algo.get_graph().get_mc(), g_algo.get_graph().get_mc())
+            self.assertEqual(b_algo.get_graph().get_all_v()[0].pos, g_algo.get_graph().get_all_v()[0].pos)
+            self.assertEqual(b_algo.shortest_path(47, 19), g_algo.shortest_path(47, 19))
+            self.assertEqual(b_algo.connected_components(), g_algo.connected_components())
+            shared = pickle.loads(pickle.dumps(b_algo.get_graph()))
+            self.assertEqual(shared.file_name, file)
+            self.assertEqual(shared.all_out_edges_of_node(13), g_algo.get_graph().all_out_edges_of_node(13))
+            copied = load_binary_graph(file, mmap=False)
+            self.assertEqual(copied.all_in_edges_of_node(7), g_algo.get_graph().all_in_edges_of_node(7))
+            converted = os.path.join(tmp, "A5_converted.bin")
+            json_to_binary('../data/A5_edited', converted)
+            with open(file, "rb") as a, open(converted, "rb") as b:
+                self.assertEqual(a.read()[64:], b.read()[64:])
+            with open(os.path.join(tmp, "bad.bin"), "wb") as bad:
+                bad.write(b"\0" * 64)
+            self.assertFalse(b_algo.load_binary(os.path.join(tmp, "bad.bin")))
+            del b_algo, shared
@@ -0,0 +1,82 @@
+import os
+import pickle
+import tempfile
+import unittest
+from src.DiGraph import DiGraph
+from src.GraphJournal import recover_graph
+
+
+class TestGraphJournal(unittest.TestCase):
+    def create_graph(self):
+        g = DiGraph()
+        g.add_nodes_from([(0, (1.0, 2.0, 0.0)), 1, 2, 3])
+        g.add_edges_from([(0, 1, 1), (1, 2, 2.5), (2, 3, 3.5)])
+        return g
+
+    def assertSameGraph(self, a: DiGraph, b: DiGraph):
+        self.assertEqual(a.v_size(), b.v_size())
+        self.assertEqual(a.e_size(), b.e_size())
+        for key, node in a.get_all_v().items():
+            self.assertEqual(node.pos, b.get_all_v()[key].pos)
+            self.assertEqual(a.all_out_edges_of_node(key), b.all_out_edges_of_node(key))
+            self.assertEqual(a.all_in_edges_of_node(key), b.all_in_edges_of_node(key))
+
+    def test_recover(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertEqual(recover_graph(tmp).v_size(), 0)
+            g = self.create_graph()
+            journal = g.enable_journal(tmp)
+            g.add_node(4, (5.0, 6.0, 0.0))
+            g.add_edge(3, 4, 0.5)
+            g.remove_edge(0, 1)
+            g.remove_node(2)
+            g.add_nodes_from([5, 6])
+            g.add_edges_from([(5, 6, 1.5), (6, 0, 2)])
+            g.remove_edges_from([(5, 6)])
+            self.assertEqual(sorted(os.listdir(tmp)), ["journal-00000001.log", "snapshot-00000001.json"])
+            self.assertSameGraph(recover_graph(tmp), g)
+            # a record cut short by a crash is ignored
+            with open(os.path.join(tmp, "journal-00000001.log"), "ab") as fp:
+                fp.write(b'[99,"add_node",7')
+            self.assertSameGraph(recover_graph(tmp), g)
+            self.assertTrue(g.checkpoint())
+            self.assertEqual(journal.generation, 2)
+            self.assertEqual(sorted(os.listdir(tmp)), ["journal-00000002.log", "snapshot-00000002.json"])
+            self.assertSameGraph(recover_graph(tmp), g)
+            # the log is compacted by itself once it outgrows the snapshot
+            g.add_nodes_from(range(100, 20000))
+            self.assertGreater(journal.generation, 2)
+            self.assertSameGraph(recover_graph(tmp), g)
+            copy = pickle.loads(pickle.dumps(g))
+            copy.add_node(30000)
+            self.assertFalse(copy.checkpoint())
+            self.assertTrue(g.disable_journal())
+            g.add_node(30000)
+            recovered = recover_graph(tmp)
+            self.assertNotIn(30000, recovered.get_all_v())
+            recovered.enable_journal(tmp)
+            recovered.add_edge(100, 101, 1)
+            self.assertEqual(recover_graph(tmp).all_out_edges_of_node(100), {101: 1})
+            recovered.disable_journal()
+
+    def test_numpy_values(self):
+        import numpy as np
+        with tempfile.TemporaryDirectory() as tmp:
+            g = self.create_graph()
+            g.add_node(np.int64(4), (np.float64(1.5), np.float64(2.5), 0.0))
+            journal = g.enable_journal(tmp)
+            g.add_node(np.int64(5), (np.float64(0.5), 1.0, 0.0))
+            self.assertTrue(g.add_edge(np.int64(0), np.int64(2), np.float64(1.25)))
+            g.add_edges_from(np.array([[3, 4, 0.75], [4, 5, 2.0]]))
+            g.add_edges_from([(np.int32(5), np.int64(0), np.int64(3))])
+            g.remove_edges_from([(np.int64(0), np.int64(1))])
+            self.assertSameGraph(recover_graph(tmp), g)
+            # the snapshot of a checkpoint takes them too
+            self.assertTrue(g.checkpoint())
+            self.assertEqual(journal.generation, 2)
+            self.assertSameGraph(recover_graph(tmp), g)
+            g.disable_journal()
+
+
+if __name__ == '__main__':
+    unittest.main()
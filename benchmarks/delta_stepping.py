@@ -0,0 +1,101 @@
+"""
+Measures the speedup of the parallel delta-stepping shortest path tree by number of worker processes,
+on synthetic graphs shaped like data/G_1000_8000_1.json (8 random out edges per node, random weights).
+Run from the repository root:
+    python -m benchmarks.delta_stepping [--nodes 100000,1000000] [--workers 1,2,4,8,16,32] [--output curve.json]
+Every run is checked against Dijkstra's algorithm (GraphAlgo.shortest_path_tree, run once per graph):
+the distances and parents must be the same. The speedup is relative to one worker, which runs
+delta-stepping in this process without a pool. Worker counts above the number of cores are skipped
+unless --oversubscribe is given.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from src.CompactDiGraph import CompactDiGraph
+from src.GraphAlgo import GraphAlgo
+from src import DeltaStepping
+
+EDGES_PER_NODE = 8
+
+
+def synthetic_graph(nodes: int, edges_per_node: int = EDGES_PER_NODE, seed: int = 0) -> CompactDiGraph:
+    """builds a random graph with edges_per_node out edges per node, weights uniform in [0.1, 80)"""
+    rng = np.random.default_rng(seed)
+    src = np.repeat(np.arange(nodes), edges_per_node)
+    dest = rng.integers(0, nodes, size=len(src))
+    weights = rng.uniform(0.1, 80, size=len(src))
+    return CompactDiGraph.from_edge_list(np.arange(nodes), np.full((nodes, 3), np.nan), src, dest, weights)
+
+
+def bench_graph(graph: CompactDiGraph, workers: list, repeat: int) -> list:
+    """
+    Runs the shortest path tree of node 0 with Dijkstra and with delta-stepping for every worker count.
+    @return: The list of results, one per worker count (0 for Dijkstra)
+    """
+    start = time.perf_counter()
+    expected = GraphAlgo(graph, tree_cache_nodes=0).shortest_path_tree(0)
+    results = [{"workers": 0, "algorithm": "dijkstra", "seconds": time.perf_counter() - start}]
+    for count in workers:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            tree = GraphAlgo(graph, tree_cache_nodes=0).shortest_path_tree(0, workers=count) if count > 1 \
+                else _sequential_tree(graph)
+            times.append(time.perf_counter() - start)
+        if tree != expected:
+            raise AssertionError(f"delta-stepping with {count} workers differs from Dijkstra")
+        results.append({"workers": count, "algorithm": "delta_stepping", "seconds": min(times)})
+    return results
+
+
+def _sequential_tree(graph: CompactDiGraph) -> (dict, dict):
+    """delta-stepping without worker processes, the base of the speedups"""
+    dist = DeltaStepping.delta_stepping(graph, 0)
+    parents = DeltaStepping.tree_parents(graph, dist, 0)
+    keys = graph.keys.tolist()
+    reached = np.flatnonzero(np.isfinite(dist)).tolist()
+    return ({keys[node]: d for node, d in zip(reached, dist[reached].tolist())},
+            {keys[node]: keys[parent] for node, parent in zip(reached, parents[reached].tolist()) if node != 0})
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", default="100000", help="comma separated node counts of the synthetic graphs")
+    parser.add_argument("--workers", default="1,2,4,8,16,32", help="comma separated worker counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--oversubscribe", action="store_true", help="run worker counts above the number of cores")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    workers = [int(w) for w in args.workers.split(",") if w]
+    if not args.oversubscribe:
+        workers = [w for w in workers if w <= cores] or [1]
+    report = {"python": platform.python_version(), "platform": platform.platform(), "cores": cores, "results": []}
+    print(f"{'nodes':>10} {'edges':>10} {'workers':>8} {'seconds':>9} {'speedup':>8} {'vs dijkstra':>12}")
+    for size in args.nodes.split(","):
+        graph = synthetic_graph(int(float(size)), seed=args.seed)
+        results = bench_graph(graph, workers, args.repeat)
+        dijkstra = results[0]["seconds"]
+        base = next((r["seconds"] for r in results if r["workers"] == 1), None)
+        for r in results:
+            r.update(nodes=graph.v_size(), edges=graph.e_size())
+            speedup = f"{base / r['seconds']:.2f}" if base and r["workers"] else "-"
+            print(f"{graph.v_size():>10} {graph.e_size():>10} {r['workers'] or 'dijkstra':>8} {r['seconds']:>9.3f} "
+                  f"{speedup:>8} {dijkstra / r['seconds']:>12.2f}")
+            report["results"].append(r)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Measures the import time of the graph modules, each in a fresh interpreter, and the heavy
+modules (NumPy, matplotlib...) that the import pulls in.
+Run from the repository root:
+    python -m benchmarks.import_time [--runs 10] [--limit 0.25]
+With --limit the script exits with an error if the median import time of src.GraphAlgo is above it (seconds).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = ["src.DiGraph", "src.GraphIO", "src.GraphAlgo"]
+HEAVY_MODULES = ["numpy", "matplotlib", "matplotlib.pyplot", "concurrent.futures", "src.CompactDiGraph"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, runs: int) -> dict:
+    """
+    Imports module in runs fresh interpreters.
+    @return: A dictionary with the median and minimal import time (seconds) and the heavy modules it loaded
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    times = []
+    loaded = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                             env=env, cwd=root, capture_output=True, text=True, check=True).stdout
+        result = json.loads(out)
+        times.append(result["seconds"])
+        loaded = result["loaded"]
+    return {"module": module, "median": statistics.median(times), "min": min(times), "loaded": loaded}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--limit", type=float, default=None)
+    args = parser.parse_args(argv)
+    status = 0
+    for module in MODULES:
+        result = measure(module, args.runs)
+        print(f"{module:20} median {result['median'] * 1000:8.1f} ms  min {result['min'] * 1000:8.1f} ms  "
+              f"loads {', '.join(result['loaded']) or '-'}")
+        if module == "src.GraphAlgo" and args.limit is not None and result["median"] > args.limit:
+            print(f"src.GraphAlgo import is slower than {args.limit} s")
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
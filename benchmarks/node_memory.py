@@ -0,0 +1,111 @@
+"""
+Measures the memory a DiGraph takes per edge, with the default nodes (NodeData) and with
+DiGraph(shared_weights=True) (SharedNodeData), on data/G_1000_8000_1.json and on synthetic graphs of the same
+shape (see benchmarks.suite.synthetic_graph).
+Run from the repository root:
+    python -m benchmarks.node_memory [--synthetic 100000,1000000] [--output memory.json]
+Two numbers are traced with tracemalloc for every graph and mode:
+- edges: the bytes add_edges_from allocates on a graph that already has all its nodes, for edge lists
+  (ids and weight objects) that exist beforehand, this is what the edges themselves cost,
+- total: the bytes still allocated after load_json_graph, the nodes and their positions, the weights and
+  the vertex dictionary included.
+Both are divided by the number of edges. The ratio column is the edge bytes of the default nodes over the
+edge bytes of the mode.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.suite import EDGES_PER_NODE, ROOT, synthetic_graph
+from src.DiGraph import DiGraph
+from src.GraphIO import load_json_graph
+
+DATA_FILES = ["G_1000_8000_1.json"]
+
+
+def _traced(func, *args):
+    """returns the result of func and the bytes it allocated that are still allocated after it returned"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func(*args)
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def bench_graph(file_name: str) -> list:
+    """
+    Measures the memory of the graph in file_name, in both modes
+    @return: The list of results, one per mode
+    """
+    graph = load_json_graph(file_name)
+    nodes = [(key, node.pos) for key, node in graph.get_all_v().items()]
+    edges = [(key, dest, w) for key in graph.get_all_v() for dest, w in graph.all_out_edges_of_node(key).items()]
+    del graph
+    results = []
+    for shared_weights in (False, True):
+        g = DiGraph(shared_weights)
+        g.add_nodes_from(nodes)
+        _, edge_bytes = _traced(g.add_edges_from, edges)
+        del g
+        start = time.perf_counter()
+        load_json_graph(file_name, shared_weights)
+        # timed without tracing, tracemalloc slows every allocation down
+        seconds = time.perf_counter() - start
+        g, total_bytes = _traced(load_json_graph, file_name, shared_weights)
+        results.append({"shared_weights": shared_weights, "nodes": g.v_size(), "edges": g.e_size(),
+                        "edge_bytes_per_edge": edge_bytes / g.e_size(),
+                        "total_bytes_per_edge": total_bytes / g.e_size(), "load_seconds": seconds})
+        del g
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", default="",
+                        help="comma separated node counts of synthetic graphs, empty for none")
+    parser.add_argument("--edges-per-node", type=int, default=EDGES_PER_NODE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "graph_benchmarks"))
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    graphs = [(name, os.path.join(ROOT, "data", name)) for name in DATA_FILES]
+    for size in filter(None, args.synthetic.split(",")):
+        nodes = int(float(size))
+        name = f"synthetic_{nodes}_{nodes * args.edges_per_node}_{args.seed}.json"
+        file_name = os.path.join(args.cache_dir, name)
+        if not os.path.exists(file_name):
+            os.makedirs(args.cache_dir, exist_ok=True)
+            synthetic_graph(file_name + ".tmp", nodes, args.edges_per_node, args.seed)
+            os.replace(file_name + ".tmp", file_name)
+        graphs.append((name, file_name))
+
+    report = {"python": platform.python_version(), "platform": platform.platform(), "results": []}
+    print(f"{'graph':36} {'shared':>6} {'edges':>10} {'edge B/edge':>12} {'total B/edge':>13} {'load s':>8} "
+          f"{'ratio':>6}")
+    for name, file_name in graphs:
+        results = bench_graph(file_name)
+        default = results[0]["edge_bytes_per_edge"]
+        for r in results:
+            r["graph"] = name
+            print(f"{name:36} {str(r['shared_weights']):>6} {r['edges']:>10} {r['edge_bytes_per_edge']:>12.1f} "
+                  f"{r['total_bytes_per_edge']:>13.1f} {r['load_seconds']:>8.3f} "
+                  f"{default / r['edge_bytes_per_edge']:>6.2f}")
+            report["results"].append(r)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
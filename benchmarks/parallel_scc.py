@@ -0,0 +1,87 @@
+"""
+Measures the speedup of the parallel SCC decomposition (ParallelSCC) by number of worker processes,
+on synthetic graphs with a few random out edges per node, so there is one giant component and many small ones.
+Run from the repository root:
+    python -m benchmarks.parallel_scc [--nodes 100000,1000000] [--workers 1,2,4,8,16,32] [--output curve.json]
+Every run is checked against Tarjan's algorithm (GraphAlgo.connected_components, run once per graph):
+the components must be the same. The speedup is relative to one worker, which runs the forward-backward
+decomposition in this process without a pool. Worker counts above the number of cores are skipped
+unless --oversubscribe is given.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from benchmarks.delta_stepping import synthetic_graph
+from src.CompactDiGraph import CompactDiGraph
+from src.GraphAlgo import GraphAlgo
+from src import ParallelSCC
+
+EDGES_PER_NODE = 2
+
+
+def bench_graph(graph: CompactDiGraph, workers: list, repeat: int) -> list:
+    """
+    Finds the components with Tarjan's algorithm and with the decomposition for every worker count.
+    @return: The list of results, one per worker count (0 for Tarjan)
+    """
+    start = time.perf_counter()
+    expected = GraphAlgo(graph).connected_components()
+    results = [{"workers": 0, "algorithm": "tarjan", "seconds": time.perf_counter() - start,
+                "components": len(expected)}]
+    for count in workers:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if count > 1:
+                components = GraphAlgo(graph).connected_components(workers=count)
+            else:
+                components = ParallelSCC.strongly_connected_components(graph)
+            times.append(time.perf_counter() - start)
+        if count > 1 and components != expected:
+            raise AssertionError(f"the decomposition with {count} workers differs from Tarjan's algorithm")
+        if count <= 1 and len(set(components.tolist())) != len(expected):
+            raise AssertionError("the decomposition differs from Tarjan's algorithm")
+        results.append({"workers": count, "algorithm": "forward_backward", "seconds": min(times)})
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", default="100000", help="comma separated node counts of the synthetic graphs")
+    parser.add_argument("--workers", default="1,2,4,8,16,32", help="comma separated worker counts")
+    parser.add_argument("--edges-per-node", type=int, default=EDGES_PER_NODE)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--oversubscribe", action="store_true", help="run worker counts above the number of cores")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    workers = [int(w) for w in args.workers.split(",") if w]
+    if not args.oversubscribe:
+        workers = [w for w in workers if w <= cores] or [1]
+    report = {"python": platform.python_version(), "platform": platform.platform(), "cores": cores, "results": []}
+    print(f"{'nodes':>10} {'edges':>10} {'workers':>8} {'seconds':>9} {'speedup':>8} {'vs tarjan':>10}")
+    for size in args.nodes.split(","):
+        graph = synthetic_graph(int(float(size)), args.edges_per_node, seed=args.seed)
+        results = bench_graph(graph, workers, args.repeat)
+        tarjan = results[0]["seconds"]
+        base = next((r["seconds"] for r in results if r["workers"] == 1), None)
+        for r in results:
+            r.update(nodes=graph.v_size(), edges=graph.e_size())
+            speedup = f"{base / r['seconds']:.2f}" if base and r["workers"] else "-"
+            print(f"{graph.v_size():>10} {graph.e_size():>10} {r['workers'] or 'tarjan':>8} {r['seconds']:>9.3f} "
+                  f"{speedup:>8} {tarjan / r['seconds']:>10.2f}")
+            report["results"].append(r)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Benchmarks the GraphAlgo operations on the graphs of data/ and on synthetic graphs of the same
+shape (nodes on a circle, 8 random out edges per node) scaled up to millions of nodes.
+Run from the repository root:
+    python -m benchmarks.suite [--synthetic 10000,1000000] [--output results.json]
+                               [--baseline benchmarks/baseline.json] [--tolerance 0.25]
+The results (throughput, latency percentiles and peak traced memory of every operation on every graph)
+are printed as a table and written as JSON with --output. With --baseline the results are compared
+to a stored run and the script exits with an error if an operation got slower (or bigger) than
+the tolerance allows. Timings only compare on the same machine: benchmarks/baseline.json is a run of
+the default settings, regenerate it with --output where the comparison runs.
+The synthetic JSON files are generated once into --cache-dir.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from src.GraphAlgo import GraphAlgo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_FILES = ["A0", "A1", "A2", "A3", "A4", "A5", "G_10_80_1.json", "G_100_800_1.json", "G_1000_8000_1.json"]
+EDGES_PER_NODE = 8
+# differences below these are noise, not regressions
+NOISE = {"min_ms": 0.5, "peak_bytes": 64 * 1024}
+
+
+def synthetic_graph(file_name: str, nodes: int, edges_per_node: int = EDGES_PER_NODE, seed: int = 0):
+    """
+    Writes a graph JSON file shaped like data/G_1000_8000_1.json: the nodes on the unit circle and
+    edges_per_node random out edges per node (on average) with random weights.
+    The file is written in chunks, so graphs of 10^6 nodes and 10^7 edges do not need the whole
+    document in memory.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    angles = np.arange(nodes) * (2 * np.pi / nodes)
+    chunk = 1 << 16
+    with open(file_name, "w") as fp:
+        fp.write('{"Edges":[')
+        first = True
+        for start in range(0, nodes, chunk):
+            end = min(start + chunk, nodes)
+            src = np.repeat(np.arange(start, end), edges_per_node)
+            dest = rng.integers(0, nodes, size=len(src))
+            keep = src != dest
+            weights = rng.uniform(0.1, 80, size=len(src))
+            parts = [f'{{"src":{s},"w":{w!r},"dest":{d}}}'
+                     for s, w, d in zip(src[keep].tolist(), weights[keep].tolist(), dest[keep].tolist())]
+            if parts:
+                fp.write(("" if first else ",") + ",".join(parts))
+                first = False
+        fp.write('],"Nodes":[')
+        for start in range(0, nodes, chunk):
+            end = min(start + chunk, nodes)
+            parts = [f'{{"pos":"{x!r},{y!r},0.0","id":{i}}}' for i, x, y in
+                     zip(range(start, end), np.cos(angles[start:end]).tolist(), np.sin(angles[start:end]).tolist())]
+            fp.write(("," if start else "") + ",".join(parts))
+        fp.write("]}")
+
+
+def _timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def _peak(func, *args) -> int:
+    """returns the peak memory (bytes) traced by tracemalloc while running func once"""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _result(graph_name: str, algo: GraphAlgo, op: str, latencies: list, peak: int) -> dict:
+    total = sum(latencies)
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    return {"graph": graph_name, "nodes": algo.get_graph().v_size(), "edges": algo.get_graph().e_size(),
+            "op": op, "count": len(latencies), "seconds": total,
+            "throughput": len(latencies) / total if total > 0 else None,
+            "latency_ms": {"min": ordered[0] * 1000, "p50": statistics.median(latencies) * 1000,
+                           "p90": percentile(0.9), "p99": percentile(0.99), "max": ordered[-1] * 1000},
+            "peak_bytes": peak}
+
+
+def bench_graph(graph_name: str, file_name: str, queries: int, repeat: int, seed: int, memory: bool) -> list:
+    """
+    Runs all the operations on one graph file.
+    @param queries: The number of random shortest_path pairs and connected_component nodes
+    @param repeat: The number of times the whole graph operations (load, save, connected_components) run
+    @param memory: If True every operation runs once more under tracemalloc to measure its peak memory
+    @return: The list of results, one per operation
+    """
+    results = []
+    algo = GraphAlgo()
+    latencies = [_timed(algo.load_from_json, file_name) for _ in range(repeat)]
+    results.append(_result(graph_name, algo, "load_from_json", latencies,
+                           _peak(GraphAlgo().load_from_json, file_name) if memory else None))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out_file = os.path.join(tmp, "graph.json")
+        latencies = [_timed(algo.save_to_json, out_file) for _ in range(repeat)]
+        results.append(_result(graph_name, algo, "save_to_json", latencies,
+                               _peak(algo.save_to_json, out_file) if memory else None))
+
+    rnd = random.Random(seed)
+    keys = list(algo.get_graph().get_all_v().keys())
+    pairs = [(rnd.choice(keys), rnd.choice(keys)) for _ in range(queries)]
+    latencies = [_timed(algo.shortest_path, src, dest) for src, dest in pairs]
+    results.append(_result(graph_name, algo, "shortest_path", latencies,
+                           _peak(algo.shortest_path, *pairs[0]) if memory else None))
+
+    # the first call computes the SCC labeling, the rest answer from it
+    fresh = GraphAlgo(algo.get_graph())
+    latencies = [_timed(fresh.connected_component, rnd.choice(keys)) for _ in range(queries)]
+    results.append(_result(graph_name, algo, "connected_component", latencies,
+                           _peak(GraphAlgo(algo.get_graph()).connected_component, keys[0]) if memory else None))
+
+    latencies = [_timed(GraphAlgo(algo.get_graph()).connected_components) for _ in range(repeat)]
+    results.append(_result(graph_name, algo, "connected_components", latencies,
+                           _peak(GraphAlgo(algo.get_graph()).connected_components) if memory else None))
+    return results
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """
+    Compares results to a baseline run, by minimal latency and peak memory of every (graph, op).
+    @return: The list of (graph, op, metric, baseline value, new value) of the regressions
+    """
+    old = {(r["graph"], r["op"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        base = old.get((r["graph"], r["op"]))
+        if base is None:
+            continue
+        # the fastest run is the least disturbed by the rest of the machine
+        pairs = [("min_ms", base["latency_ms"]["min"], r["latency_ms"]["min"]),
+                 ("peak_bytes", base.get("peak_bytes"), r.get("peak_bytes"))]
+        for metric, before, after in pairs:
+            if before and after is not None and after > before * (1 + tolerance) and after - before > NOISE[metric]:
+                regressions.append((r["graph"], r["op"], metric, before, after))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", default="10000",
+                        help="comma separated node counts of the synthetic graphs, empty for none")
+    parser.add_argument("--edges-per-node", type=int, default=EDGES_PER_NODE)
+    parser.add_argument("--no-data", action="store_true", help="skip the graphs of data/")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "graph_benchmarks"))
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="a JSON results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown (or memory growth) against the baseline")
+    args = parser.parse_args(argv)
+
+    graphs = []
+    if not args.no_data:
+        graphs += [(name, os.path.join(ROOT, "data", name)) for name in DATA_FILES]
+    for size in filter(None, args.synthetic.split(",")):
+        nodes = int(float(size))
+        name = f"synthetic_{nodes}_{nodes * args.edges_per_node}_{args.seed}.json"
+        file_name = os.path.join(args.cache_dir, name)
+        if not os.path.exists(file_name):
+            os.makedirs(args.cache_dir, exist_ok=True)
+            synthetic_graph(file_name + ".tmp", nodes, args.edges_per_node, args.seed)
+            os.replace(file_name + ".tmp", file_name)
+        graphs.append((name, file_name))
+
+    results = []
+    print(f"{'graph':36} {'op':22} {'count':>6} {'ops/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+          f"{'peak KiB':>10}")
+    for name, file_name in graphs:
+        for r in bench_graph(name, file_name, args.queries, args.repeat, args.seed, not args.no_memory):
+            results.append(r)
+            peak = "-" if r["peak_bytes"] is None else f"{r['peak_bytes'] / 1024:.0f}"
+            throughput = "-" if r["throughput"] is None else f"{r['throughput']:.1f}"
+            print(f"{name:36} {r['op']:22} {r['count']:>6} {throughput:>10} {r['latency_ms']['p50']:>9.3f} "
+                  f"{r['latency_ms']['p90']:>9.3f} {r['latency_ms']['p99']:>9.3f} {peak:>10}")
+
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+              "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "results": results}
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=1)
+    if args.baseline:
+        with open(args.baseline, "r") as fp:
+            baseline = json.load(fp)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for graph, op, metric, before, after in regressions:
+            print(f"REGRESSION {graph} {op} {metric}: {before:.3f} -> {after:.3f}")
+        if regressions:
+            return 1
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from src.GraphAlgo import GraphAlgo
+
+
+class AsyncGraphAlgo:
+    """
+    This class is an asyncio front end of GraphAlgo: the queries run in a thread (or process) pool,
+    so the event loop is never blocked by a search.
+    Identical queries that are in flight at the same time are computed once and share the result,
+    and shortest path queries from the same source that wait in the queue together are answered
+    by a single shortest path tree.
+    The queue of computations is bounded, a query that would overflow it waits (backpressure) instead
+    of piling up work.
+    Usage:
+        async with AsyncGraphAlgo(algo) as async_algo:
+            dist, path = await async_algo.shortest_path(1, 2)
+    """
+
+    def __init__(self, algo: GraphAlgo, workers: int = 4, max_queue: int = 1024, processes: bool = False):
+        """
+        @param algo: The algorithms to run the queries with
+        @param workers: The number of threads (or processes) that run queries at the same time
+        @param max_queue: The maximal number of computations waiting for a worker
+        @param processes: If True the queries run in worker processes that share a memory mapped copy
+        of the graph, taken when the front end starts (later changes of the graph are not seen).
+        Otherwise they run in threads on algo.reader(), a snapshot of the current version of the graph.
+        """
+        self.algo = algo
+        self.__workers = workers
+        self.__max_queue = max_queue
+        self.__processes = processes
+        self.__executor = None
+        self.__shared = None
+        self.__queue = None
+        self.__tasks = []
+        # the in flight computations by query key, and the shortest path batches still in the queue by source
+        self.__inflight = {}
+        self.__batches = {}
+        self.__requests = 0
+        self.__coalesced = 0
+        self.__computations = 0
+
+    async def __aenter__(self) -> "AsyncGraphAlgo":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        """Starts the workers, called by async with or on the first query"""
+        if self.__queue is not None:
+            return
+        self.__queue = asyncio.Queue(maxsize=self.__max_queue)
+        if self.__processes:
+            from src.GraphIO import shared_binary_graph
+            self.__shared = shared_binary_graph(self.algo.get_graph())
+            graph = self.__shared.__enter__()
+            self.__executor = ProcessPoolExecutor(max_workers=self.__workers, initializer=_init_worker,
+                                                  initargs=(graph,))
+        else:
+            self.__executor = ThreadPoolExecutor(max_workers=self.__workers)
+        self.__tasks = [asyncio.ensure_future(self.__consume()) for _ in range(self.__workers)]
+
+    async def close(self):
+        """Stops the workers, the queries still waiting fail with CancelledError"""
+        if self.__queue is None:
+            return
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        for future in self.__inflight.values():
+            future.cancel()
+        self.__inflight.clear()
+        self.__batches.clear()
+        executor, shared = self.__executor, self.__shared
+        self.__executor = self.__shared = None
+        self.__queue = None
+        self.__tasks = []
+        # the running computations are waited for in a thread, the event loop goes on meanwhile
+        await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(executor.shutdown, wait=True, cancel_futures=True))
+        # the workers are done with the shared graph only now
+        if shared is not None:
+            shared.__exit__(None, None, None)
+
+    async def shortest_path(self, id1: int, id2: int, bidirectional: bool = False,
+                            heuristic: str = None) -> (float, list):
+        """
+        Returns the shortest path from node id1 to node id2, see GraphAlgo.shortest_path
+        @return: The distance of the path, a list of the nodes ids that the path goes through
+        """
+        await self.start()
+        options = (bidirectional, heuristic)
+        key = ("shortest_path", id1, id2, options)
+        future = self.__join(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = self.__new_future(key)
+        batch = self.__batches.get((id1, options))
+        if batch is not None:
+            # a batch from the same source is still waiting in the queue, the query joins it
+            self.__coalesced += 1
+            batch[id2] = future
+        else:
+            batch = {id2: future}
+            self.__batches[(id1, options)] = batch
+            # shielded: the batch is queued even if this query is cancelled, other queries may have joined it
+            await asyncio.shield(self.__queue.put(("batch", (id1, options), batch)))
+        return await asyncio.shield(future)
+
+    async def shortest_path_tree(self, src: int) -> (dict, dict):
+        """see GraphAlgo.shortest_path_tree"""
+        return await self.__submit("shortest_path_tree", (src,))
+
+    async def connected_component(self, id1: int) -> list:
+        """see GraphAlgo.connected_component"""
+        return await self.__submit("connected_component", (id1,))
+
+    async def connected_components(self) -> list:
+        """see GraphAlgo.connected_components"""
+        return await self.__submit("connected_components", ())
+
+    def stats(self) -> dict:
+        """
+        Returns the counts of the queries, the queries that shared the computation of another query,
+        and the computations that ran
+        """
+        return {"requests": self.__requests, "coalesced": self.__coalesced, "computations": self.__computations,
+                "queued": self.__queue.qsize() if self.__queue is not None else 0}
+
+    async def __submit(self, method: str, args: tuple):
+        await self.start()
+        key = (method,) + args
+        future = self.__join(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = self.__new_future(key)
+        await asyncio.shield(self.__queue.put(("call", method, args, future)))
+        return await asyncio.shield(future)
+
+    def __join(self, key: tuple):
+        """counts a query, returns the future of an identical query in flight if there is one"""
+        self.__requests += 1
+        future = self.__inflight.get(key)
+        if future is not None:
+            self.__coalesced += 1
+        return future
+
+    def __new_future(self, key: tuple) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.__inflight[key] = future
+        future.add_done_callback(lambda _: self.__inflight.pop(key, None))
+        return future
+
+    async def __consume(self):
+        loop = asyncio.get_running_loop()
+        algo = None if self.__processes else self.algo
+        while True:
+            item = await self.__queue.get()
+            try:
+                if item[0] == "batch":
+                    _, (src, options), batch = item
+                    # the batch is closed once it leaves the queue, later queries from src start a new one
+                    del self.__batches[(src, options)]
+                    targets = list(batch.keys())
+                    self.__computations += 1
+                    try:
+                        results = await loop.run_in_executor(self.__executor, _run_batch, algo, src, targets,
+                                                             options)
+                    except Exception as e:
+                        for future in batch.values():
+                            if not future.done():
+                                future.set_exception(e)
+                        continue
+                    for target, result in zip(targets, results):
+                        if not batch[target].done():
+                            batch[target].set_result(result)
+                else:
+                    _, method, args, future = item
+                    self.__computations += 1
+                    try:
+                        result = await loop.run_in_executor(self.__executor, _run, algo, method, args)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                        continue
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                self.__queue.task_done()
+
+
+_worker_algo = None
+
+
+def _init_worker(graph):
+    """initializes a worker process with the shared graph"""
+    global _worker_algo
+    _worker_algo = GraphAlgo(graph)
+
+
+def _run(algo: GraphAlgo, method: str, args: tuple):
+    """runs one GraphAlgo query, on a snapshot of the graph in a thread or on the shared graph in a process"""
+    algo = _worker_algo if algo is None else algo.reader()
+    return getattr(algo, method)(*args)
+
+
+def _run_batch(algo: GraphAlgo, src: int, targets: list, options: tuple) -> list:
+    """answers the shortest path queries from src to all the targets, with one shortest path tree for many"""
+    algo = _worker_algo if algo is None else algo.reader()
+    bidirectional, heuristic = options
+    if len(targets) > 1:
+        # the tree is cached by the algorithms, the paths below are read from it
+        algo.shortest_path_tree(src)
+    return [algo.shortest_path(src, target, bidirectional, heuristic) for target in targets]
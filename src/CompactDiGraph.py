@@ -0,0 +1,364 @@
+import math
+import operator
+
+import numpy as np
+
+from src.GraphInterface import GraphInterface
+from src.DiGraph import NodeData
+
+
+class CompactDiGraph(GraphInterface):
+    """
+    This class represents an immutable directed weighted graph stored in compressed arrays.
+    Node i (an array index) has the node id keys[i], its out edges are
+    out_targets[out_offsets[i]:out_offsets[i + 1]] with the matching out_weights (CSR),
+    and its in edges are in_sources[in_offsets[i]:in_offsets[i + 1]] with the matching in_weights (CSC).
+    Nodes without a position have a row of nan in pos.
+    """
+
+    def __init__(self, keys, pos, out_offsets, out_targets, out_weights, in_offsets, in_sources, in_weights,
+                 mc: int = 0):
+        self.keys = keys
+        self.pos = pos
+        self.out_offsets = out_offsets
+        self.out_targets = out_targets
+        self.out_weights = out_weights
+        self.in_offsets = in_offsets
+        self.in_sources = in_sources
+        self.in_weights = in_weights
+        self.file_name = None
+        self.__mode_count = mc
+        self.__nodes = None
+        self.__index = None
+        # graphs whose node ids are 0..n-1 need no index dictionary
+        self.__identity = bool(np.array_equal(keys, np.arange(len(keys))))
+
+    @classmethod
+    def from_graph(cls, graph: GraphInterface) -> "CompactDiGraph":
+        """
+        Builds a compact snapshot of a graph.
+        @param graph: The graph to copy
+        @return: A new CompactDiGraph with the same nodes, positions and edges
+        """
+        nodes = graph.get_all_v()
+        key_list = list(nodes.keys())
+        index = {key: i for i, key in enumerate(key_list)}
+        n = len(key_list)
+        pos = np.full((n, 3), np.nan)
+        degrees = np.zeros(n, dtype=np.int64)
+        targets = []
+        weights = []
+        for i, key in enumerate(key_list):
+            node = nodes[key]
+            if node.pos is not None:
+                pos[i] = node.pos[:3]
+            edges = graph.all_out_edges_of_node(key)
+            degrees[i] = len(edges)
+            for dest, w in edges.items():
+                targets.append(index[dest])
+                weights.append(w)
+        out_targets = np.array(targets, dtype=np.int64)
+        out_weights = np.array(weights, dtype=np.float64)
+        return cls.from_arrays(np.array(key_list, dtype=np.int64), pos, degrees, out_targets, out_weights,
+                               graph.get_mc())
+
+    @classmethod
+    def from_edge_list(cls, keys, pos, src, dest, weights, mc: int = 0) -> "CompactDiGraph":
+        """
+        Builds a compact graph from lists of node ids and edges, without building a DiGraph first.
+        Like in DiGraph, repeated nodes and edges keep their first occurrence and edges with
+        a missing end or a negative weight are skipped.
+        @param keys: The node ids
+        @param pos: A (n, 3) array of the nodes positions, nan for nodes without a position
+        @param src: The source node ids of the edges
+        @param dest: The destination node ids of the edges
+        @param weights: The weights of the edges
+        @param mc: The version of the graph
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        pos = np.asarray(pos, dtype=np.float64).reshape(-1, 3)
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        keys = keys[first]
+        pos = pos[first]
+        n = len(keys)
+        src = np.asarray(src, dtype=np.int64)
+        dest = np.asarray(dest, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        sorter = np.argsort(keys)
+        sorted_keys = keys[sorter]
+
+        def to_index(ids):
+            found = np.searchsorted(sorted_keys, ids)
+            found[found >= n] = 0
+            valid = sorted_keys[found] == ids if n else np.zeros(len(ids), dtype=bool)
+            return sorter[found] if n else found, valid
+
+        src_index, src_valid = to_index(src)
+        dest_index, dest_valid = to_index(dest)
+        keep = src_valid & dest_valid & (weights >= 0)
+        src_index, dest_index, weights = src_index[keep], dest_index[keep], weights[keep]
+        _, first = np.unique(src_index * max(n, 1) + dest_index, return_index=True)
+        first.sort()
+        src_index, dest_index, weights = src_index[first], dest_index[first], weights[first]
+        order = np.argsort(src_index, kind="stable")
+        return cls.from_arrays(keys, pos, np.bincount(src_index, minlength=n), dest_index[order], weights[order],
+                               mc)
+
+    @classmethod
+    def from_arrays(cls, keys, pos, out_degrees, out_targets, out_weights, mc: int = 0) -> "CompactDiGraph":
+        """
+        Builds a compact graph from its out adjacency, the in adjacency is derived from it.
+        @param keys: The node ids, by array index
+        @param pos: A (n, 3) array of positions, nan for nodes without a position
+        @param out_degrees: The number of out edges of every node
+        @param out_targets: The array indices of the edges destinations, grouped by source
+        @param out_weights: The weights of the edges, in the order of out_targets
+        @param mc: The version of the graph
+        """
+        n = len(keys)
+        out_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(out_degrees, out=out_offsets[1:])
+        sources = np.repeat(np.arange(n, dtype=np.int64), out_degrees)
+        order = np.argsort(out_targets, kind="stable")
+        in_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(out_targets, minlength=n), out=in_offsets[1:])
+        return cls(keys, pos, out_offsets, out_targets, out_weights, in_offsets, sources[order],
+                   out_weights[order], mc)
+
+    def with_changes(self, changes: list, mc: int) -> "CompactDiGraph":
+        """
+        Builds the compact graph of a later version of the DiGraph this one was taken from, by applying the
+        changes made since then to the arrays instead of copying the DiGraph again.
+        The result has the same arrays freeze() would give: removed nodes and edges leave their place,
+        added ones go after the others, like in the DiGraph's dictionaries.
+        @param changes: The (op, args) of every change since this version, in order, as DiGraph passes them to
+        its listeners (see DiGraph.add_listener)
+        @param mc: The version of the graph after the changes
+        @return: A new CompactDiGraph
+        """
+        removed_nodes = set()
+        added_nodes = {}
+        removed_edges = set()
+        added_edges = {}
+        # the added edges of every node, so removing the node removes them (entries may be stale)
+        touching = {}
+
+        def add_edge(id1, id2, weight):
+            added_edges[(id1, id2)] = weight
+            touching.setdefault(id1, []).append((id1, id2))
+            touching.setdefault(id2, []).append((id1, id2))
+
+        def remove_edge(id1, id2):
+            if (id1, id2) in added_edges:
+                del added_edges[(id1, id2)]
+            else:
+                removed_edges.add((id1, id2))
+
+        for op, args in changes:
+            if op == "add_node":
+                added_nodes[args[0]] = args[1]
+            elif op == "add_nodes":
+                for node_id, pos in args:
+                    added_nodes[node_id] = pos
+            elif op == "remove_node":
+                node_id = args[0]
+                # a node of this version stays removed even if it is added back, its edges are gone
+                if node_id in added_nodes:
+                    del added_nodes[node_id]
+                else:
+                    removed_nodes.add(node_id)
+                for edge in touching.pop(node_id, ()):
+                    added_edges.pop(edge, None)
+            elif op == "add_edge":
+                add_edge(*args)
+            elif op == "add_edges":
+                for edge in args:
+                    add_edge(*edge)
+            elif op == "remove_edge":
+                remove_edge(*args)
+            elif op == "remove_edges":
+                for id1, id2 in args:
+                    remove_edge(id1, id2)
+
+        n = len(self.keys)
+        src = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.out_offsets))
+        dest = self.out_targets
+        keep = np.ones(n, dtype=bool)
+        for node_id in removed_nodes:
+            i = self.index_of(node_id)
+            if i is not None:
+                keep[i] = False
+        edge_keep = keep[src] & keep[dest]
+        if removed_edges:
+            codes = [self.index_of(id1) * n + self.index_of(id2) for id1, id2 in removed_edges
+                     if self.index_of(id1) is not None and self.index_of(id2) is not None]
+            edge_keep &= ~np.isin(src * n + dest, np.array(codes, dtype=np.int64))
+        new_index = np.cumsum(keep) - 1
+        kept = int(keep.sum())
+        added_index = {key: kept + i for i, key in enumerate(added_nodes)}
+        index_list = new_index.tolist()
+
+        def index_of(key):
+            i = added_index.get(key)
+            return i if i is not None else index_list[self.index_of(key)]
+
+        added_src = np.array([index_of(id1) for id1, _ in added_edges], dtype=np.int64)
+        added_dest = np.array([index_of(id2) for _, id2 in added_edges], dtype=np.int64)
+        keys = np.concatenate((self.keys[keep], np.array(list(added_nodes), dtype=np.int64)))
+        pos = np.full((len(added_nodes), 3), np.nan)
+        for i, node_pos in enumerate(added_nodes.values()):
+            if node_pos is not None:
+                pos[i] = node_pos[:3]
+        all_src = np.concatenate((new_index[src[edge_keep]], added_src))
+        all_dest = np.concatenate((new_index[dest[edge_keep]], added_dest))
+        weights = np.concatenate((self.out_weights[edge_keep], np.array(list(added_edges.values()), dtype=np.float64)))
+        # the edges of a node keep their order, the added ones after the others
+        order = np.argsort(all_src, kind="stable")
+        return CompactDiGraph.from_arrays(keys, np.concatenate((self.pos[keep], pos)),
+                                          np.bincount(all_src, minlength=len(keys)), all_dest[order], weights[order],
+                                          mc)
+
+    def v_size(self) -> int:
+        """
+        Returns the number of vertices in this graph
+        @return: The number of vertices in this graph
+        """
+        return len(self.keys)
+
+    def e_size(self) -> int:
+        """
+        Returns the number of edges in this graph
+        @return: The number of edges in this graph
+        """
+        return len(self.out_targets)
+
+    def get_all_v(self) -> dict:
+        """return a dictionary of all the nodes in the Graph, each node is represented using a pair
+         (node_id, node_data)
+        Note: the node data only holds the key and position, the edges are given by
+        all_in_edges_of_node and all_out_edges_of_node
+        """
+        if self.__nodes is None:
+            nodes = {}
+            for i, key in enumerate(self.keys.tolist()):
+                nodes[key] = NodeData(key=key, pos=self.pos_at(i))
+            self.__nodes = nodes
+        return self.__nodes
+
+    def index_of(self, id1: int):
+        """returns the array index of the node id1, or None if there is no such node"""
+        if self.__identity:
+            # NumPy integers are ids too, like they are keys of the index below
+            try:
+                i = operator.index(id1)
+            except TypeError:
+                return None
+            return i if 0 <= i < len(self.keys) else None
+        if self.__index is None:
+            self.__index = {key: i for i, key in enumerate(self.keys.tolist())}
+        return self.__index.get(id1)
+
+    def all_in_edges_of_node(self, id1: int) -> dict:
+        """return a dictionary of all the nodes connected to (into) node_id ,
+        each node is represented using a pair (other_node_id, weight)
+         """
+        i = self.index_of(id1)
+        if i is None:
+            return None
+        start, end = self.in_offsets[i], self.in_offsets[i + 1]
+        return dict(zip(self.keys[self.in_sources[start:end]].tolist(), self.in_weights[start:end].tolist()))
+
+    def all_out_edges_of_node(self, id1: int) -> dict:
+        """return a dictionary of all the nodes connected from node_id , each node is represented using a pair
+        (other_node_id, weight)
+        """
+        i = self.index_of(id1)
+        if i is None:
+            return None
+        start, end = self.out_offsets[i], self.out_offsets[i + 1]
+        return dict(zip(self.keys[self.out_targets[start:end]].tolist(), self.out_weights[start:end].tolist()))
+
+    def out_edges_at(self, i: int):
+        """returns the (array index, weight) pairs of the out edges of the node at array index i"""
+        start, end = self.out_offsets[i], self.out_offsets[i + 1]
+        return zip(self.out_targets[start:end].tolist(), self.out_weights[start:end].tolist())
+
+    def in_edges_at(self, i: int):
+        """returns the (array index, weight) pairs of the in edges of the node at array index i"""
+        start, end = self.in_offsets[i], self.in_offsets[i + 1]
+        return zip(self.in_sources[start:end].tolist(), self.in_weights[start:end].tolist())
+
+    def pos_at(self, i: int):
+        """returns the position of the node at array index i as a tuple, or None if it has no position"""
+        x, y, z = self.pos[i].tolist()
+        if math.isnan(x):
+            return None
+        return x, y, z
+
+    def get_mc(self) -> int:
+        """
+        Returns the version of the graph this snapshot was built from.
+        @return: The version of this graph.
+        """
+        return self.__mode_count
+
+    def add_edge(self, id1: int, id2: int, weight: float) -> bool:
+        """The graph is immutable, the function does nothing and returns False"""
+        return False
+
+    def add_node(self, node_id: int, pos: tuple = None) -> bool:
+        """The graph is immutable, the function does nothing and returns False"""
+        return False
+
+    def remove_node(self, node_id: int) -> bool:
+        """The graph is immutable, the function does nothing and returns False"""
+        return False
+
+    def remove_edge(self, node_id1: int, node_id2: int) -> bool:
+        """The graph is immutable, the function does nothing and returns False"""
+        return False
+
+    def __reduce__(self):
+        # a graph mapped from a binary file is shared with other processes by its file, not by its data
+        if self.file_name is not None:
+            from src.GraphIO import load_binary_graph
+            return load_binary_graph, (self.file_name,)
+        return (CompactDiGraph, (self.keys, self.pos, self.out_offsets, self.out_targets, self.out_weights,
+                                 self.in_offsets, self.in_sources, self.in_weights, self.__mode_count))
+
+    def to_digraph(self):
+        """
+        Builds a mutable copy of this graph.
+        @return: A new DiGraph with the same nodes, positions and edges
+        """
+        from src.DiGraph import DiGraph
+        g = DiGraph()
+        keys = self.keys.tolist()
+        for i, key in enumerate(keys):
+            g.add_node(key, self.pos_at(i))
+        targets = self.out_targets.tolist()
+        weights = self.out_weights.tolist()
+        offsets = self.out_offsets.tolist()
+        for i, key in enumerate(keys):
+            for j in range(offsets[i], offsets[i + 1]):
+                g.add_edge(key, keys[targets[j]], weights[j])
+        return g
+
+    def to_json(self) -> object:
+        nodes = []
+        edges = []
+        keys = self.keys.tolist()
+        for i, key in enumerate(keys):
+            pos = self.pos_at(i)
+            if pos is None:
+                nodes.append({"id": key})
+            else:
+                nodes.append({"id": key, "pos": f"{pos[0]},{pos[1]},{pos[2]}"})
+        targets = self.out_targets.tolist()
+        weights = self.out_weights.tolist()
+        offsets = self.out_offsets.tolist()
+        for i, key in enumerate(keys):
+            for j in range(offsets[i], offsets[i + 1]):
+                edges.append({"src": key, "dest": keys[targets[j]], "w": weights[j]})
+        return {"Nodes": nodes, "Edges": edges}
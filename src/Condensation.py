@@ -0,0 +1,158 @@
+import random
+
+# the number of hub components whose reachability every component records as bits
+HUBS = 64
+
+
+class Condensation:
+    """
+    This class represents the condensation of a directed graph: the DAG of its strongly connected
+    components, with labels that answer most "can u reach v?" questions without searching.
+    The components are numbered in topological order, every edge of the DAG goes from a lower number to
+    a higher one. Each component has:
+    - two GRAIL intervals [low, post] from depth first traversals in different child orders, if u reaches v
+      the interval of v is inside the interval of u, so a pair whose intervals do not nest is unreachable,
+    - the interval of the first traversal's spanning tree, if v is in the subtree of u it is reachable,
+    - bit masks of the HUBS components of highest degree that it reaches and that reach it,
+      if u reaches a hub that reaches v then u reaches v, and if v reaches a hub that u does not
+      (or a hub reaches u and not v) then u does not reach v.
+    A pair the labels do not decide is answered by a depth first search of the DAG from u, pruned by
+    the same labels.
+    More info:
+    https://en.wikipedia.org/wiki/Strongly_connected_component#Definitions
+    GRAIL: Yildirim, Chaoji and Zaki, "GRAIL: Scalable Reachability Index for Large Graphs", VLDB 2010
+    """
+
+    def __init__(self, components: list, successors: list, mc: int = 0, seed: int = 0):
+        """
+        @param components: The lists of node ids of the components, in topological order
+        @param successors: The lists of the components each component has an edge to (indices into components)
+        @param mc: The version of the graph the condensation was built from
+        @param seed: The seed of the child order of the second traversal
+        """
+        self.mc = mc
+        self.components = components
+        self.successors = successors
+        self.component_of = {key: comp for comp, keys in enumerate(components) for key in keys}
+        n = len(components)
+        predecessors = [[] for _ in range(n)]
+        for comp, succ in enumerate(successors):
+            for other in succ:
+                predecessors[other].append(comp)
+        self.__pre, self.__post, self.__low = self.__traverse(None)
+        rng = random.Random(seed)
+        _, self.__post2, self.__low2 = self.__traverse(lambda succ: rng.sample(succ, len(succ)))
+        hubs = sorted(range(n), key=lambda c: (len(successors[c]) + 1) * (len(predecessors[c]) + 1),
+                      reverse=True)[:HUBS]
+        out_mask = [0] * n
+        in_mask = [0] * n
+        for bit, comp in enumerate(hubs):
+            out_mask[comp] = in_mask[comp] = 1 << bit
+        for comp in range(n - 1, -1, -1):
+            mask = out_mask[comp]
+            for other in successors[comp]:
+                mask |= out_mask[other]
+            out_mask[comp] = mask
+        for comp in range(n):
+            mask = in_mask[comp]
+            for other in predecessors[comp]:
+                mask |= in_mask[other]
+            in_mask[comp] = mask
+        self.__out_mask, self.__in_mask = out_mask, in_mask
+
+    def __traverse(self, shuffle) -> (list, list, list):
+        """
+        Depth first traversal of the whole DAG, from the components without predecessors in topological order.
+        @param shuffle: None, or a function giving the order to visit the successors of a component in
+        @return: The pre order and post order numbers of the components, and their lows:
+        the minimal post order number among the components they reach
+        """
+        successors = self.successors
+        n = len(successors)
+        pre = [-1] * n
+        post = [-1] * n
+        visits = 0
+        finished = 0
+        for root in range(n):
+            if pre[root] != -1:
+                continue
+            pre[root] = visits
+            visits += 1
+            work = [(root, iter(successors[root] if shuffle is None else shuffle(successors[root])))]
+            while work:
+                comp, children = work[-1]
+                for child in children:
+                    if pre[child] == -1:
+                        pre[child] = visits
+                        visits += 1
+                        work.append((child, iter(successors[child] if shuffle is None
+                                                 else shuffle(successors[child]))))
+                        break
+                else:
+                    work.pop()
+                    post[comp] = finished
+                    finished += 1
+        low = post[:]
+        # the successors come later in the topological order, their lows are final when a component's is computed
+        for comp in range(n - 1, -1, -1):
+            for child in successors[comp]:
+                if low[child] < low[comp]:
+                    low[comp] = low[child]
+        return pre, post, low
+
+    def __decide(self, c1: int, c2: int):
+        """returns True or False if the labels decide whether c1 reaches c2, None if they do not"""
+        if c1 == c2:
+            return True
+        if c1 > c2:
+            return False
+        post, low, post2, low2 = self.__post, self.__low, self.__post2, self.__low2
+        if not (low[c1] <= low[c2] and post[c2] <= post[c1] and low2[c1] <= low2[c2] and post2[c2] <= post2[c1]):
+            return False
+        if self.__pre[c1] <= self.__pre[c2] and post[c2] <= post[c1]:
+            return True
+        out1, out2 = self.__out_mask[c1], self.__out_mask[c2]
+        if out1 & self.__in_mask[c2]:
+            return True
+        if out2 & ~out1 or self.__in_mask[c1] & ~self.__in_mask[c2]:
+            return False
+        return None
+
+    def reaches(self, c1: int, c2: int, counter=None) -> bool:
+        """
+        Returns True if component c1 reaches component c2 in the DAG
+        @param counter: An optional QueryCounter, the components the search settles and their edges are counted into it
+        """
+        answer = self.__decide(c1, c2)
+        if answer is not None:
+            return answer
+        if counter is not None:
+            counter.mode = "dfs"
+        visited = {c1}
+        stack = [c1]
+        while stack:
+            comp = stack.pop()
+            if counter is not None:
+                counter.settled += 1
+                counter.relaxed += len(self.successors[comp])
+            for child in self.successors[comp]:
+                if child in visited:
+                    continue
+                visited.add(child)
+                answer = self.__decide(child, c2)
+                if answer:
+                    return True
+                if answer is None:
+                    stack.append(child)
+        return False
+
+    def is_reachable(self, id1: int, id2: int, counter=None) -> bool:
+        """
+        Returns True if there is a path from node id1 to node id2 (every node reaches itself)
+        @return: False if either node is not in the graph
+        """
+        c1 = self.component_of.get(id1)
+        c2 = self.component_of.get(id2)
+        if c1 is None or c2 is None:
+            return False
+        return self.reaches(c1, c2, counter)
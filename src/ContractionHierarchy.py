@@ -0,0 +1,254 @@
+import hashlib
+import heapq
+import json
+import math
+
+from src.GraphInterface import GraphInterface
+
+
+class ContractionHierarchy:
+    """
+    This class represents a contraction hierarchy of a directed weighted graph, a preprocessing
+    of the graph that answers shortest path queries by searching only a tiny part of it.
+    The nodes are contracted one by one in order of importance, the contraction of a node adds
+    shortcut edges between its neighbors for every shortest path that went through it.
+    A query is a bidirectional Dijkstra that only goes up the order, forward over the up edges
+    from the source and backward over the down edges from the target.
+    More info:
+    https://en.wikipedia.org/wiki/Contraction_hierarchies
+    """
+
+    def __init__(self, mc: int = 0, v_size: int = 0, e_size: int = 0, fingerprint: str = None):
+        self.mc = mc
+        self.v_size = v_size
+        self.e_size = e_size
+        self.fingerprint = fingerprint
+        self.up = {}
+        self.down = {}
+        self.middle = {}
+
+    @classmethod
+    def build(cls, graph: GraphInterface, witness_limit: int = 500,
+              core_limit: int = 1000) -> "ContractionHierarchy":
+        """
+        Builds the contraction hierarchy of a graph.
+        @param graph: The graph
+        @param witness_limit: The maximal number of nodes a witness search settles before giving up
+        and adding the shortcut, a higher limit adds less shortcuts but takes longer
+        @param core_limit: The contraction stops once the next node has more than core_limit pairs of
+        in and out neighbors, the remaining nodes are left as a core on top of the hierarchy whose edges
+        are searched in both directions. Dense (random like) graphs fill in quickly and would
+        otherwise take a very long time to contract.
+        @return: The contraction hierarchy of the graph at its current version
+        """
+        ch = cls(graph.get_mc(), graph.v_size(), graph.e_size(), _fingerprint(graph))
+        out_adj = {}
+        in_adj = {}
+        for key in graph.get_all_v().keys():
+            out_adj[key] = {dest: w for dest, w in graph.all_out_edges_of_node(key).items() if dest != key}
+            in_adj[key] = {src: w for src, w in graph.all_in_edges_of_node(key).items() if src != key}
+            ch.up[key] = {}
+            ch.down[key] = {}
+        deleted_neighbors = dict.fromkeys(out_adj, 0)
+        # nodes whose neighborhood changed since their priority was computed
+        dirty = set()
+
+        def priority(node):
+            shortcuts = ch.__shortcuts(out_adj, in_adj, node, witness_limit)
+            return len(shortcuts) - len(out_adj[node]) - len(in_adj[node]) + deleted_neighbors[node]
+
+        heap = [(priority(node), node) for node in out_adj]
+        heapq.heapify(heap)
+        while heap:
+            _, node = heapq.heappop(heap)
+            # lazy update: the priority may have grown since it was pushed
+            if node in dirty:
+                dirty.discard(node)
+                current = priority(node)
+                if heap and current > heap[0][0]:
+                    heapq.heappush(heap, (current, node))
+                    continue
+            if len(in_adj[node]) * len(out_adj[node]) > core_limit:
+                heapq.heappush(heap, (0, node))
+                break
+            for src, dest, w in ch.__shortcuts(out_adj, in_adj, node, witness_limit):
+                if w < out_adj[src].get(dest, math.inf):
+                    out_adj[src][dest] = w
+                    in_adj[dest][src] = w
+                    ch.middle[(src, dest)] = node
+            for dest, w in out_adj.pop(node).items():
+                ch.up[node][dest] = w
+                del in_adj[dest][node]
+                deleted_neighbors[dest] += 1
+                dirty.add(dest)
+            for src, w in in_adj.pop(node).items():
+                ch.down[node][src] = w
+                del out_adj[src][node]
+                deleted_neighbors[src] += 1
+                dirty.add(src)
+        # the core: its edges can be used by both the forward and the backward searches
+        for _, node in heap:
+            ch.up[node].update(out_adj[node])
+            ch.down[node].update(in_adj[node])
+        return ch
+
+    @staticmethod
+    def __shortcuts(out_adj: dict, in_adj: dict, node, witness_limit: int) -> list:
+        """
+        Finds the shortcuts needed to contract node: a shortcut src->dest is needed for every in neighbor src
+        and out neighbor dest whose shortest path in the remaining graph is the path through node.
+        @return: A list of (src, dest, weight) shortcuts
+        """
+        shortcuts = []
+        outs = out_adj[node]
+        if not outs:
+            return shortcuts
+        max_out = max(outs.values())
+        for src, w_in in in_adj[node].items():
+            limit = w_in + max_out
+            # witness search, Dijkstra from src that avoids node, bounded by distance and settled nodes
+            dist = {src: 0}
+            settled = set()
+            remaining = len(outs)
+            heap = [(0, src)]
+            while heap and len(settled) < witness_limit and remaining:
+                d, key = heapq.heappop(heap)
+                if key in settled:
+                    continue
+                if d > limit:
+                    break
+                settled.add(key)
+                if key in outs:
+                    remaining -= 1
+                for ni, w in out_adj[key].items():
+                    nd = d + w
+                    if ni != node and nd < dist.get(ni, math.inf):
+                        dist[ni] = nd
+                        heapq.heappush(heap, (nd, ni))
+            for dest, w_out in outs.items():
+                if dest == src:
+                    continue
+                via = w_in + w_out
+                if dist.get(dest, math.inf) > via:
+                    shortcuts.append((src, dest, via))
+        return shortcuts
+
+    def query(self, id1: int, id2: int, push=heapq.heappush, pop=heapq.heappop) -> (float, list):
+        """
+        Returns the shortest path from node id1 to node id2, with the shortcuts unpacked to the original nodes
+        @param id1: The start node id
+        @param id2: The end node id
+        @param push: The heap push function (heapq.heappush or a counting version of it)
+        @param pop: The heap pop function
+        @return: The distance of the path, a list of the nodes ids that the path goes through
+        """
+        if id1 not in self.up or id2 not in self.up:
+            return math.inf, []
+        if id1 == id2:
+            return 0, [id1]
+        dist = ({id1: 0}, {id2: 0})
+        parents = ({}, {})
+        settled = (set(), set())
+        heaps = ([(0, id1)], [(0, id2)])
+        edges = (self.up, self.down)
+        best = math.inf
+        meet = None
+        while heaps[0] or heaps[1]:
+            # each search stops on its own once its smallest distance can not improve the best path
+            for side in (0, 1):
+                if heaps[side] and heaps[side][0][0] >= best:
+                    heaps[side].clear()
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            if not heaps[side]:
+                break
+            d, node = pop(heaps[side])
+            if node in settled[side]:
+                continue
+            settled[side].add(node)
+            if node in dist[1 - side] and d + dist[1 - side][node] < best:
+                best = d + dist[1 - side][node]
+                meet = node
+            for ni, w in edges[side][node].items():
+                nd = d + w
+                if nd < dist[side].get(ni, math.inf):
+                    dist[side][ni] = nd
+                    parents[side][ni] = node
+                    push(heaps[side], (nd, ni))
+        if meet is None:
+            return math.inf, []
+        forward = [meet]
+        while forward[-1] in parents[0]:
+            forward.append(parents[0][forward[-1]])
+        forward.reverse()
+        backward = [meet]
+        while backward[-1] in parents[1]:
+            backward.append(parents[1][backward[-1]])
+        hierarchy_path = forward + backward[1:]
+        path = [id1]
+        for src, dest in zip(hierarchy_path, hierarchy_path[1:]):
+            self.__unpack(src, dest, path)
+        return best, path
+
+    def __unpack(self, src, dest, path: list):
+        """appends the original nodes of the edge src->dest, without src, to path"""
+        stack = [(src, dest)]
+        while stack:
+            u, v = stack.pop()
+            mid = self.middle.get((u, v))
+            if mid is None:
+                path.append(v)
+            else:
+                stack.append((mid, v))
+                stack.append((u, mid))
+
+    def save(self, file_name: str):
+        """
+        Saves the hierarchy to a JSON file
+        @param file_name: The path to the out file
+        """
+        json_dict = {"MC": self.mc, "V": self.v_size, "E": self.e_size, "Fingerprint": self.fingerprint,
+                     "Nodes": list(self.up.keys()),
+                     "Up": [[src, dest, w] for src, edges in self.up.items() for dest, w in edges.items()],
+                     "Down": [[dest, src, w] for dest, edges in self.down.items() for src, w in edges.items()],
+                     "Shortcuts": [[src, dest, mid] for (src, dest), mid in self.middle.items()]}
+        with open(file_name, "w") as o:
+            json.dump(json_dict, o)
+
+    @classmethod
+    def load(cls, file_name: str) -> "ContractionHierarchy":
+        """
+        Loads a hierarchy saved by save
+        @param file_name: The path to the json file
+        @return: The loaded hierarchy
+        """
+        with open(file_name, "r") as o:
+            json_dict = json.load(o)
+        ch = cls(json_dict["MC"], json_dict["V"], json_dict["E"], json_dict.get("Fingerprint"))
+        for key in json_dict["Nodes"]:
+            ch.up[key] = {}
+            ch.down[key] = {}
+        for src, dest, w in json_dict["Up"]:
+            ch.up[src][dest] = w
+        for dest, src, w in json_dict["Down"]:
+            ch.down[dest][src] = w
+        for src, dest, mid in json_dict["Shortcuts"]:
+            ch.middle[(src, dest)] = mid
+        return ch
+
+    def matches(self, graph: GraphInterface) -> bool:
+        """
+        returns True if the hierarchy was built from a graph with the same version, nodes and edges as this one.
+        Graphs loaded the same way have the same version, so the content is compared by its fingerprint
+        (a hash of all the nodes and edges), which takes a pass over the graph.
+        """
+        return self.mc == graph.get_mc() and self.v_size == graph.v_size() and self.e_size == graph.e_size() \
+            and self.fingerprint is not None and self.fingerprint == _fingerprint(graph)
+
+
+def _fingerprint(graph: GraphInterface) -> str:
+    """returns a hash of the node ids and the (src, dest, weight) edges of a graph, independent of their order"""
+    digest = hashlib.sha256()
+    for key in sorted(graph.get_all_v().keys()):
+        edges = sorted(graph.all_out_edges_of_node(key).items())
+        digest.update(repr((key, [(dest, float(w)) for dest, w in edges])).encode())
+    return digest.hexdigest()
@@ -0,0 +1,274 @@
+import heapq
+import os
+
+import numpy as np
+
+from src.CompactDiGraph import CompactDiGraph
+
+# a phase whose frontier has fewer out edges than this is relaxed in the calling process,
+# shipping it to the workers would cost more than relaxing it
+PARALLEL_EDGES = 1 << 16
+# the number of edges the parents are derived from at a time
+EDGES_PER_CHUNK = 1 << 20
+
+
+def delta_stepping(graph: CompactDiGraph, src: int, dest: int = None, workers: int = 1, delta: float = None,
+                   counter=None) -> np.ndarray:
+    """
+    Single source shortest paths by delta-stepping: the nodes are kept in buckets of width delta by their
+    tentative distance, and the buckets are settled in order, each one by relaxing the light edges
+    (weight <= delta) of all its nodes at once until the bucket stops changing, and then their heavy edges.
+    A bucket is relaxed as whole arrays, split over worker processes when it is big enough. The workers share
+    the graph as a memory mapped file (see GraphIO.shared_binary_graph) and read the distances from a shared
+    memory mapped array that only this process writes, between the phases.
+    The distances are exactly the ones Dijkstra's algorithm finds (the same sums of the same weights).
+    More info:
+    https://en.wikipedia.org/wiki/Parallel_single-source_shortest_path_algorithm#Delta_stepping_algorithm
+    @param graph: The graph
+    @param src: The array index of the start node
+    @param dest: If given, the search stops once the distance of this array index is final
+    @param workers: The number of worker processes, 1 runs everything in this process
+    @param delta: The width of the buckets, by default half the mean edge weight
+    @param counter: An optional QueryCounter, the nodes the phases relax and their edges are counted into it
+    @return: The array of the distances by array index, inf for the nodes that were not reached
+    (with dest, only the distances up to the distance of dest are final)
+    """
+    n = graph.v_size()
+    if delta is None:
+        delta = float(graph.out_weights.mean()) / 2 if graph.e_size() else 1.0
+    delta = delta if delta > 0 else 1.0
+    if workers <= 1 or n == 0:
+        dist = np.full(n, np.inf)
+        _search(graph, dist, src, dest, delta, None, counter)
+        return dist
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    from src.GraphIO import shared_binary_graph
+    with shared_binary_graph(graph) as shared, tempfile.TemporaryDirectory() as tmp:
+        dist_file = os.path.join(tmp, "dist")
+        dist = np.memmap(dist_file, dtype=np.float64, mode="w+", shape=(n,))
+        dist[:] = np.inf
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(shared, dist_file, delta))
+        try:
+            _search(graph, dist, src, dest, delta, (executor, workers), counter)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        result = np.array(dist)
+        del dist
+        return result
+
+
+def tree_parents(graph: CompactDiGraph, dist: np.ndarray, src: int, tie: np.ndarray = None) -> np.ndarray:
+    """
+    Derives the shortest path tree Dijkstra's algorithm builds from the final distances: the parent of a node is
+    its predecessor on a shortest path that Dijkstra settles first, nodes are settled by (distance, tie).
+    @param graph: The graph
+    @param dist: The distances from src by array index, see delta_stepping
+    @param src: The array index of the start node
+    @param tie: The values Dijkstra breaks distance ties by, by array index (the node ids when it ran on
+    a DiGraph), by default the array indices
+    @return: The array of the parents by array index, -1 for src and the nodes that were not reached
+    """
+    n = len(dist)
+    order, rank = _settle_order(graph, dist, src, tie, np.inf)
+    best = np.full(n, n, dtype=np.int64)
+    offsets = graph.out_offsets
+    m = graph.e_size()
+    for start in range(0, m, EDGES_PER_CHUNK):
+        edges = np.arange(start, min(start + EDGES_PER_CHUNK, m))
+        u = np.searchsorted(offsets, edges, side="right") - 1
+        v = graph.out_targets[edges]
+        tight = (dist[u] + graph.out_weights[edges] == dist[v]) & (rank[u] < rank[v])
+        np.minimum.at(best, v[tight], rank[u[tight]])
+    parents = np.full(n, -1, dtype=np.int64)
+    found = best < n
+    parents[found] = order[best[found]]
+    parents[src] = -1
+    return parents
+
+
+def path_to(graph: CompactDiGraph, dist: np.ndarray, src: int, dest: int, tie: np.ndarray = None) -> list:
+    """
+    Returns the path from src to dest that Dijkstra's algorithm finds (see tree_parents), walking back from dest
+    over the in edges
+    @return: The list of the array indices on the path, empty if dest was not reached
+    """
+    if not np.isfinite(dist[dest]):
+        return []
+    _, rank = _settle_order(graph, dist, src, tie, dist[dest])
+    path = [dest]
+    node = dest
+    while node != src:
+        start, end = graph.in_offsets[node], graph.in_offsets[node + 1]
+        sources = graph.in_sources[start:end]
+        tight = (dist[sources] + graph.in_weights[start:end] == dist[node]) & (rank[sources] < rank[node])
+        candidates = sources[tight]
+        node = int(candidates[np.argmin(rank[candidates])])
+        path.append(node)
+    path.reverse()
+    return path
+
+
+def _search(graph: CompactDiGraph, dist: np.ndarray, src: int, dest, delta: float, pool, counter):
+    """the delta-stepping loop, writes the distances into dist"""
+    dist[src] = 0
+    buckets = {0: [np.array([src], dtype=np.int64)]}
+    while buckets:
+        i = min(buckets)
+        if dest is not None and dist[dest] < i * delta:
+            break
+        frontier = np.unique(np.concatenate(buckets.pop(i)))
+        # entries of nodes that moved to a lower bucket since they were added are stale
+        frontier = frontier[np.floor_divide(dist[frontier], delta) == i]
+        settled = []
+        while frontier.size:
+            settled.append(frontier)
+            changed = _relax(graph, dist, frontier, True, delta, pool, counter)
+            frontier = _add_to_buckets(buckets, changed, dist, delta, i)
+        if settled:
+            _add_to_buckets(buckets, _relax(graph, dist, np.unique(np.concatenate(settled)), False, delta, pool,
+                                            counter), dist, delta, None)
+
+
+def _add_to_buckets(buckets: dict, nodes: np.ndarray, dist: np.ndarray, delta: float, current):
+    """adds nodes to the buckets of their distances, returns the ones that belong to the current bucket"""
+    index = np.floor_divide(dist[nodes], delta).astype(np.int64)
+    if current is not None:
+        here = index == current
+        result = nodes[here]
+        nodes, index = nodes[~here], index[~here]
+    else:
+        result = None
+    if nodes.size:
+        order = np.argsort(index, kind="stable")
+        nodes, index = nodes[order], index[order]
+        bounds = np.flatnonzero(np.diff(index)) + 1
+        for part, b in zip(np.split(nodes, bounds), index[np.concatenate(([0], bounds))].tolist()):
+            buckets.setdefault(b, []).append(part)
+    return result
+
+
+def _relax(graph: CompactDiGraph, dist: np.ndarray, frontier: np.ndarray, light: bool, delta: float, pool,
+           counter) -> np.ndarray:
+    """
+    Relaxes the light (or heavy) edges of the frontier nodes, in the worker processes if there are many,
+    and returns the nodes whose distance went down
+    """
+    offsets = graph.out_offsets
+    degrees = offsets[frontier + 1] - offsets[frontier]
+    total = int(degrees.sum())
+    if counter is not None:
+        counter.settled += len(frontier) if light else 0
+        counter.relaxed += total
+    if pool is None or total < PARALLEL_EDGES:
+        targets, candidates = _candidates(graph, dist, frontier, light, delta)
+    else:
+        executor, workers = pool
+        # chunks of about the same number of edges
+        bounds = np.searchsorted(np.cumsum(degrees), np.arange(1, workers) * (total / workers))
+        parts = [part for part in np.split(frontier, bounds) if part.size]
+        results = list(executor.map(_candidates_task, parts, [light] * len(parts)))
+        targets, candidates = _min_by_target(np.concatenate([r[0] for r in results]),
+                                             np.concatenate([r[1] for r in results]))
+    better = candidates < dist[targets]
+    targets = targets[better]
+    dist[targets] = candidates[better]
+    return targets
+
+
+def _candidates(graph: CompactDiGraph, dist: np.ndarray, frontier: np.ndarray, light: bool,
+                delta: float) -> (np.ndarray, np.ndarray):
+    """returns the targets of the light (or heavy) edges of the frontier that get shorter, with their new distance"""
+    offsets = graph.out_offsets
+    starts = offsets[frontier]
+    counts = offsets[frontier + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    ends = np.cumsum(counts)
+    edges = np.arange(total) + np.repeat(starts - (ends - counts), counts)
+    weights = graph.out_weights[edges]
+    keep = weights <= delta if light else weights > delta
+    targets = graph.out_targets[edges[keep]]
+    candidates = np.repeat(dist[frontier], counts)[keep] + weights[keep]
+    better = candidates < dist[targets]
+    return _min_by_target(targets[better], candidates[better])
+
+
+def _min_by_target(targets: np.ndarray, candidates: np.ndarray) -> (np.ndarray, np.ndarray):
+    """keeps the smallest candidate of every target"""
+    if targets.size == 0:
+        return targets, candidates
+    order = np.lexsort((candidates, targets))
+    targets, candidates = targets[order], candidates[order]
+    first = np.ones(len(targets), dtype=bool)
+    first[1:] = targets[1:] != targets[:-1]
+    return targets[first], candidates[first]
+
+
+def _settle_order(graph: CompactDiGraph, dist: np.ndarray, src: int, tie, limit: float) -> (np.ndarray, np.ndarray):
+    """
+    Returns the order Dijkstra's algorithm settles the nodes up to distance limit in, and the rank of every node
+    in it (len(dist) for the others). Nodes are settled by (distance, tie), except that a node with the same
+    distance as others can only be settled after one of its predecessors on a shortest path: with zero weight
+    edges the order of such a group is replayed with a heap, like Dijkstra pops it.
+    """
+    n = len(dist)
+    final = np.isfinite(dist) & (dist <= limit)
+    nodes = np.flatnonzero(final)
+    ties = nodes if tie is None else tie[nodes]
+    order = nodes[np.lexsort((ties, dist[nodes]))]
+    rank = np.full(n, n, dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    zero = np.flatnonzero(graph.out_weights == 0)
+    if zero.size == 0:
+        return order, rank
+    u = np.searchsorted(graph.out_offsets, zero, side="right") - 1
+    v = graph.out_targets[zero]
+    inside = final[u] & final[v] & (u != v) & (dist[u] == dist[v])
+    u, v = u[inside], v[inside]
+    for distance in np.unique(dist[v]).tolist():
+        group = np.flatnonzero(final & (dist == distance))
+        first = int(rank[group].min())
+        zero_next = {}
+        here = dist[u] == distance
+        for a, b in zip(u[here].tolist(), v[here].tolist()):
+            zero_next.setdefault(a, []).append(b)
+        heap = []
+        reached = set()
+        for node in group.tolist():
+            start, end = graph.in_offsets[node], graph.in_offsets[node + 1]
+            sources = graph.in_sources[start:end]
+            if node == src or np.any((dist[sources] < distance) &
+                                     (dist[sources] + graph.in_weights[start:end] == distance)):
+                reached.add(node)
+                heapq.heappush(heap, (node if tie is None else tie[node], node))
+        replayed = []
+        while heap:
+            _, node = heapq.heappop(heap)
+            replayed.append(node)
+            for other in zero_next.get(node, ()):
+                if other not in reached:
+                    reached.add(other)
+                    heapq.heappush(heap, (other if tie is None else tie[other], other))
+        order[first:first + len(replayed)] = replayed
+        rank[replayed] = np.arange(first, first + len(replayed))
+    return order, rank
+
+
+_worker_graph = None
+_worker_dist = None
+_worker_delta = None
+
+
+def _init_worker(graph: CompactDiGraph, dist_file: str, delta: float):
+    """initializes a worker process with the shared graph and distances"""
+    global _worker_graph, _worker_dist, _worker_delta
+    _worker_graph = graph
+    _worker_dist = np.memmap(dist_file, dtype=np.float64, mode="r")
+    _worker_delta = delta
+
+
+def _candidates_task(frontier: np.ndarray, light: bool) -> (np.ndarray, np.ndarray):
+    return _candidates(_worker_graph, _worker_dist, frontier, light, _worker_delta)
@@ -1,16 +1,80 @@
+import threading
+from types import MappingProxyType
+
 from src.GraphInterface import GraphInterface
 
+# the edges of a node without edges, shared and read only: reading the edges must not create the dictionaries
+_NO_EDGES = MappingProxyType({})
+# a SharedNodeData with more out edges than this keeps them in a dictionary instead of scanning its edge list
+SHARED_LIST_DEGREE = 32
+
 
 class NodeData:
-    """This class represents a node in graph"""
+    """
+    This class represents a node in graph.
+    The edge dictionaries are only created when the first edge is added (add_out, add_in), nodes without edges
+    do not have them and edges_in and edges_out give an empty read only mapping.
+    """
+
+    __slots__ = ("key", "pos", "weight", "tag", "__edges_in", "__edges_out")
 
     def __init__(self, key, pos: tuple = None, weight: float = 0):
         self.key = key
         self.pos = pos
         self.weight = weight
         self.tag = 0
-        self.edges_in = {}
-        self.edges_out = {}
+        self.__edges_in = None
+        self.__edges_out = None
+
+    @property
+    def edges_in(self) -> dict:
+        """the in edges of the node, source node id -> weight"""
+        edges = self.__edges_in
+        return _NO_EDGES if edges is None else edges
+
+    @property
+    def edges_out(self) -> dict:
+        """the out edges of the node, destination node id -> weight"""
+        edges = self.__edges_out
+        return _NO_EDGES if edges is None else edges
+
+    def add_out(self, dest: "NodeData", weight: float):
+        """records the edge self->dest in the out edges of this node"""
+        if self.__edges_out is None:
+            self.__edges_out = {}
+        # the keys of the edges are the node keys objects, not copies of them
+        self.__edges_out[dest.key] = weight
+
+    def add_in(self, src: "NodeData", weight: float):
+        """records the edge src->self in the in edges of this node"""
+        if self.__edges_in is None:
+            self.__edges_in = {}
+        self.__edges_in[src.key] = weight
+
+    def remove_in(self, src: "NodeData"):
+        """removes the edge src->self from the in edges of this node"""
+        del self.__edges_in[src.key]
+
+    def has_out(self, key) -> bool:
+        """returns True if this node has an out edge to the node key"""
+        edges = self.__edges_out
+        return edges is not None and key in edges
+
+    def remove_out(self, key):
+        """removes the edge self->key from the out edges of this node"""
+        del self.__edges_out[key]
+
+    def out_items(self):
+        """returns the (destination node id, weight) pairs of the out edges of this node"""
+        return self.edges_out.items()
+
+    def in_items(self):
+        """returns the (source node id, weight) pairs of the in edges of this node"""
+        return self.edges_in.items()
+
+    def in_sources(self) -> list:
+        """returns the ids of the sources of the in edges of this node"""
+        return list(self.edges_in.keys())
 
     def __eq__(self, other):
         if self is None:
@@ -41,6 +105,12 @@ class NodeData:
     def __hash__(self):
         return hash(self.key)
 
+    def __getstate__(self):
+        return self.key, self.pos, self.weight, self.tag, self.__edges_in, self.__edges_out
+
+    def __setstate__(self, state):
+        self.key, self.pos, self.weight, self.tag, self.__edges_in, self.__edges_out = state
+
     def to_json(self):
         try:
             if self.pos is None:
@@ -51,14 +121,145 @@ class NodeData:
             print(e)
 
 
+class SharedNodeData(NodeData):
+    """
+    A node of a graph that stores every edge weight once: only in the out edges of its source.
+    All the edges of the node are kept in one list: the ids of the destinations of its out edges,
+    their weights in the same order, then the source nodes of its in edges.
+    Finding an out edge scans the list, so a node with more than SHARED_LIST_DEGREE out edges
+    moves them into a dictionary. edges_out and edges_in build new dictionaries.
+    """
+
+    __slots__ = ("__edges", "__outs", "__out_dict")
+
+    def __init__(self, key, pos: tuple = None, weight: float = 0):
+        super().__init__(key, pos, weight)
+        # the list of the edges, with the number of out edges at its start (0 once they are in __out_dict)
+        self.__edges = None
+        self.__outs = 0
+        self.__out_dict = None
+
+    @property
+    def edges_out(self) -> dict:
+        """the out edges of the node, destination node id -> weight (a new dictionary, changing it does not
+        change the graph)"""
+        return dict(self.out_items())
+
+    @property
+    def edges_in(self) -> dict:
+        """the in edges of the node, source node id -> weight (a new dictionary, changing it does not change the
+        graph)"""
+        return dict(self.in_items())
+
+    def out_items(self):
+        if self.__out_dict is not None:
+            return self.__out_dict.items()
+        edges, outs = self.__edges, self.__outs
+        return zip(edges[:outs], edges[outs:2 * outs]) if outs else ()
+
+    def in_items(self):
+        key = self.key
+        return [(src.key, src.__out_weight(key)) for src in self.__sources()]
+
+    def has_out(self, key) -> bool:
+        if self.__out_dict is not None:
+            return key in self.__out_dict
+        outs = self.__outs
+        return outs != 0 and key in self.__edges[:outs]
+
+    def add_out(self, dest: NodeData, weight: float):
+        out_dict = self.__out_dict
+        if out_dict is not None:
+            out_dict[dest.key] = weight
+            return
+        edges, outs = self.__edges, self.__outs
+        if edges is None:
+            self.__edges = [dest.key, weight]
+            self.__outs = 1
+        elif outs < SHARED_LIST_DEGREE:
+            edges.insert(outs, dest.key)
+            edges.insert(2 * outs + 1, weight)
+            self.__outs = outs + 1
+        else:
+            out_dict = dict(zip(edges[:outs], edges[outs:2 * outs]))
+            out_dict[dest.key] = weight
+            del edges[:2 * outs]
+            self.__out_dict = out_dict
+            self.__outs = 0
+
+    def remove_out(self, key):
+        out_dict = self.__out_dict
+        if out_dict is not None:
+            del out_dict[key]
+            return
+        edges, outs = self.__edges, self.__outs
+        i = edges.index(key, 0, outs)
+        del edges[outs + i]
+        del edges[i]
+        self.__outs = outs - 1
+
+    def add_in(self, src: NodeData, weight: float):
+        if self.__edges is None:
+            self.__edges = [src]
+        else:
+            self.__edges.append(src)
+
+    def remove_in(self, src: NodeData):
+        edges = self.__edges
+        # by identity, NodeData equality compares the edges
+        for i in range(2 * self.__outs, len(edges)):
+            if edges[i] is src:
+                del edges[i]
+                return
+
+    def in_sources(self) -> list:
+        return [src.key for src in self.__sources()]
+
+    def __sources(self) -> list:
+        """returns the source nodes of the in edges of this node"""
+        edges = self.__edges
+        return edges[2 * self.__outs:] if edges else []
+
+    def __out_weight(self, key) -> float:
+        """returns the weight of the edge self->key"""
+        if self.__out_dict is not None:
+            return self.__out_dict[key]
+        edges, outs = self.__edges, self.__outs
+        return edges[outs + edges.index(key, 0, outs)]
+
+    def __getstate__(self):
+        return super().__getstate__(), self.__edges, self.__outs, self.__out_dict
+
+    def __setstate__(self, state):
+        super().__setstate__(state[0])
+        self.__edges, self.__outs, self.__out_dict = state[1:]
+
+
 class DiGraph(GraphInterface):
     """This class represents a directed weighted graph """
 
-    def __init__(self):
+    def __init__(self, shared_weights: bool = False):
+        """
+        @param shared_weights: If True every edge weight is stored once, in the out edges of its source,
+        and all the edges of a node are kept in a single list (see SharedNodeData).
+        The edges take less than half the memory (see benchmarks/node_memory.py), all_out_edges_of_node and
+        all_in_edges_of_node build a new dictionary on every call and removing an edge costs the degree
+        of its ends.
+        """
         self.vertex = {}
+        self.__node_class = SharedNodeData if shared_weights else NodeData
         self.__vertex_size = 0
         self.__edge_size = 0
         self.__mode_count = 0
+        self.__listeners = []
+        # the changes of the graph and the building of snapshots exclude each other
+        self.__lock = threading.RLock()
+        self.__snapshot = None
+        # the changes since the last snapshot, None while they are not recorded (see snapshot)
+        self.__snapshot_changes = None
+        self.__snapshot_pending = 0
+        self.__snapshot_building = threading.Lock()
+        self.__journal = None
 
     def v_size(self) -> int:
         """
@@ -85,7 +286,8 @@ class DiGraph(GraphInterface):
         each node is represented using a pair (other_node_id, weight)
          """
         if id1 in self.vertex:
-            return self.vertex.get(id1).edges_in
+            # a node without edges has a shared read only mapping, the callers get a dictionary of their own
+            return self.vertex.get(id1).edges_in or {}
         else:
             return None
 
@@ -94,7 +296,8 @@ class DiGraph(GraphInterface):
         (other_node_id, weight)
         """
         if id1 in self.vertex:
-            return self.vertex.get(id1).edges_out
+            # a node without edges has a shared read only mapping, the callers get a dictionary of their own
+            return self.vertex.get(id1).edges_out or {}
         else:
             return None
 
@@ -116,14 +319,18 @@ class DiGraph(GraphInterface):
 
         Note: If the edge already exists or one of the nodes dose not exists the functions will do nothing
         """
-        if id1 in self.vertex and id2 in self.vertex and weight >= 0:
-            if id2 not in self.vertex.get(id1).edges_out:
-                self.vertex.get(id1).edges_out[id2] = weight
-                self.vertex.get(id2).edges_in[id1] = weight
-                self.__edge_size += 1
-                self.__mode_count += 1
-                return True
-        return False
+        with self.__lock:
+            if id1 in self.vertex and id2 in self.vertex and weight >= 0:
+                if not self.vertex.get(id1).has_out(id2):
+                    src, dest = self.vertex.get(id1), self.vertex.get(id2)
+                    src.add_out(dest, weight)
+                    dest.add_in(src, weight)
+                    self.__edge_size += 1
+                    self.__mode_count += 1
+                    if self.__listeners:
+                        self.__notify("add_edge", (id1, id2, weight))
+                    return True
+            return False
 
     def add_node(self, node_id: int, pos: tuple = None) -> bool:
         """
@@ -134,14 +341,17 @@ class DiGraph(GraphInterface):
 
         Note: if the node id already exists the node will not be added
         """
-        if node_id in self.vertex:
-            return False
-        else:
-            node_data = NodeData(key=node_id, pos=pos)
-            self.vertex[node_id] = node_data
-            self.__vertex_size += 1
-            self.__mode_count += 1
-            return True
+        with self.__lock:
+            if node_id in self.vertex:
+                return False
+            else:
+                node_data = self.__node_class(key=node_id, pos=pos)
+                self.vertex[node_id] = node_data
+                self.__vertex_size += 1
+                self.__mode_count += 1
+                if self.__listeners:
+                    self.__notify("add_node", (node_id, pos))
+                return True
 
     def remove_node(self, node_id: int) -> bool:
         """
@@ -151,20 +361,22 @@ class DiGraph(GraphInterface):
 
         Note: if the node id does not exists the function will do nothing
         """
-        if node_id in self.vertex:
-            if self.all_in_edges_of_node(node_id) is not None:
-                for key in self.all_in_edges_of_node(node_id).keys():
-                    self.vertex.get(key).edges_out.pop(node_id)
+        with self.__lock:
+            if node_id in self.vertex:
+                node = self.vertex.get(node_id)
+                for key in node.in_sources():
+                    self.vertex.get(key).remove_out(node_id)
                     self.__edge_size -= 1
-            if self.all_out_edges_of_node(node_id) is not None:
-                for key in self.all_out_edges_of_node(node_id).keys():
-                    self.vertex.get(key).edges_in.pop(node_id)
+                for key, _ in node.out_items():
+                    self.vertex.get(key).remove_in(node)
                     self.__edge_size -= 1
-            self.__vertex_size -= 1
-            self.__mode_count += 1
-            self.vertex.pop(node_id)
-            return True
-        return False
+                self.__vertex_size -= 1
+                self.__mode_count += 1
+                self.vertex.pop(node_id)
+                if self.__listeners:
+                    self.__notify("remove_node", (node_id,))
+                return True
+            return False
 
     def remove_edge(self, node_id1: int, node_id2: int) -> bool:
         """
@@ -175,16 +387,274 @@ class DiGraph(GraphInterface):
 
         Note: If such an edge does not exists the function will do nothing
         """
-        if node_id1 in self.vertex and node_id2 in self.vertex:
-            if node_id2 in self.vertex.get(node_id1).edges_out:
-                self.vertex.get(node_id1).edges_out.pop(node_id2)
-                self.vertex.get(node_id2).edges_in.pop(node_id1)
+        with self.__lock:
+            if node_id1 in self.vertex and node_id2 in self.vertex:
+                if self.vertex.get(node_id1).has_out(node_id2):
+                    self.vertex.get(node_id1).remove_out(node_id2)
+                    self.vertex.get(node_id2).remove_in(self.vertex.get(node_id1))
+                    self.__mode_count += 1
+                    self.__edge_size -= 1
+                    if self.__listeners:
+                        self.__notify("remove_edge", (node_id1, node_id2))
+                    return True
+
+            return False
+
+    def add_nodes_from(self, nodes) -> int:
+        """
+        Adds many nodes to the graph, the version of the graph is increased once for the whole batch.
+        @param nodes: An iterable (or a NumPy array) of node ids or of (node_id, pos) pairs
+        @return: The number of nodes that were added
+
+        Note: node ids that already exist are skipped, like in add_node
+        """
+        with self.__lock:
+            if hasattr(nodes, "ndim"):
+                nodes = nodes.tolist()
+            vertex = self.vertex
+            node_class = self.__node_class
+            added = 0
+            changes = [] if self.__listeners else None
+            for node in nodes:
+                if isinstance(node, tuple):
+                    node_id, pos = node
+                else:
+                    node_id, pos = node, None
+                if node_id not in vertex:
+                    vertex[node_id] = node_class(key=node_id, pos=pos)
+                    added += 1
+                    if changes is not None:
+                        changes.append((node_id, pos))
+            if added:
+                self.__vertex_size += added
                 self.__mode_count += 1
-                self.__edge_size -= 1
-                return True
+                if changes is not None:
+                    self.__notify("add_nodes", changes)
+            return added
+
+    def add_edges_from(self, edges) -> int:
+        """
+        Adds many edges to the graph, the version of the graph is increased once for the whole batch.
+        @param edges: An iterable of (id1, id2, weight) triples, or a NumPy array of shape (m, 3)
+        @return: The number of edges that were added
 
+        Note: edges that already exist, have a negative weight or a missing end are skipped, like in add_edge
+        """
+        with self.__lock:
+            if hasattr(edges, "ndim"):
+                edges = zip(edges[:, 0].astype("int64").tolist(), edges[:, 1].astype("int64").tolist(),
+                            edges[:, 2].tolist())
+            vertex = self.vertex
+            added = 0
+            changes = [] if self.__listeners else None
+            last_id = src = None
+            for id1, id2, weight in edges:
+                # edges are usually grouped by their source, so the source lookup is reused
+                if id1 != last_id or src is None:
+                    src = vertex.get(id1)
+                    last_id = id1
+                if src is None or weight < 0 or src.has_out(id2):
+                    continue
+                dest = vertex.get(id2)
+                if dest is not None:
+                    src.add_out(dest, weight)
+                    dest.add_in(src, weight)
+                    added += 1
+                    if changes is not None:
+                        changes.append((id1, id2, weight))
+            if added:
+                self.__edge_size += added
+                self.__mode_count += 1
+                if changes is not None:
+                    self.__notify("add_edges", changes)
+            return added
+
+    def remove_edges_from(self, edges) -> int:
+        """
+        Removes many edges from the graph, the version of the graph is increased once for the whole batch.
+        @param edges: An iterable of (id1, id2) pairs, or a NumPy array of shape (m, 2), extra columns are ignored
+        @return: The number of edges that were removed
+
+        Note: pairs that are not an edge of the graph are skipped, like in remove_edge
+        """
+        with self.__lock:
+            if hasattr(edges, "ndim"):
+                edges = zip(edges[:, 0].astype("int64").tolist(), edges[:, 1].astype("int64").tolist())
+            vertex = self.vertex
+            removed = 0
+            changes = [] if self.__listeners else None
+            for edge in edges:
+                id1, id2 = edge[0], edge[1]
+                src = vertex.get(id1)
+                if src is not None and src.has_out(id2):
+                    src.remove_out(id2)
+                    vertex[id2].remove_in(src)
+                    removed += 1
+                    if changes is not None:
+                        changes.append((id1, id2))
+            if removed:
+                self.__edge_size -= removed
+                self.__mode_count += 1
+                if changes is not None:
+                    self.__notify("remove_edges", changes)
+            return removed
+
+    def add_listener(self, listener) -> None:
+        """
+        Registers a function that is called after every change of the graph, as listener(op, args, mc):
+        op is the name of the method that changed the graph ("add_node", "add_edge", "remove_node",
+        "remove_edge", "add_nodes", "add_edges" or "remove_edges"), args are its effective arguments
+        (a list of the added or removed items for the batch methods) and mc is the new version of the graph.
+        Without listeners the changes cost nothing extra.
+        @param listener: The function to call
+        """
+        self.__listeners.append(listener)
+
+    def remove_listener(self, listener) -> bool:
+        """
+        Unregisters a function registered with add_listener
+        @param listener: The function
+        @return: True if the function was registered, False o.w.
+        """
+        if listener in self.__listeners:
+            self.__listeners.remove(listener)
+            return True
         return False
 
+    def __notify(self, op: str, args):
+        # a copy, listeners may be removed meanwhile (see GraphAlgo's SCC listener)
+        for listener in tuple(self.__listeners):
+            listener(op, args, self.__mode_count)
+
+    def freeze(self):
+        """
+        Builds an immutable compact snapshot of this graph, stored in NumPy arrays.
+        The snapshot is not affected by later changes of this graph.
+        @return: A CompactDiGraph with the same nodes, positions and edges
+        """
+        from src.CompactDiGraph import CompactDiGraph
+        with self.__lock:
+            return CompactDiGraph.from_graph(self)
+
+    def snapshot(self, latest: bool = True):
+        """
+        Returns a consistent, immutable view of a version of the graph for readers in other threads.
+        The view is built once per version: while get_mc() does not change every call returns the same
+        CompactDiGraph without any locking. The first view is a full copy (freeze) taken while holding off
+        the writers, after that the changes of the graph are recorded and the next version is built from the
+        previous view and the recorded changes (see CompactDiGraph.with_changes), in NumPy and without the
+        writers lock. One thread builds a version at a time. Readers never see a half done change.
+        @param latest: If True the view is of the current version, built if needed (waiting for a build
+        in progress). If False, while another thread builds the next version the previous one is returned
+        instead of waiting
+        @return: A CompactDiGraph, its get_mc() is the version it was taken at
+        """
+        snapshot = self.__snapshot
+        if snapshot is not None and snapshot.get_mc() == self.__mode_count:
+            return snapshot
+        if not self.__snapshot_building.acquire(blocking=latest or snapshot is None):
+            return snapshot
+        try:
+            with self.__lock:
+                base, changes, mc = self.__snapshot, self.__snapshot_changes, self.__mode_count
+                if base is not None and base.get_mc() == mc:
+                    return base
+                if base is None or changes is None:
+                    snapshot = self.freeze()
+                    self.__snapshot = snapshot
+                    self.__record_changes(True)
+                    return snapshot
+                self.__snapshot_changes = []
+                self.__snapshot_pending = 0
+            # the changes up to version mc were recorded in order, later ones go to the new list
+            snapshot = base.with_changes(changes, mc)
+            self.__snapshot = snapshot
+            return snapshot
+        finally:
+            self.__snapshot_building.release()
+
+    def __record_changes(self, record: bool):
+        """starts (with an empty list) or stops recording the changes for the next snapshot"""
+        if record:
+            self.__snapshot_changes = []
+            self.__snapshot_pending = 0
+            if self.__record_change not in self.__listeners:
+                self.add_listener(self.__record_change)
+        else:
+            self.__snapshot_changes = None
+            self.remove_listener(self.__record_change)
+
+    def __record_change(self, op: str, args, mc: int):
+        """the listener that records the changes for the next snapshot, called while holding the lock"""
+        self.__snapshot_changes.append((op, args))
+        self.__snapshot_pending += len(args) if op in ("add_nodes", "add_edges", "remove_edges") else 1
+        # once the changes are about as big as the graph a full copy is as cheap, and the list stops growing
+        snapshot = self.__snapshot
+        if self.__snapshot_pending > max(1024, snapshot.v_size() + snapshot.e_size()):
+            self.__record_changes(False)
+
+    def enable_journal(self, directory: str, log_ratio: float = 1.0, sync: bool = False):
+        """
+        Starts logging every change of the graph to an append only journal in directory, so the graph
+        is persisted at the cost of its changes instead of its size (see GraphJournal).
+        A snapshot of the current graph is written first, the previous contents of the directory
+        are replaced by it. Use GraphJournal.recover_graph to load the graph back after a restart.
+        @param directory: The directory of the snapshots and logs
+        @param log_ratio: A checkpoint (a new snapshot) is taken when the log grows past log_ratio times
+        the size of the snapshot
+        @param sync: If True every change is fsynced to the disk before the changing method returns
+        @return: The GraphJournal
+        """
+        from src.GraphJournal import GraphJournal
+        with self.__lock:
+            self.disable_journal()
+            journal = GraphJournal(self, directory, log_ratio, sync)
+            journal.checkpoint()
+            self.__journal = journal
+            self.add_listener(journal)
+            return journal
+
+    def disable_journal(self) -> bool:
+        """
+        Stops the journal started by enable_journal, its directory stays recoverable
+        @return: True if the graph had a journal, False o.w.
+        """
+        with self.__lock:
+            if self.__journal is None:
+                return False
+            self.remove_listener(self.__journal)
+            self.__journal.close()
+            self.__journal = None
+            return True
+
+    def checkpoint(self) -> bool:
+        """
+        Compacts the journal: writes a snapshot of the graph and starts a new empty log
+        @return: True if the graph has a journal, False o.w.
+        """
+        with self.__lock:
+            if self.__journal is None:
+                return False
+            self.__journal.checkpoint()
+            return True
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_DiGraph__lock"]
+        del state["_DiGraph__snapshot_building"]
+        state["_DiGraph__snapshot"] = None
+        state["_DiGraph__snapshot_changes"] = None
+        # a copy of the graph is not journaled
+        state["_DiGraph__listeners"] = [listener for listener in self.__listeners
+                                        if listener is not self.__journal and listener != self.__record_change]
+        state["_DiGraph__journal"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.RLock()
+        self.__snapshot_building = threading.Lock()
+
     def __eq__(self, other):
         if other is None or other.__class__ != self.__class__:
             return False
@@ -1,12 +1,20 @@
-import json
 from typing import List
 
 from src.GraphAlgoInterface import GraphAlgoInterface
 from src.DiGraph import DiGraph, NodeData
+from src.GraphIO import load_json_graph, save_json_graph, save_binary_graph, load_binary_graph, shared_binary_graph
+from src.ContractionHierarchy import ContractionHierarchy
+from src.Condensation import Condensation
+from src.Instrumentation import QueryCounter, QueryStats, RingBufferSink
+from collections import namedtuple, OrderedDict
+import heapq
 import math
-import queue
-import matplotlib.pyplot as plt
-import numpy as np
+import sys
+import threading
+import time
+import weakref
+
+Adjacency = namedtuple("Adjacency", ["nodes", "internal", "external", "out_edges", "in_edges", "pos"])
 
 
 class GraphAlgo(GraphAlgoInterface):
@@ -18,8 +26,43 @@ class GraphAlgo(GraphAlgoInterface):
     to compute connected components of either node or entire graph and return it.
     """
 
-    def __init__(self, graph: DiGraph = DiGraph()):
+    def __init__(self, graph: DiGraph = DiGraph(), tree_cache_nodes: int = 1000000):
+        """
+        @param graph: The graph the algorithms work on
+        @param tree_cache_nodes: The maximal total number of nodes of the cached shortest path trees
+        """
         self.graph = graph
+        self.__scc_graph = None
+        self.__scc_mc = -1
+        self.__scc_label = {}
+        self.__scc_members = {}
+        self.__scc_order = {}
+        self.__scc_next = 0
+        self.__scc_list = None
+        self.__scc_parallel = None
+        self.__scc_listener = None
+        self.__scc_listener_graph = None
+        self.__scc_finalizer = None
+        self.__trees = OrderedDict()
+        self.__trees_lock = threading.Lock()
+        self.__trees_graph = None
+        self.__trees_mc = -1
+        self.__trees_nodes = 0
+        self.__tree_cache_nodes = tree_cache_nodes
+        self.__tree_hits = 0
+        self.__tree_misses = 0
+        self.__scale = None
+        self.__scale_graph = None
+        self.__scale_mc = -1
+        self.__query_index = None
+        self.__query_index_graph = None
+        self.__condensation = None
+        self.__condensation_graph = None
+        self.__layouts = {}
+        self.__layouts_graph = None
+        self.__layouts_mc = -1
+        self.__sink = None
+        self.__reader = None
 
     def get_graph(self) -> DiGraph:
         """
@@ -27,74 +70,366 @@ class GraphAlgo(GraphAlgoInterface):
         """
         return self.graph
 
-    def load_from_json(self, file_name: str) -> bool:
+    def reader(self, latest: bool = True) -> "GraphAlgo":
+        """
+        Returns the algorithms over a consistent immutable snapshot of the current version of the graph
+        (see DiGraph.snapshot), for queries from threads that run while another thread changes the graph.
+        The same reader is returned until the graph changes, so its caches are shared by all the reader threads.
+        @param latest: If False, while another thread builds the snapshot of the current version the reader of
+        the previous one is returned instead of waiting
+        @return: A GraphAlgo on the snapshot, or this GraphAlgo if the graph is immutable already
+        """
+        if not isinstance(self.graph, DiGraph):
+            return self
+        snapshot = self.graph.snapshot(latest)
+        reader = self.__reader
+        if reader is None or reader.graph is not snapshot:
+            reader = GraphAlgo(snapshot, self.__tree_cache_nodes)
+            self.__reader = reader
+        return reader
+
+    def load_from_json(self, file_name: str, shared_weights: bool = False) -> bool:
+        """
+        Loads a graph from a json file, the file is streamed so large files are never held in memory as a whole.
+        Gzip compressed files are read as well.
+        @param file_name: The path to the json file
+        @param shared_weights: If True the graph stores every edge once, see DiGraph
+        @returns True if the loading was successful, False o.w.
+        """
+        try:
+            self.graph = load_json_graph(file_name, shared_weights)
+            return True
+        except IOError as e:
+            print(e)
+            return False
+
+    def save_to_json(self, file_name: str, compress: bool = None) -> bool:
+        """
+        Saves the graph in JSON format, streamed to the file and atomically renamed into place,
+        see GraphIO.save_json_graph
+        @param file_name: The path to the out file
+        @param compress: If True the file is gzip compressed, by default it is if file_name ends with ".gz"
+        @return: True if the save was successful, False o.w.
+        """
         try:
-            with open(file_name, "r") as o:
-                json_string = json.load(o)
-            g = DiGraph()
-            for node in json_string["Nodes"]:
-                if "pos" in node:
-                    pos = tuple(map(float, str(node["pos"]).split(",")))
-                    g.add_node(node_id=node["id"], pos=pos)
-                else:
-                    g.add_node(node_id=node["id"])
-
-            for edge in json_string["Edges"]:
-                g.add_edge(id1=edge["src"], id2=edge["dest"], weight=edge["w"])
-            self.graph = g
+            save_json_graph(self.graph, file_name, compress)
             return True
         except IOError as e:
             print(e)
+            return False
 
-    def save_to_json(self, file_name: str) -> bool:
+    def save_binary(self, file_name: str) -> bool:
+        """
+        Saves the graph in the compact binary format, see GraphIO.save_binary_graph
+        @param file_name: The path to the out file
+        @return: True if the save was successful, False o.w.
+        """
         try:
-            with open(file_name, "w") as o:
-                json.dump(self.graph.to_json(), default=lambda a: a.to_json(), fp=o)
+            save_binary_graph(self.graph, file_name)
+            return True
         except IOError as e:
             print(e)
+            return False
 
-    def shortest_path(self, id1: int, id2: int) -> (float, list):
+    def load_binary(self, file_name: str, mmap: bool = True) -> bool:
+        """
+        Loads a graph saved by save_binary, the loaded graph is an immutable CompactDiGraph.
+        @param file_name: The path to the binary file
+        @param mmap: If True the graph is memory mapped from the file (no copies, shared between processes),
+        otherwise it is read into memory
+        @returns True if the loading was successful, False o.w.
+        """
+        try:
+            self.graph = load_binary_graph(file_name, mmap)
+            return True
+        except (IOError, ValueError) as e:
+            print(e)
+            return False
+
+    def shortest_path(self, id1: int, id2: int, bidirectional: bool = False, heuristic: str = None,
+                      workers: int = 1) -> (float, list):
         """
         Returns the shortest path from node id1 to node id2 using Dijkstra's Algorithm
         @param id1: The start node id
         @param id2: The end node id
+        @param bidirectional: If True, search forward from id1 and backward (over the in edges) from id2
+        at the same time, which settles far fewer nodes on large sparse graphs
+        @param heuristic: "euclidean" to run A* guided by the distance between the nodes positions,
+        scaled down so it never overestimates the remaining weight. If some node has no position
+        the plain search is used. bidirectional is ignored when a heuristic is used.
+        @param workers: If more than 1, the search is a delta-stepping over this many worker processes
+        (see DeltaStepping), for single huge queries. It finds the same distance and path as Dijkstra's
+        Algorithm, bidirectional and heuristic are ignored.
         @return: The distance of the path, a list of the nodes ids that the path goes through
         Notes:
         If there is no path between id1 and id2, or one of them dose not exist the function returns (float('inf'),[])
         More info:
         https://en.wikipedia.org/wiki/Dijkstra's_algorithm
         """
-        if id1 not in self.graph.get_all_v().keys() or id2 not in self.graph.get_all_v().keys():
+        if self.__sink is None:
+            return self.__shortest_path(id1, id2, bidirectional, heuristic, workers, None)
+        counter, start = QueryCounter(), time.perf_counter()
+        result = self.__shortest_path(id1, id2, bidirectional, heuristic, workers, counter)
+        self.__sink(counter.stats("shortest_path", (id1, id2), time.perf_counter() - start, self.graph.get_mc()))
+        return result
+
+    def __shortest_path(self, id1: int, id2: int, bidirectional: bool, heuristic: str, workers: int,
+                        counter: QueryCounter) -> (float, list):
+        """shortest_path, counting its work with counter if it is not None"""
+        # a point to point query does not build a tree, not finding one is not a miss
+        tree = self.__cached_tree(id1, False)
+        if tree is not None:
+            if counter is not None:
+                counter.mode = counter.cache = "tree"
+            dist, parents = tree
+            if id2 not in dist:
+                return math.inf, []
+            return dist[id2], self.__build_path(parents, id2)
+        # the index was built from (or matched when loaded against) this graph object, its version tells if it changed
+        if self.__query_index is not None and self.__query_index_graph is self.graph \
+                and self.__query_index.mc == self.graph.get_mc():
+            if counter is None:
+                return self.__query_index.query(id1, id2)
+            counter.mode = counter.cache = "query_index"
+            return self.__query_index.query(id1, id2, counter.push, counter.pop)
+        if workers > 1:
+            return self.__delta_stepping(id1, id2, workers, counter)
+        adj, push, pop = self.__counted(self.__adjacency(), counter)
+        src, dest = adj.internal(id1), adj.internal(id2)
+        if src is None or dest is None:
             return math.inf, []
-        node_src = self.graph.vertex.get(id1)
-        node_dest = self.graph.vertex.get(id2)
-        self.set_graph_to_inf()
-        node_src.weight = 0
-        q = queue.PriorityQueue()
-        parents = {}
-        path = []
-        q.put(node_src)
-        visited = set()
-        while not q.empty():
-            node_curr = q.get()
-            if node_curr not in visited:
-                visited.add(node_curr)
-                for key in self.graph.all_out_edges_of_node(node_curr.key).keys():
-                    node = self.graph.vertex.get(key)
-                    dist = node_curr.weight + node_curr.edges_out.get(key)
-                    if dist < node.weight:
-                        node.weight = dist
-                        parents[node] = node_curr
-                    q.put(node)
-        if node_dest.weight == math.inf:
+        if heuristic is not None:
+            if heuristic != "euclidean":
+                raise ValueError(f"unknown heuristic: {heuristic}")
+            scale = self.__euclidean_scale()
+            if scale is not None:
+                if counter is not None:
+                    counter.mode = "a_star"
+                dist, path = self.__a_star(adj, src, dest, scale, push, pop)
+                return dist, [adj.external(node) for node in path]
+        if bidirectional:
+            if counter is not None:
+                counter.mode = "bidirectional"
+            dist, path = self.__bidirectional_dijkstra(adj, src, dest, push, pop)
+            return dist, [adj.external(node) for node in path]
+        if counter is not None:
+            counter.mode = "dijkstra"
+        dist, parents = self.__dijkstra(adj, src, dest, push, pop)
+        if dest not in dist:
             return math.inf, []
+        return dist[dest], [adj.external(node) for node in self.__build_path(parents, dest)]
+
+    def build_query_index(self, witness_limit: int = 500, core_limit: int = 1000) -> ContractionHierarchy:
+        """
+        Preprocesses the graph into a contraction hierarchy, shortest_path answers from it (with the shortcuts
+        unpacked to real paths) until the graph changes, then it falls back to Dijkstra's Algorithm.
+        @param witness_limit: see ContractionHierarchy.build
+        @param core_limit: see ContractionHierarchy.build
+        @return: The contraction hierarchy
+        """
+        self.__query_index = ContractionHierarchy.build(self.graph, witness_limit, core_limit)
+        self.__query_index_graph = self.graph
+        return self.__query_index
+
+    def save_query_index(self, file_name: str) -> bool:
+        """
+        Saves the query index built by build_query_index to a JSON file
+        @param file_name: The path to the out file
+        @return: True if the save was successful, False o.w. (also if there is no index)
+        """
+        if self.__query_index is None:
+            return False
+        try:
+            self.__query_index.save(file_name)
+            return True
+        except IOError as e:
+            print(e)
+            return False
+
+    def load_query_index(self, file_name: str) -> bool:
+        """
+        Loads a query index saved by save_query_index, it is used only if it was built from
+        the current version of the graph: the same version, nodes and edges (see ContractionHierarchy.matches)
+        @param file_name: The path to the json file
+        @return: True if the index was loaded and matches the graph, False o.w.
+        """
+        try:
+            index = ContractionHierarchy.load(file_name)
+        except IOError as e:
+            print(e)
+            return False
+        if not index.matches(self.graph):
+            return False
+        self.__query_index = index
+        self.__query_index_graph = self.graph
+        return True
+
+    def shortest_path_tree(self, src: int, workers: int = 1) -> (dict, dict):
+        """
+        Computes the shortest paths from src to every node it reaches, using a single run of Dijkstra's Algorithm.
+        The trees are kept in a least recently used cache until the graph changes (its get_mc() value),
+        and while the tree of id1 is cached shortest_path(id1, id2) only rebuilds the path from it.
+        @param src: The start node id
+        @param workers: If more than 1, the tree is computed by delta-stepping over this many worker processes
+        (see DeltaStepping), it is the same tree Dijkstra's Algorithm builds
+        @return: A dictionary of the distances of the reachable nodes, a dictionary of their parents on the paths,
+        both keyed by node id (the dictionaries are shared with the cache and should not be modified)
+
+        Notes:
+        If src is not in the graph the function returns ({}, {})
+        """
+        if self.__sink is None:
+            return self.__shortest_path_tree(src, workers, None)
+        counter, start = QueryCounter(), time.perf_counter()
+        result = self.__shortest_path_tree(src, workers, counter)
+        self.__sink(counter.stats("shortest_path_tree", (src,), time.perf_counter() - start, self.graph.get_mc()))
+        return result
+
+    def __shortest_path_tree(self, src: int, workers: int, counter: QueryCounter) -> (dict, dict):
+        """shortest_path_tree, counting its work with counter if it is not None"""
+        tree = self.__cached_tree(src, True)
+        if tree is not None:
+            if counter is not None:
+                counter.mode = counter.cache = "tree"
+            return tree
+        graph, mc = self.graph, self.graph.get_mc()
+        if workers > 1:
+            tree = self.__delta_stepping(src, None, workers, counter)
+            self.__cache_tree(src, tree, graph, mc)
+            return tree
+        adj, push, pop = self.__counted(self.__adjacency(), counter)
+        node = adj.internal(src)
+        if node is None:
+            return {}, {}
+        if counter is not None:
+            counter.mode = "dijkstra"
+        dist, parents = self.__dijkstra(adj, node, None, push, pop)
+        if not _is_compact(self.graph):
+            tree = (dist, parents)
         else:
-            node = node_dest
-            while node is not None:
-                path.append(node.key)
-                node = parents.get(node)
-            path.reverse()
-        return node_dest.weight, path
+            tree = ({adj.external(node): d for node, d in dist.items()},
+                    {adj.external(node): adj.external(parent) for node, parent in parents.items()})
+        self.__cache_tree(src, tree, graph, mc)
+        return tree
+
+    def __delta_stepping(self, id1: int, id2, workers: int, counter: QueryCounter):
+        """
+        Runs delta-stepping from id1 on a compact copy of the graph (see DiGraph.snapshot).
+        @return: The (distance, path) to id2 like shortest_path, or the tree of id1 like shortest_path_tree
+        if id2 is None
+        """
+        import numpy as np
+        from src import DeltaStepping
+        graph = self.graph if _is_compact(self.graph) else self.graph.snapshot()
+        # Dijkstra breaks distance ties by the node: by array index on a CompactDiGraph, by id on a DiGraph
+        tie = None if graph is self.graph else graph.keys
+        src = graph.index_of(id1)
+        dest = None if id2 is None else graph.index_of(id2)
+        if src is None or (id2 is not None and dest is None):
+            return (math.inf, []) if id2 is not None else ({}, {})
+        if counter is not None:
+            counter.mode = "delta_stepping"
+        dist = DeltaStepping.delta_stepping(graph, src, dest, workers, counter=counter)
+        keys = graph.keys.tolist()
+        if id2 is not None:
+            path = DeltaStepping.path_to(graph, dist, src, dest, tie)
+            return (float(dist[dest]), [keys[node] for node in path]) if path else (math.inf, [])
+        parents = DeltaStepping.tree_parents(graph, dist, src, tie)
+        reached = np.flatnonzero(np.isfinite(dist)).tolist()
+        parent_list = parents.tolist()
+        return ({keys[node]: d for node, d in zip(reached, dist[reached].tolist())},
+                {keys[node]: keys[parent_list[node]] for node in reached if node != src})
+
+    def tree_cache_info(self) -> dict:
+        """
+        Returns the statistics of the shortest path trees cache
+        @return: A dictionary with the number of hits (the queries answered from a cached tree) and misses
+        (the trees computed by shortest_path_tree because they were not cached), the number of cached trees,
+        their total number of nodes and the maximal total number of nodes
+        """
+        with self.__trees_lock:
+            return {"hits": self.__tree_hits, "misses": self.__tree_misses, "trees": len(self.__trees),
+                    "nodes": self.__trees_nodes, "max_nodes": self.__tree_cache_nodes}
+
+    def __cached_tree(self, src: int, miss: bool):
+        """
+        returns the cached shortest path tree of src, or None if it is not cached or the graph has changed
+        @param miss: True if the tree is computed (and cached) when it is not found, only then it counts as a miss
+        """
+        with self.__trees_lock:
+            if self.__trees_graph is not self.graph or self.__trees_mc != self.graph.get_mc():
+                self.__trees.clear()
+                self.__trees_nodes = 0
+                self.__trees_graph = self.graph
+                self.__trees_mc = self.graph.get_mc()
+            tree = self.__trees.get(src)
+            if tree is not None:
+                self.__trees.move_to_end(src)
+                self.__tree_hits += 1
+            elif miss:
+                self.__tree_misses += 1
+            return tree
+
+    def __cache_tree(self, src: int, tree: tuple, graph, mc: int):
+        """
+        Adds a shortest path tree of the given graph version to the cache,
+        evicting the least recently used trees to stay in its bound.
+        """
+        size = len(tree[0])
+        with self.__trees_lock:
+            if graph is not self.__trees_graph or mc != self.__trees_mc:
+                return
+            if size > self.__tree_cache_nodes or src in self.__trees:
+                return
+            while self.__trees_nodes + size > self.__tree_cache_nodes:
+                _, old = self.__trees.popitem(last=False)
+                self.__trees_nodes -= len(old[0])
+            self.__trees[src] = tree
+            self.__trees_nodes += size
+
+    def distance_matrix(self, sources: list, targets: list, workers: int = 1) -> "np.ndarray":
+        """
+        Computes the shortest path distances from every source to every target, with one single source
+        search per source.
+        @param sources: The source node ids
+        @param targets: The target node ids
+        @param workers: The number of worker processes to spread the searches over, 1 runs them in this process
+        @return: A (len(sources), len(targets)) array of the distances, inf where there is no path
+        """
+        import numpy as np
+        sources = list(sources)
+        targets = list(targets)
+        matrix = np.full((len(sources), len(targets)), math.inf)
+        for i, row in self.iter_distance_matrix(sources, targets, workers):
+            matrix[i] = row
+        return matrix
+
+    def iter_distance_matrix(self, sources: list, targets: list, workers: int = 1):
+        """
+        Streaming version of distance_matrix, yields the rows of the matrix as they are computed.
+        The worker processes share one memory mapped copy of the graph (see GraphIO.shared_binary_graph),
+        so the graph is never pickled per task.
+        @param sources: The source node ids
+        @param targets: The target node ids
+        @param workers: The number of worker processes, 1 runs the searches in this process
+        @return: A generator of (source position, row array) pairs, in completion order
+        """
+        sources = list(sources)
+        targets = list(targets)
+        if workers <= 1 or len(sources) <= 1:
+            for i, src in enumerate(sources):
+                yield i, _distance_row(self, src, targets)
+            return
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with shared_binary_graph(self.graph) as graph:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_distance_worker,
+                                           initargs=(graph, targets))
+            try:
+                futures = {executor.submit(_distance_row_task, src): i for i, src in enumerate(sources)}
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
 
     def connected_component(self, id1: int) -> list:
         """
@@ -105,63 +440,390 @@ class GraphAlgo(GraphAlgoInterface):
         Notes:
         If the graph is None or id1 is not in the graph, the function should return an empty list []
         """
-        if self.graph is None or id1 not in self.graph.get_all_v():
+        if self.graph is None or self.__adjacency().internal(id1) is None:
             return []
-        self.set_graph_to_inf()
-        scc = self.__kosaraju(id1)
-        return scc
+        if self.__sink is None:
+            self.__update_scc()
+        else:
+            self.__update_scc_recorded("connected_component", (id1,))
+        return sorted(self.__scc_members[self.__scc_label[id1]])
 
-    def connected_components(self) -> List[list]:
+    def connected_components(self, workers: int = 1) -> List[list]:
         """
         Finds all the Strongly Connected Component(SCC) in the graph.
+        @param workers: If more than 1 and the SCC labeling does not match the graph, the components are found
+        by forward-backward decomposition over this many worker processes (see ParallelSCC), they are the same
+        components in the same order
         @return: The list all SCC
         Notes:
         If the graph is None the function should return an empty list []
         """
         if self.graph is None:
             return [[]]
-        self.set_graph_to_inf()
-        scc_list = []
-        for node in self.graph.get_all_v().keys():
-            if self.graph.vertex.get(node).tag == 0:
-                scc = self.__kosaraju(node)
-                for n in scc:
-                    self.graph.vertex.get(n).tag = 1
-                scc_list.append(scc)
+        if workers > 1 and not (self.__scc_graph is self.graph and self.__scc_mc == self.graph.get_mc()):
+            if self.__sink is None:
+                return [list(scc) for scc in self.__parallel_scc(workers)]
+            start = time.perf_counter()
+            cached = self.__scc_parallel is not None and self.__scc_parallel[:2] == (self.graph, self.graph.get_mc())
+            scc_list = self.__parallel_scc(workers)
+            if cached:
+                stats = QueryStats("connected_components", (), "scc", "scc", None, None, None, None, 0.0,
+                                   self.graph.get_mc())
+            else:
+                stats = QueryStats("connected_components", (), "forward_backward", None, self.graph.v_size(), None,
+                                   None, self.graph.e_size(), 0.0, self.graph.get_mc())
+            self.__sink(stats._replace(elapsed=time.perf_counter() - start))
+            return [list(scc) for scc in scc_list]
+        if self.__sink is None:
+            self.__update_scc()
+        else:
+            self.__update_scc_recorded("connected_components", ())
+        if self.__scc_list is None:
+            # order the components by the first node of each in the graph's iteration order
+            adj = self.__adjacency()
+            label = self.__scc_label
+            seen = set()
+            scc_list = []
+            for node in adj.nodes:
+                comp = label[adj.external(node)]
+                if comp not in seen:
+                    seen.add(comp)
+                    scc_list.append(sorted(self.__scc_members[comp]))
+            self.__scc_list = scc_list
+        return [list(scc) for scc in self.__scc_list]
+
+    def __parallel_scc(self, workers: int) -> List[list]:
+        """
+        Returns the components found by ParallelSCC on a compact copy of the graph (see DiGraph.snapshot),
+        ordered like connected_components orders them. They are kept until the graph changes (its get_mc() value).
+        """
+        graph, mc = self.graph, self.graph.get_mc()
+        if self.__scc_parallel is not None and self.__scc_parallel[0] is graph and self.__scc_parallel[1] == mc:
+            return self.__scc_parallel[2]
+        import numpy as np
+        from src import ParallelSCC
+        compact = graph if _is_compact(graph) else graph.snapshot()
+        labels = ParallelSCC.strongly_connected_components(compact, workers)
+        # the array order is the graph's iteration order, a stable sort keeps it inside every component
+        order = np.argsort(labels, kind="stable")
+        bounds = np.flatnonzero(np.diff(labels[order])) + 1
+        parts = np.split(order, bounds) if len(order) else []
+        keys = compact.keys
+        scc_list = [sorted(keys[part].tolist()) for part in sorted(parts, key=lambda part: part[0])]
+        self.__scc_parallel = (graph, mc, scc_list)
         return scc_list
 
-    def plot_graph(self) -> None:
+    def condensation(self) -> Condensation:
+        """
+        Returns the condensation of the graph (the DAG of its SCC) with its reachability labels, see Condensation.
+        It is built from the SCC labeling once per version of the graph (get_mc()).
+        @return: The Condensation of the current version of the graph
+        """
+        graph = self.graph
+        condensation = self.__condensation
+        if condensation is not None and self.__condensation_graph is graph and condensation.mc == graph.get_mc():
+            return condensation
+        self.__update_scc()
+        members, label = self.__scc_members, self.__scc_label
+        comps = sorted(members, key=self.__scc_order.__getitem__)
+        index = {comp: i for i, comp in enumerate(comps)}
+        adj = self.__adjacency()
+        successors = [set() for _ in comps]
+        for node in adj.nodes:
+            own = index[label[adj.external(node)]]
+            succ = successors[own]
+            for ni, _ in adj.out_edges(node):
+                other = index[label[adj.external(ni)]]
+                if other != own:
+                    succ.add(other)
+        condensation = Condensation([sorted(members[comp]) for comp in comps], [sorted(succ) for succ in successors],
+                                    graph.get_mc())
+        self.__condensation = condensation
+        self.__condensation_graph = graph
+        return condensation
+
+    def is_reachable(self, id1: int, id2: int) -> bool:
+        """
+        Returns True if there is a path from node id1 to node id2, answered by the labels of the condensation
+        in constant time for most pairs, and by a search of the condensation pruned by them for the rest.
+        @param id1: The start node id
+        @param id2: The end node id
+        @return: True if id2 is reachable from id1 (every node reaches itself), False if not or if a node
+        is not in the graph
+        """
+        if self.graph is None:
+            return False
+        if self.__sink is None:
+            return self.condensation().is_reachable(id1, id2)
+        start = time.perf_counter()
+        counter = QueryCounter()
+        counter.mode = "labels"
+        reachable = self.condensation().is_reachable(id1, id2, counter)
+        if counter.mode == "labels":
+            counter.cache = "reachability"
+        self.__sink(counter.stats("is_reachable", (id1, id2), time.perf_counter() - start, self.graph.get_mc()))
+        return reachable
+
+    def layout(self, method: str = "spring", seed: int = 0) -> dict:
+        """
+        Computes positions for the nodes that have no position (see GraphLayout).
+        The positions are cached until the graph changes, so replotting does not compute them again.
+        @param method: "spring" for a force directed layout or "spectral" for a faster spectral layout
+        @param seed: The layout is the same on every run with the same seed
+        @return: A dictionary of node id -> (x, y, 0.0) of the nodes without a position
+        """
+        from src import GraphLayout
+        if method not in GraphLayout.LAYOUTS:
+            raise ValueError(f"unknown layout {method}")
+        graph, mc = self.graph, self.graph.get_mc()
+        if self.__layouts_graph is not graph or self.__layouts_mc != mc:
+            self.__layouts = {}
+            self.__layouts_graph = graph
+            self.__layouts_mc = mc
+        positions = self.__layouts.get((method, seed))
+        if positions is None:
+            positions = GraphLayout.LAYOUTS[method](graph, seed=seed)
+            self.__layouts[(method, seed)] = positions
+        return positions
+
+    def plot_graph(self, file_name: str = None, max_edges: int = None, layout: str = "spring") -> None:
         """
         Plots the graph.
         If the nodes have a position, the nodes will be placed there.
-        Otherwise, they will be placed in a random but elegant manner.
+        Otherwise, they will be placed by the layout (see layout), the same way on every run.
+        The graph is not modified, all the edges are drawn in one batch (see GraphPlot.plot_graph).
+        @param file_name: If given the plot is saved to this file (png, svg...) without opening a window
+        @param max_edges: If given and the graph has more edges, only a uniform sample of max_edges edges is drawn
+        @param layout: The layout of the nodes without a position, "spring" or "spectral"
         @return: None
         """
-        x_list = []
-        y_list = []
-        key_list = []
-        for node in self.graph.get_all_v().values():
-            if node.pos is None:
-                node.pos = (np.random.randint(0, 30), np.random.randint(0, 30), np.random.randint(0, 30))
-            x_list.append(node.pos[0])
-            y_list.append(node.pos[1])
-            key_list.append(node.key)
-        fig, ax = plt.subplots()
-        ax.scatter(x_list, y_list)
-        for i, txt in enumerate(key_list):
-            ax.annotate(key_list[i], {x_list[i], y_list[i]})
-        plt.plot(x_list, y_list, ".", color='red')
-        for node in self.graph.get_all_v().values():
-            x_src = node.pos[0]
-            y_src = node.pos[1]
-            for edge in self.graph.all_out_edges_of_node(node.key).keys():
-                node_dest = self.graph.vertex.get(edge)
-                x_dest = node_dest.pos[0]
-                y_dest = node_dest.pos[1]
-                plt.arrow(x_src, y_src, (x_dest - x_src), (y_dest - y_src), length_includes_head=True, width=0.00001,
-                          head_width=0.00006, color='black')
-        plt.title("graph")
-        plt.show()
+        # matplotlib and the plotting code are only loaded by the first plot
+        from src import GraphPlot
+        GraphPlot.plot_graph(self.graph, file_name, max_edges, positions=self.layout(layout))
+
+    def enable_instrumentation(self, sink=None):
+        """
+        Starts recording a QueryStats record (see Instrumentation) for every shortest_path, shortest_path_tree,
+        connected_component, connected_components and is_reachable call: the search used, whether a cache answered it,
+        the nodes settled, heap pushes and pops, edges relaxed and the wall time.
+        While it is off the queries run the exact same code without any counting.
+        @param sink: A function called with every record, by default a new RingBufferSink
+        @return: The sink
+        """
+        if sink is None:
+            sink = RingBufferSink()
+        self.__sink = sink
+        return sink
+
+    def disable_instrumentation(self):
+        """Stops recording the queries"""
+        self.__sink = None
+
+    @staticmethod
+    def __counted(adj: Adjacency, counter: QueryCounter) -> (Adjacency, object, object):
+        """returns the adjacency and heap push and pop functions of a search, counting versions if counter is given"""
+        if counter is None:
+            return adj, heapq.heappush, heapq.heappop
+        return (adj._replace(out_edges=counter.edges(adj.out_edges), in_edges=counter.edges(adj.in_edges)),
+                counter.push, counter.pop)
+
+    def __update_scc_recorded(self, op: str, args: tuple):
+        """__update_scc, recording whether the labeling was current or recomputed by Tarjan's algorithm"""
+        start = time.perf_counter()
+        current = self.__scc_graph is self.graph and self.__scc_mc == self.graph.get_mc()
+        self.__update_scc()
+        if current:
+            stats = QueryStats(op, args, "scc", "scc", None, None, None, None, 0.0, self.graph.get_mc())
+        else:
+            stats = QueryStats(op, args, "tarjan", None, self.graph.v_size(), None, None, self.graph.e_size(),
+                               0.0, self.graph.get_mc())
+        self.__sink(stats._replace(elapsed=time.perf_counter() - start))
+
+    def __adjacency(self) -> Adjacency:
+        """
+        Returns the accessors the algorithms run on, for either graph representation:
+        the internal nodes, functions mapping a node id to its internal node (None if it does not exist)
+        and back, functions from an internal node to the (internal node, weight) pairs of its out
+        and in edges, and a function from an internal node to its position.
+        A DiGraph is traversed by node ids and a CompactDiGraph by array indices.
+        """
+        if _is_compact(self.graph):
+            keys = self.graph.keys
+            return Adjacency(range(self.graph.v_size()), self.graph.index_of, lambda i: int(keys[i]),
+                             self.graph.out_edges_at, self.graph.in_edges_at, self.graph.pos_at)
+        vertex = self.graph.get_all_v()
+        return Adjacency(vertex.keys(), lambda key: key if key in vertex else None, lambda key: key,
+                         lambda key: vertex[key].out_items(), lambda key: vertex[key].in_items(),
+                         lambda key: vertex[key].pos)
+
+    @staticmethod
+    def __dijkstra(adj: Adjacency, src, dest=None, push=heapq.heappush, pop=heapq.heappop) -> (dict, dict):
+        """
+        Dijkstra's algorithm from src, the distances and parents are kept in local dictionaries
+        so the nodes of the graph are never modified and queries may run concurrently.
+        @param adj: The adjacency of the graph
+        @param src: The start node
+        @param dest: If given, the search stops as soon as this node is settled
+        @param push: The heap push function (heapq.heappush or a counting version of it)
+        @param pop: The heap pop function
+        @return: A dictionary of the settled nodes distances, a dictionary of their parents
+        """
+        dist = {src: 0}
+        parents = {}
+        settled = {}
+        heap = [(0, src)]
+        while heap:
+            d, key = pop(heap)
+            if key in settled:
+                continue
+            settled[key] = d
+            if key == dest:
+                break
+            for ni, w in adj.out_edges(key):
+                if ni in settled:
+                    continue
+                nd = d + w
+                if nd < dist.get(ni, math.inf):
+                    dist[ni] = nd
+                    parents[ni] = key
+                    push(heap, (nd, ni))
+        return settled, parents
+
+    @staticmethod
+    def __bidirectional_dijkstra(adj: Adjacency, src, dest, push=heapq.heappush,
+                                 pop=heapq.heappop) -> (float, list):
+        """
+        Bidirectional Dijkstra: a forward search from src over the out edges and a backward search from dest
+        over the in edges, each step expands the side whose heap has the smaller top. The best path seen
+        through an edge between the two searches is final once the sum of both tops reaches its length.
+        @param adj: The adjacency of the graph
+        @param src: The start node
+        @param dest: The end node
+        @param push: The heap push function (heapq.heappush or a counting version of it)
+        @param pop: The heap pop function
+        @return: The distance of the path, the list of nodes of the path
+        """
+        if src == dest:
+            return 0, [src]
+        dist = ({src: 0}, {dest: 0})
+        parents = ({}, {})
+        settled = (set(), set())
+        heaps = ([(0, src)], [(0, dest)])
+        edges = (adj.out_edges, adj.in_edges)
+        best = math.inf
+        meet = None
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            d, node = pop(heaps[side])
+            if node in settled[side]:
+                continue
+            settled[side].add(node)
+            own_dist, other_dist = dist[side], dist[1 - side]
+            for ni, w in edges[side](node):
+                if ni in settled[side]:
+                    continue
+                nd = d + w
+                if nd < own_dist.get(ni, math.inf):
+                    own_dist[ni] = nd
+                    parents[side][ni] = node
+                    push(heaps[side], (nd, ni))
+                if ni in other_dist and nd + other_dist[ni] < best:
+                    best = nd + other_dist[ni]
+                    meet = ni
+            if node in other_dist and d + other_dist[node] < best:
+                best = d + other_dist[node]
+                meet = node
+        if meet is None:
+            return math.inf, []
+        path = GraphAlgo.__build_path(parents[0], meet)
+        node = meet
+        while node in parents[1]:
+            node = parents[1][node]
+            path.append(node)
+        return best, path
+
+    def __euclidean_scale(self):
+        """
+        Returns the largest factor by which the euclidean distance between the ends of every edge is at most
+        its weight, so the scaled distance to the target is an admissible and consistent A* heuristic.
+        The factor is cached until the graph changes.
+        @return: The factor, or None if some node has no position
+        """
+        graph, mc = self.graph, self.graph.get_mc()
+        if self.__scale_graph is graph and self.__scale_mc == mc:
+            return self.__scale
+        if _is_compact(graph):
+            import numpy as np
+            scale = None
+            if not np.isnan(graph.pos[:, 0]).any():
+                sources = np.repeat(np.arange(graph.v_size()), np.diff(graph.out_offsets))
+                lengths = np.linalg.norm(graph.pos[sources] - graph.pos[graph.out_targets], axis=1)
+                positive = lengths > 0
+                ratios = graph.out_weights[positive] / lengths[positive]
+                scale = float(ratios.min()) if len(ratios) else 0.0
+        elif any(node.pos is None for node in graph.get_all_v().values()):
+            scale = None
+        else:
+            scale = math.inf
+            vertex = graph.get_all_v()
+            for node in vertex.values():
+                for dest, w in node.out_items():
+                    length = math.dist(node.pos, vertex[dest].pos)
+                    if length > 0 and w / length < scale:
+                        scale = w / length
+            if scale == math.inf:
+                scale = 0.0
+        if scale is not None:
+            # keep the heuristic a little below the bound, so rounding errors never make it overestimate
+            scale *= 1 - 1e-9
+        self.__scale, self.__scale_graph, self.__scale_mc = scale, graph, mc
+        return scale
+
+    @staticmethod
+    def __a_star(adj: Adjacency, src, dest, scale: float, push=heapq.heappush, pop=heapq.heappop) -> (float, list):
+        """
+        A* search from src to dest, with the euclidean distance to dest multiplied by scale as the heuristic.
+        @param adj: The adjacency of the graph
+        @param src: The start node
+        @param dest: The end node
+        @param scale: The factor of the heuristic, it must keep the heuristic consistent
+        @param push: The heap push function (heapq.heappush or a counting version of it)
+        @param pop: The heap pop function
+        @return: The distance of the path, the list of nodes of the path
+        """
+        target = adj.pos(dest)
+        dist = {src: 0}
+        parents = {}
+        settled = set()
+        heap = [(scale * math.dist(adj.pos(src), target), src)]
+        while heap:
+            _, key = pop(heap)
+            if key in settled:
+                continue
+            if key == dest:
+                return dist[key], GraphAlgo.__build_path(parents, key)
+            settled.add(key)
+            d = dist[key]
+            for ni, w in adj.out_edges(key):
+                if ni in settled:
+                    continue
+                nd = d + w
+                if nd < dist.get(ni, math.inf):
+                    dist[ni] = nd
+                    parents[ni] = key
+                    push(heap, (nd + scale * math.dist(adj.pos(ni), target), ni))
+        return math.inf, []
+
+    @staticmethod
+    def __build_path(parents: dict, dest: int) -> list:
+        """builds the path that ends at dest by following the parents dictionary back to the source"""
+        path = [dest]
+        while path[-1] in parents:
+            path.append(parents[path[-1]])
+        path.reverse()
+        return path
 
     def set_graph_to_inf(self):
         """method to help with dijkstra algorithm, initializing all nodes weight to infinite"""
@@ -169,22 +831,256 @@ class GraphAlgo(GraphAlgoInterface):
             node.weight = math.inf
             node.tag = 0
 
-    def __kosaraju(self, src: int):
-        visited_in = set()
-        visited_out = set()
-        stack_out = [src]
-        stack_in = [src]
-        while stack_out:
-            pop = stack_out.pop()
-            if pop not in visited_in:
-                visited_in.add(pop)
-                for node in self.graph.all_out_edges_of_node(pop).keys():
-                    stack_out.append(node)
-        while stack_in:
-            pop = stack_in.pop()
-            if pop not in visited_out:
-                visited_out.add(pop)
-                for node in self.graph.all_in_edges_of_node(pop).keys():
-                    stack_in.append(node)
-        common = visited_in - (visited_in - visited_out)
-        return list(common)
+    def __update_scc(self):
+        """
+        Makes sure the SCC labeling matches the current version of the graph.
+        The labeling (a component id per node, the members and a topological order of the components)
+        is computed once with Tarjan's algorithm and then kept up to date on every change of a DiGraph,
+        through its listener. It is recomputed from nothing only if the graph object was replaced or
+        changed in a way the listener did not follow.
+        """
+        graph = self.graph
+        if self.__scc_graph is graph and self.__scc_mc == graph.get_mc():
+            return
+        adj = self.__adjacency()
+        components = self.__tarjan(adj)
+        label = {}
+        members = {}
+        order = {}
+        # Tarjan finds the components in reverse topological order
+        for comp, scc in enumerate(components):
+            keys = {adj.external(node) for node in scc}
+            members[comp] = keys
+            order[comp] = (len(components) - comp,)
+            for key in keys:
+                label[key] = comp
+        self.__scc_label, self.__scc_members, self.__scc_order = label, members, order
+        self.__scc_next = len(components) + 1
+        self.__scc_list = None
+        self.__scc_graph = graph
+        self.__scc_mc = graph.get_mc()
+        if self.__scc_listener_graph is not graph:
+            if self.__scc_listener_graph is not None:
+                self.__scc_finalizer.detach()
+                self.__scc_listener_graph.remove_listener(self.__scc_listener)
+                self.__scc_listener_graph = None
+            if isinstance(graph, DiGraph):
+                # the graph must not keep every GraphAlgo that ever labeled it alive (and updating its labeling):
+                # the listener holds this object weakly and is unregistered once this object is collected
+                on_change = weakref.WeakMethod(self.__on_graph_change)
+
+                def listener(op, args, mc):
+                    method = on_change()
+                    if method is not None:
+                        method(graph, op, args, mc)
+                self.__scc_listener = listener
+                graph.add_listener(listener)
+                self.__scc_finalizer = weakref.finalize(self, graph.remove_listener, listener)
+                self.__scc_listener_graph = graph
+
+    def __on_graph_change(self, graph: DiGraph, op: str, args, mc: int):
+        """updates the SCC labeling after a change of the graph, called by the graph's listener"""
+        if graph is not self.__scc_graph:
+            return
+        if self.__scc_mc != mc - 1:
+            self.__scc_mc = -1
+            return
+        self.__scc_list = None
+        label = self.__scc_label
+        if op == "add_node":
+            self.__scc_new_component({args[0]})
+        elif op == "add_nodes":
+            for node_id, _ in args:
+                self.__scc_new_component({node_id})
+        elif op == "add_edge":
+            self.__scc_insert_edge(args[0], args[1])
+        elif op == "remove_edge":
+            if label[args[0]] == label[args[1]]:
+                self.__scc_split(label[args[0]])
+        elif op == "remove_edges":
+            for comp in {label[id1] for id1, id2 in args if label[id1] == label[id2]}:
+                self.__scc_split(comp)
+        elif op == "remove_node":
+            comp = label.pop(args[0])
+            self.__scc_members[comp].discard(args[0])
+            if self.__scc_members[comp]:
+                self.__scc_split(comp)
+            else:
+                del self.__scc_members[comp]
+                del self.__scc_order[comp]
+        else:
+            # the edges of a batch are not ordered, following them one by one would search a graph
+            # that already has the later edges, so the labeling is recomputed on the next query
+            self.__scc_mc = -1
+            return
+        self.__scc_mc = mc
+
+    def __scc_new_component(self, keys: set, order: tuple = None) -> int:
+        """adds a component with the given members, by default at the end of the topological order"""
+        comp = self.__scc_next
+        self.__scc_next += 1
+        self.__scc_members[comp] = keys
+        self.__scc_order[comp] = (comp,) if order is None else order
+        for key in keys:
+            self.__scc_label[key] = comp
+        return comp
+
+    def __scc_split(self, comp: int):
+        """recomputes the SCC of the members of a component that lost an edge or a node"""
+        keys = self.__scc_members[comp]
+        vertex = self.graph.get_all_v()
+        adj = Adjacency(keys, None, None,
+                        lambda key: [(ni, w) for ni, w in vertex[key].out_items() if ni in keys], None, None)
+        parts = self.__tarjan(adj)
+        if len(parts) == 1:
+            return
+        order = self.__scc_order.pop(comp)
+        del self.__scc_members[comp]
+        # the parts take the place of the component in the order, the tuples compare lexicographically
+        for i, part in enumerate(parts):
+            self.__scc_new_component(set(part), order + (len(parts) - i,))
+
+    def __scc_insert_edge(self, id1: int, id2: int):
+        """
+        Updates the labeling after the edge id1->id2 was added, using the Pearce-Kelly dynamic topological
+        order of the components: nothing is searched if the edge agrees with the order, otherwise only the
+        components between the two ends in the order are, and the components on a new cycle are merged.
+        More info:
+        https://www.doc.ic.ac.uk/~phjk/Publications/DynamicTopoSortAlg-JEA-07.pdf
+        """
+        label, order = self.__scc_label, self.__scc_order
+        comp_src, comp_dest = label[id1], label[id2]
+        if comp_src == comp_dest or order[comp_src] < order[comp_dest]:
+            return
+        forward = self.__scc_reach(comp_dest, order[comp_src], True)
+        backward = self.__scc_reach(comp_src, order[comp_dest], False)
+        pool = sorted(order[comp] for comp in forward | backward)
+        by_order = order.__getitem__
+        if comp_src not in forward:
+            sequence = sorted(backward, key=by_order) + sorted(forward, key=by_order)
+            for comp, position in zip(sequence, pool):
+                order[comp] = position
+            return
+        cycle = forward & backward
+        backward = sorted(backward - cycle, key=by_order)
+        forward = sorted(forward - cycle, key=by_order)
+        merged = max(cycle, key=lambda comp: len(self.__scc_members[comp]))
+        for comp in cycle:
+            if comp != merged:
+                keys = self.__scc_members.pop(comp)
+                del order[comp]
+                for key in keys:
+                    label[key] = merged
+                self.__scc_members[merged] |= keys
+        # the components before the cycle only move down the order, the ones after it only move up
+        for comp, position in zip(backward, pool):
+            order[comp] = position
+        order[merged] = pool[len(backward)]
+        for comp, position in zip(forward, pool[len(pool) - len(forward):]):
+            order[comp] = position
+
+    def __scc_reach(self, start: int, bound: tuple, forward: bool) -> set:
+        """
+        Returns the components reachable from start (or reaching it, if not forward)
+        whose order is not beyond bound
+        """
+        label, order, members = self.__scc_label, self.__scc_order, self.__scc_members
+        vertex = self.graph.get_all_v()
+        visited = {start}
+        stack = [start]
+        while stack:
+            comp = stack.pop()
+            for key in members[comp]:
+                edges = vertex[key].out_items() if forward else vertex[key].in_items()
+                for ni, _ in edges:
+                    other = label[ni]
+                    if other not in visited and (order[other] <= bound if forward else order[other] >= bound):
+                        visited.add(other)
+                        stack.append(other)
+        return visited
+
+    @staticmethod
+    def __tarjan(adj: Adjacency) -> List[list]:
+        """
+        Iterative version of Tarjan's algorithm, finds all the SCC of the graph in O(V+E).
+        @param adj: The adjacency of the graph
+        @return: The list of all SCC, as lists of internal nodes
+        More info:
+        https://en.wikipedia.org/wiki/Tarjan%27s_strongly_connected_components_algorithm
+        """
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        components = []
+        counter = 0
+        for root in adj.nodes:
+            if root in index:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(adj.out_edges(root)))]
+            while work:
+                node, neighbors = work[-1]
+                advanced = False
+                for ni, _ in neighbors:
+                    if ni not in index:
+                        index[ni] = low[ni] = counter
+                        counter += 1
+                        stack.append(ni)
+                        on_stack.add(ni)
+                        work.append((ni, iter(adj.out_edges(ni))))
+                        advanced = True
+                        break
+                    elif ni in on_stack and index[ni] < low[node]:
+                        low[node] = index[ni]
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+                if low[node] == index[node]:
+                    scc = []
+                    while True:
+                        key = stack.pop()
+                        on_stack.discard(key)
+                        scc.append(key)
+                        if key == node:
+                            break
+                    components.append(scc)
+        return components
+
+
+def _is_compact(graph) -> bool:
+    """
+    returns True if graph is a CompactDiGraph. CompactDiGraph (and NumPy) is not imported for this:
+    if its module was never loaded there can be no instance of it.
+    """
+    compact = sys.modules.get("src.CompactDiGraph")
+    return compact is not None and isinstance(graph, compact.CompactDiGraph)
+
+
+_worker_algo = None
+_worker_targets = None
+
+
+def _init_distance_worker(graph, targets: list):
+    """initializes a distance_matrix worker process with the shared graph and the targets"""
+    global _worker_algo, _worker_targets
+    _worker_algo = GraphAlgo(graph, tree_cache_nodes=0)
+    _worker_targets = targets
+
+
+def _distance_row_task(src: int) -> "np.ndarray":
+    return _distance_row(_worker_algo, src, _worker_targets)
+
+
+def _distance_row(algo: GraphAlgo, src: int, targets: list) -> "np.ndarray":
+    """returns the distances from src to the targets, inf where there is no path"""
+    import numpy as np
+    dist = algo.shortest_path_tree(src)[0]
+    return np.array([dist.get(target, math.inf) for target in targets], dtype=np.float64)
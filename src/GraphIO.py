@@ -0,0 +1,393 @@
+import json
+import math
+import os
+import struct
+import sys
+import threading
+from array import array
+from contextlib import contextmanager
+
+from src.DiGraph import DiGraph
+
+CHUNK_SIZE = 1 << 20
+# the number of nodes or edges formatted before they are written to the file
+WRITE_CHUNK = 1 << 14
+GZIP_MAGIC = b"\x1f\x8b"
+
+BINARY_MAGIC = b"DIGRAPHB"
+BINARY_VERSION = 1
+# magic, version, flags, number of nodes, number of edges, mc - padded to 64 bytes
+_HEADER = struct.Struct("<8sIIqqq")
+_HEADER_SIZE = 64
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_encode_string = json.encoder.encode_basestring_ascii
+
+
+class _JsonStream:
+    """A buffered reader over a JSON text file, decoding one value at a time"""
+
+    def __init__(self, fp, chunk_size: int = CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """reads the next chunk of the file, drops the consumed part of the buffer"""
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """skips whitespace and returns the next character, or an empty string at the end of the file"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str):
+        """consumes the next non whitespace character, which must be char"""
+        if self.peek() != char:
+            raise ValueError(f"expected '{char}' at offset {self.pos} of the JSON buffer")
+        self.pos += 1
+
+    def value(self):
+        """decodes the next JSON value, reading more of the file until the value is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # a number at the end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_json_graph(fp, chunk_size: int = CHUNK_SIZE):
+    """
+    Streams a graph JSON document, one array element at a time.
+    @param fp: A text file object of a document with "Nodes" and "Edges" arrays
+    @param chunk_size: The number of characters read from the file at a time
+    @return: A generator of (array name, element) pairs, in the order of the document
+    """
+    stream = _JsonStream(fp, chunk_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        name = stream.value()
+        stream.expect(":")
+        if stream.peek() == "[":
+            stream.pos += 1
+            if stream.peek() == "]":
+                stream.pos += 1
+            else:
+                while True:
+                    yield name, stream.value()
+                    char = stream.peek()
+                    stream.pos += 1
+                    if char == "]":
+                        break
+                    if char != ",":
+                        raise ValueError(f"expected ',' or ']' in the \"{name}\" array")
+        else:
+            stream.value()
+        char = stream.peek()
+        stream.pos += 1
+        if char == "}":
+            return
+        if char != ",":
+            raise ValueError("expected ',' or '}' in the JSON object")
+
+
+def open_json(file_name: str):
+    """
+    Opens a graph JSON file for reading as text, a gzip compressed file (found by its first bytes,
+    not its name) is decompressed while it is read.
+    @param file_name: The path to the json file
+    @return: A text file object
+    """
+    with open(file_name, "rb") as fp:
+        compressed = fp.read(2) == GZIP_MAGIC
+    if compressed:
+        import gzip
+        return gzip.open(file_name, "rt", encoding="utf-8")
+    return open(file_name, "r")
+
+
+def parse_pos(pos) -> tuple:
+    """parses the "x,y,z" position string of a node"""
+    return tuple(map(float, str(pos).split(",")))
+
+
+def _read_json_graph(file_name: str):
+    """
+    Streams the nodes and edges of a graph JSON file into compact buffers
+    (the "Edges" array may come before "Nodes").
+    @return: The node ids, their positions (None for nodes without one), and the sources, destinations
+    and weights of the edges
+    """
+    keys = []
+    positions = []
+    src = array("q")
+    dest = array("q")
+    # the weights are kept as the parsed objects, they are shared with the graph and keep their int/float type
+    weights = []
+    with open_json(file_name) as fp:
+        for name, element in iter_json_graph(fp):
+            if name == "Nodes":
+                keys.append(element["id"])
+                positions.append(parse_pos(element["pos"]) if "pos" in element else None)
+            elif name == "Edges":
+                src.append(element["src"])
+                dest.append(element["dest"])
+                weights.append(element["w"])
+    return keys, positions, src, dest, weights
+
+
+def load_json_graph(file_name: str, shared_weights: bool = False) -> DiGraph:
+    """
+    Loads a graph from a JSON file without holding the whole document in memory.
+    The nodes and edges are streamed into compact buffers and inserted into the graph in bulk.
+    @param file_name: The path to the json file
+    @param shared_weights: see DiGraph
+    @return: The loaded graph
+    """
+    keys, positions, src, dest, weights = _read_json_graph(file_name)
+    g = DiGraph(shared_weights)
+    g.add_nodes_from(zip(keys, positions))
+    g.add_edges_from(zip(src, dest, weights))
+    return g
+
+
+def save_json_graph(graph, file_name: str, compress: bool = None):
+    """
+    Saves a graph as JSON in the schema of DiGraph.to_json, with the same text json.dump writes for it,
+    without building the document in memory: the nodes and edges are formatted and written in chunks.
+    The file is written under a temporary name next to it and renamed over file_name only when it is
+    complete, so a crash never leaves a truncated graph file behind.
+    @param graph: A DiGraph or a CompactDiGraph
+    @param file_name: The path to the out file
+    @param compress: If True the file is gzip compressed, by default it is if file_name ends with ".gz"
+    """
+    if compress is None:
+        compress = file_name.endswith(".gz")
+    temp_name = f"{file_name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_name, "xb") as raw:
+            if compress:
+                import gzip
+                # no name or time in the header, the same graph always compresses to the same bytes
+                with gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0) as fp:
+                    _write_json_graph(graph, fp)
+            else:
+                _write_json_graph(graph, raw)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(temp_name, file_name)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
+
+
+def _write_json_graph(graph, fp):
+    fp.write(b'{"Nodes": [')
+    _write_chunks(fp, _json_nodes(graph))
+    fp.write(b'], "Edges": [')
+    _write_chunks(fp, _json_edges(graph))
+    fp.write(b"]}")
+
+
+def _write_chunks(fp, items):
+    """writes the formatted array elements of items, separated by ", ", WRITE_CHUNK at a time"""
+    chunk = []
+    first = True
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == WRITE_CHUNK:
+            fp.write((("" if first else ", ") + ", ".join(chunk)).encode("ascii"))
+            chunk.clear()
+            first = False
+    if chunk:
+        fp.write((("" if first else ", ") + ", ".join(chunk)).encode("ascii"))
+
+
+def _json_value(value) -> str:
+    """formats a node id or weight as json.dump does, repr is the same and much faster for ints and floats"""
+    if hasattr(value, "item"):
+        # a NumPy scalar, ids and weights may be given as those
+        value = value.item()
+    kind = type(value)
+    if kind is int or (kind is float and math.isfinite(value)):
+        return repr(value)
+    return json.dumps(value)
+
+
+def _json_node(key, pos) -> str:
+    if pos is None:
+        return f'{{"id": {_json_value(key)}}}'
+    return f'{{"id": {_json_value(key)}, "pos": {_encode_string(f"{pos[0]},{pos[1]},{pos[2]}")}}}'
+
+
+def _json_nodes(graph):
+    """yields the formatted "Nodes" elements of the graph"""
+    if _is_compact(graph):
+        keys = graph.keys.tolist()
+        for start in range(0, len(keys), WRITE_CHUNK):
+            end = min(start + WRITE_CHUNK, len(keys))
+            for key, (x, y, z) in zip(keys[start:end], graph.pos[start:end].tolist()):
+                yield _json_node(key, None if math.isnan(x) else (x, y, z))
+        return
+    for key, node in graph.get_all_v().items():
+        yield _json_node(key, node.pos)
+
+
+def _json_edges(graph):
+    """yields the formatted "Edges" elements of the graph, by source node"""
+    if _is_compact(graph):
+        keys = graph.keys.tolist()
+        offsets = graph.out_offsets.tolist()
+        for start in range(0, len(keys), WRITE_CHUNK):
+            end = min(start + WRITE_CHUNK, len(keys))
+            # the edges of the nodes start..end, the arrays are converted to lists one range at a time
+            first, last = offsets[start], offsets[end]
+            targets = graph.out_targets[first:last].tolist()
+            weights = graph.out_weights[first:last].tolist()
+            for i in range(start, end):
+                src = _json_value(keys[i])
+                for j in range(offsets[i] - first, offsets[i + 1] - first):
+                    yield f'{{"src": {src}, "dest": {_json_value(keys[targets[j]])}, "w": {_json_value(weights[j])}}}'
+        return
+    for key in graph.get_all_v().keys():
+        src = _json_value(key)
+        for dest, w in graph.all_out_edges_of_node(key).items():
+            yield f'{{"src": {src}, "dest": {_json_value(dest)}, "w": {_json_value(w)}}}'
+
+
+def _is_compact(graph) -> bool:
+    """returns True if graph is a CompactDiGraph, without importing it (and NumPy) when it was never loaded"""
+    compact = sys.modules.get("src.CompactDiGraph")
+    return compact is not None and isinstance(graph, compact.CompactDiGraph)
+
+
+def save_binary_graph(graph, file_name: str):
+    """
+    Saves a graph in the binary format: a 64 bytes header followed by little endian arrays of
+    the node ids (int64[n]), positions (float64[n, 3], nan for none), out offsets (int64[n + 1]),
+    out targets (int64[m]), out weights (float64[m]), in offsets (int64[n + 1]), in sources (int64[m])
+    and in weights (float64[m]). Targets and sources are array indices, not node ids.
+    @param graph: A DiGraph or a CompactDiGraph
+    @param file_name: The path to the out file
+    """
+    from src.CompactDiGraph import CompactDiGraph
+    if not isinstance(graph, CompactDiGraph):
+        graph = CompactDiGraph.from_graph(graph)
+    with open(file_name, "wb") as fp:
+        header = _HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, graph.v_size(), graph.e_size(), graph.get_mc())
+        fp.write(header.ljust(_HEADER_SIZE, b"\0"))
+        for arr, dtype in zip(_arrays_of(graph), _binary_dtypes()):
+            fp.write(arr.astype(dtype, copy=False).tobytes())
+
+
+def load_binary_graph(file_name: str, mmap: bool = True):
+    """
+    Loads a graph saved by save_binary_graph.
+    @param file_name: The path to the binary file
+    @param mmap: If True the arrays are memory mapped views of the file: loading is almost instant,
+    nothing is copied and the pages are shared by all the processes that map the same file.
+    Otherwise the arrays are read into memory.
+    @return: The loaded CompactDiGraph
+    """
+    import numpy as np
+    from src.CompactDiGraph import CompactDiGraph
+    if mmap:
+        buf = np.memmap(file_name, dtype=np.uint8, mode="r")
+    else:
+        buf = np.fromfile(file_name, dtype=np.uint8)
+    magic, version, flags, n, m, mc = _HEADER.unpack_from(buf[:_HEADER.size].tobytes())
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError(f"{file_name} is not a binary graph file")
+    arrays = []
+    offset = _HEADER_SIZE
+    for dtype, shape in zip(_binary_dtypes(), _binary_shapes(n, m)):
+        count = int(np.prod(shape))
+        arrays.append(np.frombuffer(buf, dtype=dtype, count=count, offset=offset).reshape(shape))
+        offset += count * 8
+    graph = CompactDiGraph(*arrays, mc=mc)
+    if mmap:
+        graph.file_name = file_name
+    return graph
+
+
+@contextmanager
+def shared_binary_graph(graph):
+    """
+    Gives a read only view of a graph that other processes can attach to without copying it:
+    a CompactDiGraph memory mapped from a binary file, which pickles as its file name.
+    A graph that is not mapped from a file yet is written to a temporary binary file for the
+    duration of the context.
+    @param graph: A DiGraph or a CompactDiGraph
+    @return: A context manager of the shared CompactDiGraph
+    """
+    if getattr(graph, "file_name", None) is not None:
+        yield graph
+        return
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        file_name = os.path.join(tmp, "graph.bin")
+        save_binary_graph(graph, file_name)
+        yield load_binary_graph(file_name)
+
+
+def json_to_binary(json_file: str, binary_file: str):
+    """
+    Converts a graph JSON file to the binary format, without building a DiGraph on the way.
+    @param json_file: The path to the json file
+    @param binary_file: The path to the out file
+    """
+    import numpy as np
+    from src.CompactDiGraph import CompactDiGraph
+    keys, positions, src, dest, weights = _read_json_graph(json_file)
+    pos = np.full((len(keys), 3), np.nan)
+    for i, p in enumerate(positions):
+        if p is not None:
+            pos[i] = p[:3]
+    graph = CompactDiGraph.from_edge_list(keys, pos, src, dest, weights)
+    save_binary_graph(graph, binary_file)
+
+
+def _arrays_of(graph) -> list:
+    return [graph.keys, graph.pos, graph.out_offsets, graph.out_targets, graph.out_weights,
+            graph.in_offsets, graph.in_sources, graph.in_weights]
+
+
+def _binary_dtypes() -> list:
+    return ["<i8", "<f8", "<i8", "<i8", "<f8", "<i8", "<i8", "<f8"]
+
+
+def _binary_shapes(n: int, m: int) -> list:
+    return [(n,), (n, 3), (n + 1,), (m,), (m,), (n + 1,), (m,), (m,)]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("usage: python -m src.GraphIO <graph.json> <graph.bin>")
+        sys.exit(1)
+    json_to_binary(sys.argv[1], sys.argv[2])
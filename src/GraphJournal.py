@@ -0,0 +1,143 @@
+import json
+import os
+import re
+
+from src.DiGraph import DiGraph
+from src.GraphIO import save_json_graph, load_json_graph
+
+_SNAPSHOT = "snapshot-{:08d}.json"
+_LOG = "journal-{:08d}.log"
+_GENERATION = re.compile(r"^(snapshot|journal)-(\d{8})\.(json|log)$")
+# the log is not compacted before it reaches this size, however small the snapshot is
+MIN_LOG_BYTES = 64 * 1024
+
+
+class GraphJournal:
+    """
+    An append only log of the changes of a DiGraph, with checkpoints, see DiGraph.enable_journal.
+    A directory holds one generation of the graph: a JSON snapshot (snapshot-<N>.json) and the log of
+    the changes made since it (journal-<N>.log), one JSON array per line: [mc, op, *args], where mc is
+    get_mc() of the graph after the change and op and args are those of the DiGraph listeners.
+    A checkpoint writes the next generation's snapshot (atomically, see GraphIO.save_json_graph),
+    starts its empty log and deletes the previous generation, so a crash at any point leaves a complete
+    generation to recover from with recover_graph.
+    The journal is a DiGraph listener, it is called while the graph holds its write lock.
+    """
+
+    def __init__(self, graph: DiGraph, directory: str, log_ratio: float = 1.0, sync: bool = False):
+        """
+        @param graph: The journaled graph
+        @param directory: The directory of the snapshots and logs, created if missing
+        @param log_ratio: A checkpoint is taken when the log grows past log_ratio times the size of the
+        snapshot, so the rewriting of the snapshot costs at most 1 / log_ratio of the bytes logged
+        @param sync: If True every record is fsynced (survives a power loss), otherwise it is only flushed
+        to the operating system (survives a crash of the process)
+        """
+        self.graph = graph
+        self.directory = directory
+        self.log_ratio = log_ratio
+        self.sync = sync
+        self.generation = max(_generations(directory), default=0)
+        self.__log = None
+        self.__log_bytes = 0
+        self.__snapshot_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, op: str, args, mc: int):
+        line = (json.dumps([mc, op, *args], separators=(",", ":"), default=_plain) + "\n").encode("utf-8")
+        self.__log.write(line)
+        self.__log.flush()
+        if self.sync:
+            os.fsync(self.__log.fileno())
+        self.__log_bytes += len(line)
+        if self.__log_bytes > max(MIN_LOG_BYTES, self.log_ratio * self.__snapshot_bytes):
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Writes a snapshot of the graph as a new generation and deletes the older ones.
+        Called by the journal itself when the log grows too big, or by DiGraph.checkpoint.
+        """
+        generation = self.generation + 1
+        snapshot = os.path.join(self.directory, _SNAPSHOT.format(generation))
+        save_json_graph(self.graph, snapshot)
+        log = open(os.path.join(self.directory, _LOG.format(generation)), "wb")
+        if self.__log is not None:
+            self.__log.close()
+        self.__log = log
+        self.__log_bytes = 0
+        self.__snapshot_bytes = os.path.getsize(snapshot)
+        self.generation = generation
+        for old in _generations(self.directory):
+            if old < generation:
+                for name in (_SNAPSHOT.format(old), _LOG.format(old)):
+                    if os.path.exists(os.path.join(self.directory, name)):
+                        os.remove(os.path.join(self.directory, name))
+
+    def close(self):
+        if self.__log is not None:
+            self.__log.close()
+            self.__log = None
+
+
+def recover_graph(directory: str, shared_weights: bool = False) -> DiGraph:
+    """
+    Rebuilds a journaled graph: loads the last snapshot of the directory and replays the log after it.
+    A record cut short by a crash at the end of the log is ignored. The recovered graph is not journaled,
+    call enable_journal on it (with the same directory) to continue.
+    @param directory: The directory of a GraphJournal
+    @param shared_weights: see DiGraph
+    @return: The recovered graph, an empty graph if the directory has no snapshot
+    """
+    generations = [g for g in _generations(directory)
+                   if os.path.exists(os.path.join(directory, _SNAPSHOT.format(g)))]
+    if not generations:
+        return DiGraph(shared_weights)
+    generation = max(generations)
+    graph = load_json_graph(os.path.join(directory, _SNAPSHOT.format(generation)), shared_weights)
+    log = os.path.join(directory, _LOG.format(generation))
+    if os.path.exists(log):
+        with open(log, "rb") as fp:
+            last_mc = None
+            for line in fp:
+                if not line.endswith(b"\n"):
+                    break
+                mc, op, *args = json.loads(line)
+                if last_mc is not None and mc <= last_mc:
+                    raise ValueError(f"{log}: the record of version {mc} comes after version {last_mc}")
+                last_mc = mc
+                _replay(graph, op, args)
+    return graph
+
+
+def _plain(value):
+    """converts the NumPy scalars a graph may be given as ids, weights or positions for json.dumps"""
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _replay(graph: DiGraph, op: str, args: list):
+    """applies one logged change to the graph, the positions were logged as lists"""
+    if op == "add_node":
+        graph.add_node(args[0], None if args[1] is None else tuple(args[1]))
+    elif op == "add_edge":
+        graph.add_edge(*args)
+    elif op == "remove_node":
+        graph.remove_node(*args)
+    elif op == "remove_edge":
+        graph.remove_edge(*args)
+    elif op == "add_nodes":
+        graph.add_nodes_from((key, None if pos is None else tuple(pos)) for key, pos in args)
+    elif op == "add_edges":
+        graph.add_edges_from(args)
+    elif op == "remove_edges":
+        graph.remove_edges_from(args)
+    else:
+        raise ValueError(f"unknown journal operation {op}")
+
+
+def _generations(directory: str) -> set:
+    if not os.path.isdir(directory):
+        return set()
+    return {int(match.group(2)) for match in map(_GENERATION.match, os.listdir(directory)) if match}
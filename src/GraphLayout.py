@@ -0,0 +1,189 @@
+import math
+
+import numpy as np
+
+from src.GraphPlot import node_arrays, edge_arrays
+
+# the repulsion of a node is summed over cell centroids in chunks of at most this many (node, cell) pairs
+PAIRS_PER_CHUNK = 1 << 20
+
+
+def spring_layout(graph, iterations: int = 50, seed: int = 0) -> dict:
+    """
+    Computes a force directed (Fruchterman-Reingold) layout of the nodes that have no position.
+    The edges pull their ends together and all the nodes push each other away, the nodes that have a
+    position stay in place. The repulsion is approximated on a grid: a node is pushed exactly by the nodes
+    of its own cell and by the other cells as a whole (their number of nodes at their centroid),
+    so an iteration costs about n * n ** 0.5 instead of n ** 2.
+    The layout starts from the spectral layout and is the same on every run with the same seed.
+    @param graph: A DiGraph or a CompactDiGraph, it is not modified
+    @param iterations: The number of iterations, the step size cools down linearly over them
+    @param seed: The seed of the random perturbation of the starting positions
+    @return: A dictionary of node id -> (x, y, 0.0) of the nodes without a position
+    """
+    keys, xy = node_arrays(graph)
+    free = np.isnan(xy[:, 0])
+    if not free.any():
+        return {}
+    rng = np.random.default_rng(seed)
+    sources, targets = _undirected_edges(graph, keys)
+    origin, span = _frame(xy, free)
+    pos = (xy - origin) / span
+    start = _normalize(_spectral(len(keys), sources, targets, rng))
+    pos[free] = start[free] + rng.uniform(-1e-3, 1e-3, size=(int(free.sum()), 2))
+    k = 1 / math.sqrt(len(keys))
+    for i in range(iterations):
+        step = 0.1 * (1 - i / iterations)
+        disp = _repulsion(pos, k)
+        delta = pos[sources] - pos[targets]
+        # attraction d ** 2 / k along the edge
+        pull = delta * (np.hypot(delta[:, 0], delta[:, 1]) / k)[:, None]
+        for axis in (0, 1):
+            disp[:, axis] -= np.bincount(sources, weights=pull[:, axis], minlength=len(keys))
+            disp[:, axis] += np.bincount(targets, weights=pull[:, axis], minlength=len(keys))
+        length = np.maximum(np.hypot(disp[:, 0], disp[:, 1]), 1e-12)
+        pos[free] += (disp * (np.minimum(length, step) / length)[:, None])[free]
+    if free.all():
+        pos = _normalize(pos)
+    return _positions(keys, pos * span + origin, free)
+
+
+def spectral_layout(graph, seed: int = 0) -> dict:
+    """
+    Computes a spectral layout of the nodes that have no position: the coordinates are the two eigenvectors
+    of the graph Laplacian (of the graph without directions) with the smallest non zero eigenvalues,
+    found by a seeded subspace iteration over the edges arrays.
+    Much faster than spring_layout, but the nodes of dense parts of the graph may end up very close.
+    @param graph: A DiGraph or a CompactDiGraph, it is not modified
+    @param seed: The seed of the starting vectors of the iteration
+    @return: A dictionary of node id -> (x, y, 0.0) of the nodes without a position
+    """
+    keys, xy = node_arrays(graph)
+    free = np.isnan(xy[:, 0])
+    if not free.any():
+        return {}
+    sources, targets = _undirected_edges(graph, keys)
+    origin, span = _frame(xy, free)
+    pos = _normalize(_spectral(len(keys), sources, targets, np.random.default_rng(seed)))
+    return _positions(keys, pos * span + origin, free)
+
+
+LAYOUTS = {"spring": spring_layout, "spectral": spectral_layout}
+
+
+def _undirected_edges(graph, keys: list) -> (np.ndarray, np.ndarray):
+    """returns the edges of the graph as array indices, without self loops"""
+    sources, targets = edge_arrays(graph, keys)
+    loop = sources == targets
+    return sources[~loop], targets[~loop]
+
+
+def _frame(xy: np.ndarray, free: np.ndarray) -> (np.ndarray, float):
+    """returns the corner and size of the square the layout is drawn in: the bounding square of the nodes
+    that have a position, or the unit square if none has"""
+    if free.all():
+        return np.zeros(2), 1.0
+    fixed = xy[~free]
+    origin = fixed.min(axis=0)
+    span = float((fixed.max(axis=0) - origin).max())
+    return origin, span if span > 0 else 1.0
+
+
+def _normalize(pos: np.ndarray) -> np.ndarray:
+    """scales and moves positions into the unit square, keeping the aspect ratio"""
+    low = pos.min(axis=0)
+    span = float((pos.max(axis=0) - low).max())
+    return (pos - low) / (span if span > 0 else 1.0)
+
+
+def _spectral(n: int, sources: np.ndarray, targets: np.ndarray, rng, iterations: int = 100) -> np.ndarray:
+    """
+    Subspace iteration for the second and third eigenvectors of M = (I + D^-1/2 (A + I) D^-1/2) / 2
+    of the symmetric adjacency A (with a self loop on every node, so isolated nodes have a degree),
+    these are the eigenvectors of the normalized Laplacian with the smallest non zero eigenvalues.
+    @return: A (n, 2) array of coordinates
+    """
+    if n < 3:
+        # there are no two eigenvectors besides the constant one
+        return rng.uniform(0, 1, size=(n, 2))
+    rows = np.concatenate((sources, targets))
+    cols = np.concatenate((targets, sources))
+    degree = np.bincount(rows, minlength=n) + 1.0
+    inv_sqrt = 1 / np.sqrt(degree)
+    top = np.sqrt(degree) / math.sqrt(degree.sum())
+    x = rng.standard_normal((n, 2))
+    for _ in range(iterations):
+        y = x * inv_sqrt[:, None]
+        spread = np.column_stack([np.bincount(rows, weights=y[cols, axis], minlength=n) for axis in (0, 1)])
+        x = (x + (spread + y) * inv_sqrt[:, None]) / 2
+        x -= np.outer(top, top @ x)
+        x, _ = np.linalg.qr(x)
+    return x * inv_sqrt[:, None]
+
+
+def _repulsion(pos: np.ndarray, k: float) -> np.ndarray:
+    """
+    Returns the repulsion k ** 2 / d of every node from all the others: exact within the node's grid cell,
+    by cell centroid for the rest of the cells. The grid has about n ** 0.5 cells of about n ** 0.5 nodes.
+    """
+    n = len(pos)
+    side = max(1, math.ceil(n ** 0.25))
+    # balanced cells: columns of equal numbers of nodes by x, each split into rows of equal numbers by y
+    column = np.empty(n, dtype=np.int64)
+    column[np.argsort(pos[:, 0], kind="stable")] = np.arange(n) * side // n
+    order = np.lexsort((pos[:, 1], column))
+    counts = np.bincount(column, minlength=side)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sorted_column = column[order]
+    row = np.empty(n, dtype=np.int64)
+    row[order] = (np.arange(n) - starts[sorted_column]) * side // counts[sorted_column]
+    cell = column * side + row
+    mass = np.bincount(cell, minlength=side * side).astype(np.float64)
+    occupied = np.flatnonzero(mass)
+    centroid = np.column_stack([np.bincount(cell, weights=pos[:, axis], minlength=side * side)[occupied]
+                                for axis in (0, 1)]) / mass[occupied, None]
+    mass = mass[occupied]
+    own = np.searchsorted(occupied, cell)
+    min_dist2 = (k * 1e-2) ** 2
+    disp = np.zeros_like(pos)
+    # sum_j w_ij (p_i - c_j) = p_i * sum_j w_ij - sum_j w_ij c_j, the sums are one matrix product
+    moments = np.column_stack((np.ones(len(occupied)), centroid))
+    chunk = max(1, PAIRS_PER_CHUNK // len(occupied))
+    for start in range(0, n, chunk):
+        end = min(start + chunk, n)
+        weight = _dist2(pos[start:end], centroid)
+        np.maximum(weight, min_dist2, out=weight)
+        np.divide(mass, weight, out=weight)
+        # the node's own cell is handled exactly below
+        weight[np.arange(end - start), own[start:end]] = 0
+        sums = weight @ moments
+        disp[start:end] = k * k * (pos[start:end] * sums[:, :1] - sums[:, 1:])
+    order = np.argsort(cell, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(cell, minlength=side * side)[occupied])))
+    for c in range(len(occupied)):
+        members = order[bounds[c]:bounds[c + 1]]
+        if len(members) < 2:
+            continue
+        moments = np.column_stack((np.ones(len(members)), pos[members]))
+        chunk = max(1, PAIRS_PER_CHUNK // len(members))
+        for start in range(0, len(members), chunk):
+            rows = members[start:start + chunk]
+            weight = _dist2(pos[rows], pos[members])
+            np.maximum(weight, min_dist2, out=weight)
+            np.divide(1, weight, out=weight)
+            weight[np.arange(len(rows)), np.arange(start, start + len(rows))] = 0
+            sums = weight @ moments
+            disp[rows] += k * k * (pos[rows] * sums[:, :1] - sums[:, 1:])
+    return disp
+
+
+def _dist2(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """returns the matrix of squared distances between the points of a and the points of b,
+    |a|^2 + |b|^2 - 2 a.b as a single matrix product"""
+    left = np.column_stack((a, (a * a).sum(axis=1), np.ones(len(a))))
+    right = np.column_stack((-2 * b, np.ones(len(b)), (b * b).sum(axis=1)))
+    return left @ right.T
+
+
+def _positions(keys: list, pos: np.ndarray, free: np.ndarray) -> dict:
+    return {keys[i]: (x, y, 0.0) for i, (x, y) in zip(np.flatnonzero(free).tolist(), pos[free].tolist())}
@@ -0,0 +1,89 @@
+import numpy as np
+
+from src.CompactDiGraph import CompactDiGraph
+
+LABEL_LIMIT = 100
+
+
+def node_arrays(graph, positions: dict = None) -> (list, np.ndarray):
+    """
+    Returns the node ids of a graph and a (n, 2) array of their x, y coordinates.
+    Nodes without a position take it from positions, or nan if they are not there either.
+    The graph is not modified.
+    """
+    if isinstance(graph, CompactDiGraph):
+        keys = graph.keys.tolist()
+        xy = np.array(graph.pos[:, :2], dtype=np.float64)
+    else:
+        nodes = graph.get_all_v()
+        keys = list(nodes.keys())
+        xy = np.full((len(keys), 2), np.nan)
+        for i, node in enumerate(nodes.values()):
+            if node.pos is not None:
+                xy[i] = node.pos[0], node.pos[1]
+    if positions:
+        for i in np.flatnonzero(np.isnan(xy[:, 0])).tolist():
+            pos = positions.get(keys[i])
+            if pos is not None:
+                xy[i] = pos[0], pos[1]
+    return keys, xy
+
+
+def edge_arrays(graph, keys: list) -> (np.ndarray, np.ndarray):
+    """returns the source and destination indices (in the order of keys) of all the edges of a graph"""
+    if isinstance(graph, CompactDiGraph):
+        sources = np.repeat(np.arange(graph.v_size()), np.diff(graph.out_offsets))
+        return sources, np.asarray(graph.out_targets)
+    index = {key: i for i, key in enumerate(keys)}
+    sources = []
+    targets = []
+    for i, key in enumerate(keys):
+        for dest in graph.all_out_edges_of_node(key):
+            sources.append(i)
+            targets.append(index[dest])
+    return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+
+
+def plot_graph(graph, file_name: str = None, max_edges: int = None, positions: dict = None, seed: int = 0):
+    """
+    Draws a graph with all its edges as one quiver (a single collection of arrows), instead of one
+    matplotlib patch per edge.
+    @param graph: A DiGraph or a CompactDiGraph, it is not modified
+    @param file_name: If given the figure is saved to this file (the format is taken from its extension,
+    e.g. png or svg) without opening a window, otherwise it is shown with plt.show()
+    @param max_edges: Level of detail, if the graph has more edges a uniform sample of max_edges edges is drawn
+    @param positions: Positions of the nodes that have none, by node id. Remaining nodes without a position
+    are placed at random (seeded) coordinates.
+    @param seed: The seed of the edges sample and of the random coordinates
+    """
+    keys, xy = node_arrays(graph, positions)
+    rng = np.random.default_rng(seed)
+    missing = np.isnan(xy[:, 0])
+    if missing.any():
+        xy[missing] = rng.uniform(0, 30, size=(int(missing.sum()), 2))
+    sources, targets = edge_arrays(graph, keys)
+    if max_edges is not None and len(sources) > max_edges:
+        sample = np.sort(rng.choice(len(sources), size=max_edges, replace=False))
+        sources, targets = sources[sample], targets[sample]
+
+    if file_name is None:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+    else:
+        from matplotlib.figure import Figure
+        fig = Figure()
+        ax = fig.add_subplot()
+    start = xy[sources]
+    delta = xy[targets] - start
+    if len(sources):
+        ax.quiver(start[:, 0], start[:, 1], delta[:, 0], delta[:, 1], angles="xy", scale_units="xy", scale=1,
+                  width=0.002, headwidth=4, headlength=6, color="black")
+    ax.scatter(xy[:, 0], xy[:, 1], s=12, color="red", zorder=3)
+    if len(keys) <= LABEL_LIMIT:
+        for key, (x, y) in zip(keys, xy.tolist()):
+            ax.annotate(str(key), (x, y))
+    ax.set_title("graph")
+    if file_name is None:
+        plt.show()
+    else:
+        fig.savefig(file_name)
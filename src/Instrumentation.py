@@ -0,0 +1,94 @@
+import heapq
+from collections import Counter, deque, namedtuple
+
+# One record per instrumented GraphAlgo query:
+# op - the GraphAlgo method, args - its arguments,
+# mode - the search that answered it: "dijkstra", "bidirectional", "a_star", "delta_stepping" (with workers),
+# "tree" (a cached shortest path tree), "query_index" (the contraction hierarchy), "tarjan" or "scc" (the SCC labeling),
+# "forward_backward" (the parallel SCC decomposition, with workers),
+# "labels" or "dfs" (the reachability labels of the condensation, or a search of it),
+# cache - the cache that answered it ("tree", "query_index", "scc" or "reachability"), None if the query searched,
+# settled - the number of nodes the search settled (expanded), pushes/pops - the number of heap operations,
+# relaxed - the number of edges the search looked at, None where a count is not tracked,
+# elapsed - the wall time in seconds, mc - the version of the graph.
+QueryStats = namedtuple("QueryStats", ["op", "args", "mode", "cache", "settled", "pushes", "pops", "relaxed",
+                                       "elapsed", "mc"])
+
+
+class QueryCounter:
+    """
+    Counts the work of one search. The searches take their heap functions and adjacency as arguments,
+    an instrumented query passes the counting versions from here, and an uninstrumented one the plain
+    heapq functions, so the counting costs nothing when it is off.
+    """
+
+    __slots__ = ("settled", "pushes", "pops", "relaxed", "mode", "cache")
+
+    def __init__(self):
+        self.settled = 0
+        self.pushes = 0
+        self.pops = 0
+        self.relaxed = 0
+        self.mode = None
+        self.cache = None
+
+    def push(self, heap: list, item):
+        self.pushes += 1
+        heapq.heappush(heap, item)
+
+    def pop(self, heap: list):
+        self.pops += 1
+        return heapq.heappop(heap)
+
+    def edges(self, edges_of):
+        """returns a version of the edges function of an adjacency that counts the settled nodes and their edges"""
+        def counted(node):
+            items = list(edges_of(node))
+            self.settled += 1
+            self.relaxed += len(items)
+            return items
+        return counted
+
+    def stats(self, op: str, args: tuple, elapsed: float, mc: int) -> QueryStats:
+        searched = self.cache is None
+        return QueryStats(op, args, self.mode, self.cache, self.settled if searched else None, self.pushes,
+                          self.pops, self.relaxed if searched else None, elapsed, mc)
+
+
+class RingBufferSink:
+    """
+    The default sink of the query records: keeps the last capacity records in memory.
+    A sink is any function of one QueryStats record, it is called by the thread that ran the query.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.__records = deque(maxlen=capacity)
+
+    def __call__(self, record: QueryStats):
+        self.__records.append(record)
+
+    def records(self) -> list:
+        """returns the kept records, oldest first"""
+        return list(self.__records)
+
+    def clear(self):
+        self.__records.clear()
+
+    def __len__(self):
+        return len(self.__records)
+
+
+class MutationCounter:
+    """
+    A DiGraph listener that counts the changes of the graph by type (see DiGraph.add_listener).
+    The batch operations count the number of nodes or edges they changed.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def __call__(self, op: str, args, mc: int):
+        if op in ("add_nodes", "add_edges", "remove_edges"):
+            self.counts[op] += len(args)
+        else:
+            self.counts[op] += 1
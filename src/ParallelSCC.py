@@ -0,0 +1,255 @@
+import numpy as np
+
+from src.CompactDiGraph import CompactDiGraph
+
+# parts of at most this many nodes are solved by Tarjan's algorithm instead of being split further
+SMALL = 4096
+# the maximal number of trimming rounds per part, trimming stops earlier once a round removes little
+TRIM_ROUNDS = 8
+
+
+def strongly_connected_components(graph: CompactDiGraph, workers: int = 1) -> np.ndarray:
+    """
+    Finds the strongly connected components of a graph by forward-backward decomposition:
+    - trimming: nodes without in or out edges (inside their part of the graph) are components of their own,
+      removing them exposes more such nodes, so it is repeated for a few rounds,
+    - the nodes both reachable from a pivot and reaching it (two breadth first searches over the out and
+      in edge arrays) are the component of the pivot, and every other component lies entirely in one of the
+      three remaining parts: reachable only, reaching only, or neither. The parts are independent.
+    Parts are split in this process until they are small enough to balance over the workers, then they
+    are solved in the worker processes, which share the graph as a memory mapped file
+    (see GraphIO.shared_binary_graph). Parts of at most SMALL nodes are solved with Tarjan's algorithm.
+    The searches run level by level on whole arrays, so a component with a very long cycle (a huge diameter)
+    takes many small steps.
+    More info:
+    https://en.wikipedia.org/wiki/Strongly_connected_component#Algorithms
+    @param graph: The graph
+    @param workers: The number of worker processes, 1 solves everything in this process
+    @return: The array of the component numbers of the nodes, by array index
+    """
+    n = graph.v_size()
+    labels = np.full(n, -1, dtype=np.int64)
+    solver = _Solver(graph)
+    parts = [np.arange(n, dtype=np.int64)] if n else []
+    if workers <= 1:
+        solver.solve(parts, labels)
+        return labels
+    # the parts bigger than a fair share of a worker are split here, the rest is spread over the workers
+    tasks = []
+    while parts:
+        part = parts.pop()
+        if len(part) <= max(SMALL, n // (2 * workers)):
+            tasks.append(part)
+        else:
+            parts.extend(solver.split(part, labels))
+    batches = _batches(tasks, workers * 4)
+    if not batches:
+        return labels
+    from concurrent.futures import ProcessPoolExecutor
+    from src.GraphIO import shared_binary_graph
+    with shared_binary_graph(graph) as shared:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared,))
+        try:
+            for nodes, local, count in executor.map(_solve_task, batches):
+                # the workers number their components from 0
+                labels[nodes] = local + solver.count
+                solver.count += count
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    return labels
+
+
+class _Solver:
+    """
+    Splits and solves parts of a graph. The parts are arrays of node indices, the solver keeps two boolean
+    arrays over all the nodes (the members of the current part, and the nodes a search reached) that are
+    cleared after every use, so a part costs the number of its nodes and edges, not the size of the graph.
+    The components are numbered from 0 in the order they are found, count is the number found so far.
+    """
+
+    def __init__(self, graph: CompactDiGraph):
+        self.graph = graph
+        n = graph.v_size()
+        self.inside = np.zeros(n, dtype=bool)
+        self.mark = np.zeros(n, dtype=bool)
+        self.degrees = np.diff(graph.out_offsets) * np.diff(graph.in_offsets)
+        self.count = 0
+
+    def __number(self, size: int) -> np.ndarray:
+        """returns the numbers of size new components"""
+        numbers = np.arange(self.count, self.count + size)
+        self.count += size
+        return numbers
+
+    def solve(self, parts: list, labels: np.ndarray):
+        """finds all the components of the parts"""
+        parts = list(parts)
+        while parts:
+            parts.extend(self.split(parts.pop(), labels))
+
+    def split(self, part: np.ndarray, labels: np.ndarray) -> list:
+        """
+        Labels the trivial components of a part and the component of a pivot (or all the components of a small
+        part), and returns the remaining independent parts
+        """
+        graph = self.graph
+        inside = self.inside
+        inside[part] = True
+        try:
+            part = self.__trim(part, labels)
+            if len(part) == 0:
+                return []
+            if len(part) <= SMALL:
+                self.__tarjan(part, labels)
+                return []
+            pivot = int(part[np.argmax(self.degrees[part])])
+            forward = self.__reach(graph.out_offsets, graph.out_targets, pivot)
+            backward = self.__reach(graph.in_offsets, graph.in_sources, pivot)
+            component = np.intersect1d(forward, backward, assume_unique=True)
+            labels[component] = self.__number(1)[0]
+            reached = np.union1d(forward, backward)
+            rest = [np.setdiff1d(forward, component, assume_unique=True),
+                    np.setdiff1d(backward, component, assume_unique=True),
+                    np.setdiff1d(part, reached, assume_unique=True)]
+            return [p for p in rest if len(p)]
+        finally:
+            inside[part] = False
+
+    def __trim(self, part: np.ndarray, labels: np.ndarray) -> np.ndarray:
+        """labels the nodes without in or out edges inside the part as components, returns the rest of the part"""
+        graph = self.graph
+        for _ in range(TRIM_ROUNDS):
+            out_degree = self.__inside_degrees(graph.out_offsets, graph.out_targets, part)
+            in_degree = self.__inside_degrees(graph.in_offsets, graph.in_sources, part)
+            trivial = (out_degree == 0) | (in_degree == 0)
+            count = int(trivial.sum())
+            if count == 0:
+                break
+            removed = part[trivial]
+            labels[removed] = self.__number(count)
+            self.inside[removed] = False
+            part = part[~trivial]
+            if count < len(part) // 100:
+                break
+        return part
+
+    def __inside_degrees(self, offsets: np.ndarray, targets: np.ndarray, part: np.ndarray) -> np.ndarray:
+        """returns the number of edges of every node of the part that stay inside the part"""
+        owners, ends = _edges_of(offsets, targets, part)
+        return np.bincount(owners[self.inside[ends]], minlength=len(part))
+
+    def __reach(self, offsets: np.ndarray, targets: np.ndarray, pivot: int) -> np.ndarray:
+        """breadth first search inside the part, returns the sorted array of the reached nodes"""
+        inside, mark = self.inside, self.mark
+        frontier = np.array([pivot], dtype=np.int64)
+        mark[pivot] = True
+        reached = [frontier]
+        while frontier.size:
+            _, ends = _edges_of(offsets, targets, frontier)
+            ends = np.unique(ends[inside[ends] & ~mark[ends]])
+            mark[ends] = True
+            reached.append(ends)
+            frontier = ends
+        reached = np.sort(np.concatenate(reached))
+        mark[reached] = False
+        return reached
+
+    def __tarjan(self, part: np.ndarray, labels: np.ndarray):
+        """labels the components of a small part with an iterative Tarjan's algorithm on its own edge lists"""
+        graph = self.graph
+        part = np.sort(part)
+        owners, ends = _edges_of(graph.out_offsets, graph.out_targets, part)
+        keep = self.inside[ends]
+        owners, ends = owners[keep], np.searchsorted(part, ends[keep])
+        offsets = np.zeros(len(part) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(owners, minlength=len(part)), out=offsets[1:])
+        offsets, ends = offsets.tolist(), ends.tolist()
+        k = len(part)
+        index = [-1] * k
+        low = [0] * k
+        on_stack = [False] * k
+        stack = []
+        local = [-1] * k
+        components = 0
+        counter = 0
+        for root in range(k):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            work = [(root, offsets[root])]
+            while work:
+                node, i = work[-1]
+                end = offsets[node + 1]
+                while i < end:
+                    ni = ends[i]
+                    i += 1
+                    if index[ni] == -1:
+                        break
+                    if on_stack[ni] and index[ni] < low[node]:
+                        low[node] = index[ni]
+                else:
+                    ni = -1
+                if ni != -1:
+                    work[-1] = (node, i)
+                    index[ni] = low[ni] = counter
+                    counter += 1
+                    stack.append(ni)
+                    on_stack[ni] = True
+                    work.append((ni, offsets[ni]))
+                    continue
+                work.pop()
+                if work and low[node] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[node]
+                if low[node] == index[node]:
+                    while True:
+                        key = stack.pop()
+                        on_stack[key] = False
+                        local[key] = components
+                        if key == node:
+                            break
+                    components += 1
+        labels[part] = np.array(local, dtype=np.int64) + self.__number(components)[0]
+
+
+def _edges_of(offsets: np.ndarray, targets: np.ndarray, nodes: np.ndarray) -> (np.ndarray, np.ndarray):
+    """returns the position in nodes of the source of every edge of the nodes, and the other end of the edge"""
+    starts = offsets[nodes]
+    counts = offsets[nodes + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    ends = np.cumsum(counts)
+    edges = np.arange(total) + np.repeat(starts - (ends - counts), counts)
+    return np.repeat(np.arange(len(nodes)), counts), targets[edges]
+
+
+def _batches(parts: list, count: int) -> list:
+    """groups the parts into at most count batches of about the same number of nodes, biggest first"""
+    batches = [[] for _ in range(min(count, len(parts)))]
+    sizes = [0] * len(batches)
+    for part in sorted(parts, key=len, reverse=True):
+        smallest = sizes.index(min(sizes))
+        batches[smallest].append(part)
+        sizes[smallest] += len(part)
+    return batches
+
+
+_worker_solver = None
+
+
+def _init_worker(graph: CompactDiGraph):
+    """initializes a worker process with the shared graph"""
+    global _worker_solver
+    _worker_solver = _Solver(graph)
+
+
+def _solve_task(parts: list) -> (np.ndarray, np.ndarray, int):
+    """solves a batch of parts, returns their nodes, component numbers (from 0) and number of components"""
+    nodes = np.concatenate(parts)
+    labels = np.full(_worker_solver.graph.v_size(), -1, dtype=np.int64)
+    _worker_solver.count = 0
+    _worker_solver.solve(parts, labels)
+    return nodes, labels[nodes], _worker_solver.count